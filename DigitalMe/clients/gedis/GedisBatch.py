@@ -0,0 +1,153 @@
+from DigitalMe.servers.gedis.compression import decompress, result_decompress
+from Jumpscale import j
+from redis.exceptions import ResponseError
+
+# result of a future which is not set yet
+PENDING = object()
+
+
+class GedisFuture:
+    """
+    result of a call of a generated method inside a batch, available once the batch is sent
+    """
+
+    __slots__ = ("cmd_name", "_decode", "_result", "_error")
+
+    def __init__(self, cmd_name, decode):
+        self.cmd_name = cmd_name
+        self._decode = decode
+        self._result = PENDING
+        self._error = None
+
+    @property
+    def done(self):
+        return self._result is not PENDING or self._error is not None
+
+    def result(self):
+        """
+        :return: the decoded result of the call, raises the error of the call if it failed
+        """
+        if self._error is not None:
+            raise self._error
+        if self._result is PENDING:
+            raise RuntimeError("result of %s is not available, the batch is not sent yet" % self.cmd_name)
+        return self._result
+
+    def _set(self, res):
+        if isinstance(res, ResponseError):
+            self._error = res
+            return
+        try:
+            self._result = self._decode(res)
+        except Exception as e:
+            self._error = e
+
+    def __repr__(self):
+        return "<GedisFuture %s done=%s>" % (self.cmd_name, self.done)
+
+
+class GedisBatch:
+    """
+    collects the calls of the generated methods and sends them in 1 request to system.batch
+
+        with client.batch() as batch:
+            farmers = client.actors.farmer.farmers_get()
+            countries = client.actors.farmer.country_list()
+        farmers.result()
+    """
+
+    def __init__(self, client, concurrent=False):
+        """
+        :param client: GedisClient
+        :param concurrent: the server executes the calls concurrently instead of one after the other
+        """
+        self._client = client
+        self.concurrent = concurrent
+        self.calls = []  # [cmd_name, args, headers]
+        self.futures = []
+        self.sent = []  # futures of the calls sent by the last send()
+
+    def add(self, cmd_name, args, decode, headers=None):
+        """
+        :return: GedisFuture of the call
+        """
+        future = GedisFuture(cmd_name, decode)
+        self.calls.append([cmd_name, list(args), headers or {}])
+        self.futures.append(future)
+        return future
+
+    def send(self):
+        """
+        send the calls, sets the results of the futures
+        :return: list of the futures
+        """
+        if not self.calls:
+            return []
+        calls = j.data.serializers.msgpack.dumps(self.calls)
+        if self._client._compressor is not None:
+            calls = self._client._compressor.compress(calls)
+        res = self._client._redis.execute_command("system.batch", calls, "1" if self.concurrent else "0")
+        if self._client.data.compression:
+            res = [decompress(item) for item in res]
+        return self._results_set(res)
+
+    def _results_set(self, res):
+        """
+        :param res: list with the reply of every call
+        :return: list of the futures
+        """
+        for future, item in zip(self.futures, res):
+            future._set(item)
+        futures = self.sent = self.futures
+        self.calls = []
+        self.futures = []
+        return futures
+
+    def results(self):
+        """
+        :return: list of the decoded results of the calls which are sent, raises the error of the first failed call
+        """
+        return [future.result() for future in self.sent]
+
+    def __enter__(self):
+        if self._client._state.batch is not None:
+            raise RuntimeError("there is already a batch or pipeline in progress in this greenlet")
+        self._client._state.batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._client._state.batch = None
+        if exc_type is None:
+            self.send()
+
+
+class GedisPipeline(GedisBatch):
+    """
+    collects the calls of the generated methods and sends them as pipelined requests, in 1 write
+
+        with client.pipeline() as pipeline:
+            for name in names:
+                client.actors.dns.record_add(name=name, ip=ip)
+        records = pipeline.results()
+    """
+
+    def __init__(self, client):
+        """
+        :param client: GedisClient
+        """
+        GedisBatch.__init__(self, client)
+
+    def send(self):
+        """
+        send the calls, sets the results of the futures
+        :return: list of the futures
+        """
+        if not self.calls:
+            return []
+        pipe = self._client._redis.pipeline(transaction=False)
+        for cmd_name, args, headers in self.calls:
+            pipe.execute_command(cmd_name, *self._client._arguments_get(args, headers))
+        res = pipe.execute(raise_on_error=False)
+        if self._client.data.compression:
+            res = [result_decompress(item) for item in res]
+        return self._results_set(res)
@@ -1,9 +1,19 @@
 import imp
 import os
+import time
+from contextlib import contextmanager
+
 import nacl
+from gevent.local import local
 
+from DigitalMe.servers.gedis.compression import Compressor, codecs_available, result_decompress
 from Jumpscale import j
 from redis.connection import ConnectionError
+from redis.exceptions import ResponseError
+
+from .GedisBatch import GedisBatch, GedisPipeline
+from .GedisConnectionPool import GedisConnectionPool
+from .GedisSubscriber import GedisSubscriber
 
 JSConfigBase = j.application.JSBaseConfigClass
 
@@ -16,6 +26,17 @@ class GedisClientSchemas(j.application.JSBaseClass):
     pass
 
 
+class GedisCallState(local):
+    """
+    state of the calls of 1 greenlet (or thread) on a client
+    """
+
+    # GedisBatch or GedisPipeline the calls of the generated methods are added to, see batch()
+    batch = None
+    # time.monotonic() the calls inside a deadline() block have to be done by
+    deadline = None
+
+
 class GedisClient(JSConfigBase):
     _SCHEMATEXT = """
     @url = jumpscale.gedis.client
@@ -26,6 +47,13 @@ class GedisClient(JSConfigBase):
     password_ = "" (S)
     ssl = False (B)
     sslkey = "" (S)
+    compression = "" (S)
+    compression_min = 4096 (I)
+    timeout = 0 (F)
+    pool_size = 50 (I)
+    pool_timeout = 20 (I)
+    pool_idle_timeout = 300 (I)
+    pool_max_lifetime = 3600 (I)
     
     """
 
@@ -37,6 +65,10 @@ class GedisClient(JSConfigBase):
         j.sal.fs.createDir(self._code_generated_dir)
         j.sal.fs.touch(j.sal.fs.joinPaths(self._code_generated_dir, "__init__.py"))
         self._redis_ = None
+        # Compressor of the codec the server picked, set when the first connection is made
+        self._compressor = None
+        # batch & deadline of the greenlet making the calls, the client is shared by the greenlets
+        self._state = GedisCallState()
         self._reset()
 
     def _update_trigger(self, key, val):
@@ -59,10 +91,131 @@ class GedisClient(JSConfigBase):
         signing_key = nacl.signing.SigningKey(nacl_cl.privkey.encode())
         epoch = str(j.data.time.epoch)
         signed_message = signing_key.sign(epoch.encode())
-        cmd = "auth {} {} {}".format(bot_id, epoch, signed_message)
-        res = self._redis.execute_command(cmd)
+        res = self._redis.execute_command("auth", bot_id, epoch, signed_message)
         return res
 
+    def batch(self, concurrent=False):
+        """
+        the calls of the generated methods inside the with block are sent in 1 request (system.batch),
+        they return a GedisFuture, its result() is available after the block
+
+            with client.batch():
+                farmers = client.actors.farmer.farmers_get()
+                countries = client.actors.farmer.country_list()
+            farmers.result()
+
+        :param concurrent: the server executes the calls concurrently instead of one after the other
+        """
+        return GedisBatch(self, concurrent=concurrent)
+
+    def pipeline(self):
+        """
+        the calls of the generated methods inside the with block are sent as pipelined requests in 1 write,
+        they return a GedisFuture, the decoded results are available after the block
+
+            with client.pipeline() as pipeline:
+                for name in names:
+                    client.actors.dns.record_add(name=name, ip=ip)
+            records = pipeline.results()
+
+        unlike a batch every call is a request of its own for the server (rate limits, deadlines, statistics)
+        """
+        return GedisPipeline(self)
+
+    def subscribe(self, *channels):
+        """
+        receive the messages the server pushes on channels, instead of polling for them
+
+            subscriber = client.subscribe("chat.%s" % session_id, "job.%s" % job_id)
+            for channel, message in subscriber:
+                ...
+
+        :return: GedisSubscriber with its own RESP3 connection
+        """
+        return GedisSubscriber(self, channels)
+
+    @contextmanager
+    def deadline(self, timeout):
+        """
+        the calls of the generated methods inside the with block have to be done by the server within timeout sec,
+        overrules the timeout of the client
+
+            with client.deadline(0.5):
+                nodes = client.actors.farmer.node_find(country="Belgium")
+
+        every call sends the time left of the block, so the clocks of client & server don't need to be in sync,
+        the server doesn't execute a call whose deadline passed and stops executing it when the deadline passes,
+        the call raises a ResponseError starting with TIMEOUT
+        """
+        deadline_prev = self._state.deadline
+        self._state.deadline = time.monotonic() + timeout
+        try:
+            yield
+        finally:
+            self._state.deadline = deadline_prev
+
+    def _headers_get(self):
+        """
+        :return: the headers of a call, None when there are none
+        """
+        deadline = self._state.deadline
+        if deadline is not None:
+            # the time left of the block, the server starts counting when it receives the call
+            return {"timeout": round(max(0.0, deadline - time.monotonic()), 6)}
+        if self.data.timeout:
+            return {"timeout": self.data.timeout}
+        return None
+
+    def _call(self, cmd_name, args, decode):
+        """
+        called by the generated methods
+
+        :param decode: method decoding the reply of the server
+        :return: the decoded result, a GedisFuture when in a batch or pipeline
+        """
+        headers = self._headers_get()
+        batch = self._state.batch
+        if batch is not None:
+            return batch.add(cmd_name, args, decode, headers=headers)
+        res = self._redis.execute_command(cmd_name, *self._arguments_get(args, headers))
+        if self.data.compression:
+            res = result_decompress(res)
+        return decode(res)
+
+    def _arguments_get(self, args, headers=None):
+        """
+        :return: the arguments of a call as sent to the server, followed by the headers, compressed
+        """
+        if headers:
+            # the server takes the headers after the arguments of the method
+            args = list(args) + [j.data.serializers.json.dumps(headers)]
+        if self._compressor is not None:
+            args = self._compressor.arguments_compress(args)
+        return args
+
+    def _cursor_iterate(self, res, decode=None):
+        """
+        iterate over the result of a streamed cmd, the next chunks are asked to the server while iterating
+
+        :param res: reply of the streamed cmd [cursor_id, [first chunk]]
+        :param decode: method to decode 1 item
+        """
+        cursor_id, items = res
+        try:
+            while True:
+                for item in items:
+                    yield decode(item) if decode else item
+                if cursor_id == b"0":
+                    return
+                cursor_id, items = self._redis.execute_command("system.cursor_next", cursor_id)
+        finally:
+            if cursor_id != b"0":
+                # stopped iterating before the end, free the cursor on the server
+                try:
+                    self._redis.execute_command("system.cursor_close", cursor_id)
+                except ConnectionError:
+                    pass
+
     @property
     def actors(self):
 
@@ -74,7 +227,8 @@ class GedisClient(JSConfigBase):
             self.schemas = GedisClientSchemas()
 
             cmds_meta = self._redis.execute_command("api_meta_get", self.namespace)
-            cmds_meta = j.data.serializers.msgpack.loads(cmds_meta)
+            # the metadata of a namespace with many actors is above compression_min
+            cmds_meta = j.data.serializers.msgpack.loads(result_decompress(cmds_meta))
             if cmds_meta["cmds"] == {}:
                 raise RuntimeError("did not find any actors in namespace:%s" % self.namespace)
             for key, data in cmds_meta["cmds"].items():
@@ -122,32 +276,107 @@ class GedisClient(JSConfigBase):
         the postfix _cmd as is, do not capitalize it
         if it is testtest_cmd, then you should call it by testtest
 
+        when host is a path the client connects to the unix socket of the server (unix_socket in its config)
+
+        the redis instance can be shared by many greenlets, every cmd gets a connection of the GedisConnectionPool,
+        max pool_size connections are made
+
         :return: redis instance
         """
         if self._redis_ is None:
             addr = self.data.host
             port = self.data.port
             secret = self.data.password_
-            ssl_certfile = self.data.sslkey
 
-            if self.data.ssl:
-                if not self.data.sslkey:
-                    ssl_certfile = j.sal.fs.joinPaths(os.path.dirname(self._code_generated_dir), "ca.crt")
-                self._log_info("redisclient: %s:%s (ssl:True  cert:%s)" % (addr, port, ssl_certfile))
+            if addr.startswith("/"):
+                self._log_info("redisclient: %s (unix socket)" % addr)
+                self._redis_ = j.clients.redis.get(unixsocket=addr, password=secret, ping=False, fromcache=False)
             else:
-                self._log_info("redisclient: %s:%s " % (addr, port))
-
-            self._redis_ = j.clients.redis.get(
-                ipaddr=addr,
-                port=port,
-                password=secret,
-                ssl=self.data.ssl,
-                ssl_ca_certs=ssl_certfile,
-                ping=False,
-                fromcache=False,
+                ssl_certfile = None
+                if self.data.ssl:
+                    ssl_certfile = self._ssl_certfile_get()
+                    self._log_info("redisclient: %s:%s (ssl:True  cert:%s)" % (addr, port, ssl_certfile))
+                else:
+                    self._log_info("redisclient: %s:%s " % (addr, port))
+
+                self._redis_ = j.clients.redis.get(
+                    ipaddr=addr,
+                    port=port,
+                    password=secret,
+                    ssl=self.data.ssl,
+                    ssl_ca_certs=ssl_certfile,
+                    ping=False,
+                    fromcache=False,
+                )
+            self._redis_.connection_pool = GedisConnectionPool.from_pool(
+                self._redis_.connection_pool,
+                size=self.data.pool_size,
+                timeout=self.data.pool_timeout or None,
+                idle_timeout=self.data.pool_idle_timeout,
+                max_lifetime=self.data.pool_max_lifetime,
             )
+            if self.data.compression:
+                self._compression_setup(self._redis_)
         return self._redis_
 
+    def _ssl_certfile_get(self):
+        """
+        :return: path of the ca certificate the server certificate is verified with,
+                 sslkey of the config or the ca.crt of the generated code
+        """
+        if self.data.sslkey:
+            return self.data.sslkey
+        return j.sal.fs.joinPaths(os.path.dirname(self._code_generated_dir), "ca.crt")
+
+    def _compression_setup(self, redis):
+        """
+        every connection of the pool asks the server to compress with HELLO ... COMPRESSION
+        when it is made, a server which doesn't support it keeps sending uncompressed values
+
+        only the codecs of the config which are installed are offered
+        """
+        client = self
+        codecs = [name.strip().lower() for name in self.data.compression.split(",")]
+        codecs = [name for name in codecs if name in codecs_available()]
+        if not codecs:
+            self._log_warning("none of the compression codecs %s is installed" % self.data.compression)
+            return
+        pool = redis.connection_pool
+        connection_class = pool.connection_class
+
+        class GedisConnection(connection_class):
+            def on_connect(self):
+                connection_class.on_connect(self)
+                self.send_command("HELLO", "2", "COMPRESSION", ",".join(codecs))
+                try:
+                    reply = self.read_response()
+                except ResponseError as e:
+                    client._log_warning("server does not support compression: %s" % e)
+                    return
+                if not client._compression_negotiated(reply):
+                    # the server compresses with a codec the client doesn't have, switch it off
+                    self.send_command("HELLO", "2", "COMPRESSION", "")
+                    self.read_response()
+
+        pool.connection_class = GedisConnection
+
+    def _compression_negotiated(self, reply):
+        """
+        :param reply: of HELLO, key value pairs
+        :return: False when the server picked a codec which is not installed, the connection is not compressed then
+        """
+        props = dict(zip(reply[::2], reply[1::2]))
+        name = props.get(b"compression")
+        if not name:
+            return True
+        try:
+            self._compressor = Compressor(name.decode(), min_size=self.data.compression_min)
+        except ValueError as e:
+            self._log_warning("no compression: %s" % e)
+            self._compressor = None
+            return False
+        return True
+
     # def __getattr__(self, name):
     #     if name.startswith("_") or name in self._methods() or name in self._properties():
     #         return self.__getattribute__(name)
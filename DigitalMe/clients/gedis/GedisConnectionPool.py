@@ -0,0 +1,135 @@
+import time
+
+from gevent.queue import LifoQueue
+from redis.connection import BlockingConnectionPool
+from redis.exceptions import ConnectionError, TimeoutError
+
+# nr of seconds between 2 checks for idle connections
+SWEEP_INTERVAL = 10
+
+
+class GedisConnectionPool(BlockingConnectionPool):
+    """
+    bounded pool of the connections of a GedisClient, every greenlet executing a cmd gets a connection of its own,
+    when all connections are in use it waits (max timeout sec) until one is released
+
+    - a connection which was idle for more than ping_interval sec is pinged before it's used,
+      a dead one is reconnected
+    - connections idle for more than idle_timeout sec are closed, they are connected again when needed
+    - connections older than max_lifetime sec are closed when released (e.g. to follow a load balancer)
+
+    the connection class & arguments (tcp, ssl, unix socket) are the ones of the pool it replaces, see from_pool()
+    """
+
+    def __init__(
+        self,
+        size=50,
+        timeout=20,
+        idle_timeout=300,
+        max_lifetime=3600,
+        ping_interval=30,
+        connection_class=None,
+        **connection_kwargs
+    ):
+        """
+        :param size: max nr of connections
+        :param timeout: max nr of seconds to wait for a connection, None is forever
+        :param idle_timeout: nr of seconds after which an unused connection is closed, 0 is never
+        :param max_lifetime: nr of seconds after which a connection is closed when released, 0 is never
+        :param ping_interval: idle nr of seconds after which a connection is pinged before being used
+        """
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self._idle_since = {}  # connection in the pool -> time it was released
+        self._sweep_next = 0
+        BlockingConnectionPool.__init__(
+            self,
+            max_connections=size,
+            timeout=timeout,
+            connection_class=_connection_class_get(connection_class),
+            queue_class=LifoQueue,
+            **connection_kwargs
+        )
+
+    @classmethod
+    def from_pool(cls, pool, **kwargs):
+        """
+        :param pool: redis ConnectionPool, its connections are closed
+        :return: GedisConnectionPool making the same connections as pool
+        """
+        pool.disconnect()
+        connection_kwargs = dict(pool.connection_kwargs)
+        connection_kwargs.update(kwargs)
+        return cls(connection_class=pool.connection_class, **connection_kwargs)
+
+    def get_connection(self, command_name, *keys, **options):
+        connection = BlockingConnectionPool.get_connection(self, command_name, *keys, **options)
+        released = self._idle_since.pop(connection, None)
+        if released is None or connection.connected_at > released:
+            # new or reconnected
+            return connection
+        if time.monotonic() - released > self.ping_interval:
+            try:
+                self._health_check(connection)
+            except BaseException:
+                self.release(connection)
+                raise
+        return connection
+
+    def _health_check(self, connection):
+        """
+        ping the connection, reconnect when it's dead
+        """
+        try:
+            connection.send_command("PING")
+            if connection.read_response() not in (b"PONG", "PONG"):
+                raise ConnectionError("bad reply on PING")
+        except (ConnectionError, TimeoutError):
+            connection.disconnect()
+            connection.connect()
+
+    def release(self, connection):
+        now = time.monotonic()
+        if self.max_lifetime and connection.connected_at and now - connection.connected_at > self.max_lifetime:
+            connection.disconnect()
+        if self.owns_connection(connection):
+            self._idle_since[connection] = now
+        BlockingConnectionPool.release(self, connection)
+        if now >= self._sweep_next:
+            self._sweep(now)
+
+    def _sweep(self, now):
+        """
+        close the connections which are idle for more than idle_timeout
+        """
+        self._sweep_next = now + SWEEP_INTERVAL
+        if not self.idle_timeout:
+            return
+        for connection, released in list(self._idle_since.items()):
+            if now - released > self.idle_timeout:
+                connection.disconnect()
+                del self._idle_since[connection]
+
+    def reset(self):
+        self._idle_since = {}
+        BlockingConnectionPool.reset(self)
+
+
+def _connection_class_get(connection_class):
+    """
+    :return: subclass of connection_class which remembers when it connected
+    """
+    if connection_class is None:
+        from redis.connection import Connection
+
+        connection_class = Connection
+
+    class GedisPoolConnection(connection_class):
+        connected_at = 0
+
+        def on_connect(self):
+            self.connected_at = time.monotonic()
+            connection_class.on_connect(self)
+
+    return GedisPoolConnection
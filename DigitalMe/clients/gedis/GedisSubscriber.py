@@ -0,0 +1,128 @@
+import collections
+import socket
+
+from Jumpscale import j
+from redis.exceptions import ConnectionError, ResponseError
+
+
+class GedisSubscriber(j.application.JSBaseClass):
+    """
+    own RESP3 connection (HELLO 3) subscribed to channels of the gedis server, the server pushes the messages
+
+        subscriber = client.subscribe("chat.%s" % session_id)
+        for channel, message in subscriber:
+            ...
+        subscriber.close()
+    """
+
+    def __init__(self, client, channels):
+        j.application.JSBaseClass.__init__(self)
+        self._client = client
+        self._sock = None
+        self._file = None
+        self.channels = set()
+        self._messages = collections.deque()  # received while waiting for the reply of (UN)SUBSCRIBE
+        self._connect()
+        self.subscribe(*channels)
+
+    def _connect(self):
+        data = self._client.data
+        if data.host.startswith("/"):
+            # unix socket of the server
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(data.host)
+        else:
+            sock = socket.create_connection((data.host, int(data.port)))
+        if data.ssl and not data.host.startswith("/"):
+            import ssl
+
+            # same certificate as the connections of the client, the hostname is not checked either
+            # (a server listening on 0.0.0.0 has a certificate for its name, not for the address the client uses)
+            context = ssl.create_default_context(cafile=self._client._ssl_certfile_get())
+            context.check_hostname = False
+            sock = context.wrap_socket(sock, server_hostname=data.host)
+        self._sock = sock
+        self._file = sock.makefile("rb")
+        self._send("HELLO", "3")
+        self._read()
+
+    def _send(self, *args):
+        buffer = bytearray(b"*%d\r\n" % len(args))
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode()
+            buffer += b"$%d\r\n%s\r\n" % (len(arg), arg)
+        self._sock.sendall(buffer)
+
+    def subscribe(self, *channels):
+        self._send("SUBSCRIBE", *channels)
+        self._replies_wait(b"subscribe", len(channels))
+        self.channels.update(channels)
+
+    def unsubscribe(self, *channels):
+        channels = channels or list(self.channels)
+        if not channels:
+            return
+        self._send("UNSUBSCRIBE", *channels)
+        self._replies_wait(b"unsubscribe", len(channels))
+        self.channels.difference_update(channels)
+
+    def _replies_wait(self, kind, nr):
+        while nr:
+            reply = self._read()
+            if reply[0] == b"message":
+                self._messages.append(reply)
+            elif reply[0] == kind:
+                nr -= 1
+
+    def get(self):
+        """
+        wait for the next message
+        :return: (channel, message)
+        """
+        while True:
+            reply = self._messages.popleft() if self._messages else self._read()
+            if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                return reply[1].decode(), reply[2]
+
+    def __iter__(self):
+        while True:
+            yield self.get()
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = None
+
+    def _read(self):
+        """
+        :return: the next value the server sent, RESP2 & RESP3 types
+        """
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("connection closed by the gedis server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise ResponseError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$" or kind == b"=":
+            if rest == b"-1":
+                return None
+            data = self._file.read(int(rest) + 2)[:-2]
+            return data[4:] if kind == b"=" else data
+        if kind == b"_":
+            return None
+        if kind == b"#":
+            return rest == b"t"
+        if kind == b",":
+            return float(rest)
+        if kind in b"*>~":
+            if rest == b"-1":
+                return None
+            return [self._read() for _ in range(int(rest))]
+        if kind == b"%":
+            return {self._read(): self._read() for _ in range(int(rest))}
+        raise ConnectionError("protocol error, unknown type %r" % kind)
@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+
+import pytest
+
+from DigitalMe.clients.gedis.GedisClient import GedisClient
+from DigitalMe.servers.gedis import compression
+
+
+class FakeConnection:
+    """
+    connection of the pool, the server replies to HELLO with the codec of replies
+    """
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.commands = []
+
+    def on_connect(self):
+        pass
+
+    def send_command(self, *args):
+        self.commands.append(args)
+
+    def read_response(self):
+        return self.replies.pop(0)
+
+
+class FakeClient:
+    _compression_setup = GedisClient._compression_setup
+    _compression_negotiated = GedisClient._compression_negotiated
+
+    def __init__(self, compression):
+        self.data = SimpleNamespace(compression=compression, compression_min=100)
+        self._compressor = None
+        self.warnings = []
+
+    def _log_warning(self, msg):
+        self.warnings.append(msg)
+
+
+def hello(codec):
+    return [
+        b"server",
+        b"gedis",
+        b"proto",
+        2,
+        b"content_type",
+        b"auto",
+        b"response_type",
+        b"auto",
+        b"compression",
+        codec,
+    ]
+
+
+@pytest.fixture
+def lz4_missing(monkeypatch):
+    if "zstd" not in compression.codecs_available():
+        pytest.skip("zstd is not installed")
+    monkeypatch.setattr(compression, "_loaded", {b"4": None})
+
+
+def connect(client, replies):
+    """
+    :return: connection of the pool after on_connect
+    """
+    redis = SimpleNamespace(connection_pool=SimpleNamespace(connection_class=FakeConnection))
+    client._compression_setup(redis)
+    connection = redis.connection_pool.connection_class(replies)
+    connection.on_connect()
+    return connection
+
+
+def test_compression_offer_installed(lz4_missing):
+    client = FakeClient("lz4,zstd")
+    connection = connect(client, [hello(b"zstd")])
+    assert connection.commands == [("HELLO", "2", "COMPRESSION", "zstd")]
+    assert client._compressor.name == "zstd"
+
+    # none installed, the connections are not compressed
+    client = FakeClient("lz4")
+    redis = SimpleNamespace(connection_pool=SimpleNamespace(connection_class=FakeConnection))
+    client._compression_setup(redis)
+    assert redis.connection_pool.connection_class is FakeConnection
+    assert client.warnings
+
+
+def test_compression_codec_missing(lz4_missing):
+    with pytest.raises(ValueError):
+        compression.Compressor("lz4")
+
+    # the server picked a codec the client doesn't have, compression is switched off on the connection
+    client = FakeClient("zstd")
+    connection = connect(client, [hello(b"lz4"), hello(b"")])
+    assert connection.commands == [("HELLO", "2", "COMPRESSION", "zstd"), ("HELLO", "2", "COMPRESSION", "")]
+    assert client._compressor is None
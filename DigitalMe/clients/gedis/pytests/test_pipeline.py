@@ -0,0 +1,102 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from redis.exceptions import ResponseError
+
+from DigitalMe.clients.gedis.GedisBatch import GedisPipeline
+from DigitalMe.clients.gedis.GedisClient import GedisCallState, GedisClient
+
+
+class FakePipeline:
+    def __init__(self, replies):
+        self.replies = replies
+        self.commands = []
+
+    def execute_command(self, *args):
+        self.commands.append(args)
+
+    def execute(self, raise_on_error=True):
+        return [self.replies[args[1]] for args in self.commands]
+
+
+class FakeClient:
+    """
+    the call path of GedisClient on a redis pipeline replying the value of replies for the 1st argument
+    """
+
+    _call = GedisClient._call
+    _headers_get = GedisClient._headers_get
+    _arguments_get = GedisClient._arguments_get
+    pipeline = GedisClient.pipeline
+    deadline = GedisClient.deadline
+
+    def __init__(self, replies):
+        self.data = SimpleNamespace(compression="", timeout=0)
+        self._compressor = None
+        self._state = GedisCallState()
+        self.pipe = FakePipeline(replies)
+        self._redis = SimpleNamespace(pipeline=lambda transaction: self.pipe)
+
+
+class SchemaOut:
+    """
+    like the schema_out of a generated method
+    """
+
+    def get(self, data):
+        return {"name": data.decode()}
+
+
+def test_pipeline_decode():
+    client = FakeClient({"a": b"alice", "b": b"bob"})
+    schema_out = SchemaOut()
+    with client.pipeline() as pipeline:
+        futures = [client._call("actor.user_get", [name], lambda res: schema_out.get(data=res)) for name in "ab"]
+        assert not futures[0].done
+    # 1 pipelined request per call
+    assert client.pipe.commands == [("actor.user_get", "a"), ("actor.user_get", "b")]
+    assert pipeline.results() == [{"name": "alice"}, {"name": "bob"}]
+    assert [future.result() for future in futures] == pipeline.results()
+    assert client._state.batch is None
+
+
+def test_pipeline_error():
+    client = FakeClient({"a": b"alice", "b": ResponseError("TIMEOUT deadline passed"), "c": b"carol"})
+    schema_out = SchemaOut()
+    with client.pipeline() as pipeline:
+        futures = [client._call("actor.user_get", [name], lambda res: schema_out.get(data=res)) for name in "abc"]
+
+    # only the future of the failed call has the error
+    assert futures[0].result() == {"name": "alice"}
+    assert futures[2].result() == {"name": "carol"}
+    assert futures[1]._error is not None
+    assert futures[0]._error is None and futures[2]._error is None
+    with pytest.raises(ResponseError):
+        futures[1].result()
+    with pytest.raises(ResponseError):
+        pipeline.results()
+
+
+def test_pipeline_headers():
+    client = FakeClient({"a": b"alice"})
+    client.data.timeout = 5
+    with client.pipeline():
+        client._call("actor.user_get", ["a"], lambda res: res)
+    cmd_name, arg, headers = client.pipe.commands[0]
+    assert json.loads(headers) == {"timeout": 5}
+
+    # the time left of the block
+    with client.deadline(2):
+        with client.pipeline():
+            client._call("actor.user_get", ["a"], lambda res: res)
+    cmd_name, arg, headers = client.pipe.commands[1]
+    assert 1.9 < json.loads(headers)["timeout"] <= 2
+
+
+def test_pipeline_nested():
+    client = FakeClient({})
+    with pytest.raises(RuntimeError):
+        with GedisPipeline(client):
+            with GedisPipeline(client):
+                pass
@@ -0,0 +1,118 @@
+import socket
+import threading
+
+import gevent
+import pytest
+from redis.exceptions import ConnectionError
+
+from DigitalMe.clients.gedis import GedisConnectionPool as pool_module
+from DigitalMe.clients.gedis.GedisClient import GedisCallState
+from DigitalMe.clients.gedis.GedisConnectionPool import GedisConnectionPool
+
+
+@pytest.fixture
+def port():
+    """
+    server replying +PONG to every cmd
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(16)
+
+    def serve(conn):
+        with conn:
+            while conn.recv(65536):
+                conn.sendall(b"+PONG\r\n")
+
+    def accept():
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+@pytest.fixture
+def now(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(pool_module.time, "monotonic", lambda: clock[0])
+    return clock
+
+
+def test_checkout(port):
+    pool = GedisConnectionPool(size=2, timeout=0.1, port=port)
+    connection1 = pool.get_connection("ping")
+    connection2 = pool.get_connection("ping")
+    assert connection1 is not connection2
+    # all connections are in use
+    with pytest.raises(ConnectionError):
+        pool.get_connection("ping")
+
+    pool.release(connection2)
+    # the connection used last is used first, the others can become idle
+    assert pool.get_connection("ping") is connection2
+    pool.release(connection1)
+    pool.release(connection2)
+    pool.disconnect()
+
+
+def test_idle_eviction(port, now):
+    pool = GedisConnectionPool(size=2, idle_timeout=60, port=port)
+    connection1 = pool.get_connection("ping")
+    connection2 = pool.get_connection("ping")
+    pool.release(connection1)
+
+    now[0] += 61
+    # the next sweep closes connection1, connection2 was just used
+    pool.release(connection2)
+    assert connection1._sock is None
+    assert connection2._sock is not None
+
+    # connected again when needed
+    connection = pool.get_connection("ping")
+    connection.send_command("PING")
+    assert connection.read_response() == b"PONG"
+    pool.release(connection)
+    pool.disconnect()
+
+
+def test_max_lifetime(port, now):
+    pool = GedisConnectionPool(size=1, max_lifetime=3600, port=port)
+    connection = pool.get_connection("ping")
+    connected_at = connection.connected_at
+    pool.release(connection)
+    assert connection._sock is not None
+
+    now[0] += 3601
+    assert pool.get_connection("ping") is connection
+    pool.release(connection)
+    # too old, closed when released and made again on the next use
+    assert connection._sock is None
+    connection = pool.get_connection("ping")
+    connection.send_command("PING")
+    assert connection.read_response() == b"PONG"
+    assert connection.connected_at > connected_at
+    pool.release(connection)
+    pool.disconnect()
+
+
+def test_call_state_per_greenlet():
+    state = GedisCallState()
+    state.deadline = 10
+
+    def greenlet_state():
+        assert state.deadline is None
+        state.batch = "batch"
+        gevent.sleep(0)
+        return state.batch
+
+    greenlets = [gevent.spawn(greenlet_state) for _ in range(2)]
+    gevent.joinall(greenlets, raise_error=True)
+    assert [g.value for g in greenlets] == ["batch", "batch"]
+    assert state.deadline == 10
+    assert state.batch is None
@@ -12,6 +12,32 @@ class GedisClientGenerated():
         self._client = client
         self._redis = client._redis
 
+    def batch(self, concurrent=False):
+        """
+        the calls of the methods inside the with block are sent in 1 request (system.batch),
+        they return a future, its result() is available after the block
+
+            with client.actors.farmer.batch():
+                farmers = client.actors.farmer.farmers_get()
+                countries = client.actors.farmer.country_list()
+            farmers.result()
+
+        :param concurrent: the server executes the calls concurrently instead of one after the other
+        """
+        return self._client.batch(concurrent=concurrent)
+
+    def pipeline(self):
+        """
+        the calls of the methods inside the with block are sent as pipelined requests in 1 write,
+        they return a future, the decoded results are available after the block
+
+            with client.actors.dns.pipeline() as pipeline:
+                for name in names:
+                    client.actors.dns.record_add(name=name, ip=ip)
+            records = pipeline.results()
+        """
+        return self._client.pipeline()
+
     {# generate the actions #}
     {% for name,cmd in obj.cmds.items() %}
 
@@ -32,32 +58,35 @@ class GedisClientGenerated():
         {% endfor %}
 
         id2 = id if not callable(id) else None #if id specified will put in id2 otherwise will be None
-        res = self._redis.execute_command(cmd_name,j.data.serializers.msgpack.dumps([id2, args._data]))
+        args = [j.data.serializers.msgpack.dumps([id2, args._data])]
 
         {% else %}  #is for non schema based
 
         {% set args = cmd.cmdobj.args if cmd.cmdobj.args else [] %}
-
-        {% if args|length == 0 %}
-        res =  self._redis.execute_command(cmd_name)
-        {% else %}
         # send multi args with no prior knowledge of schema
-        res = self._redis.execute_command(cmd_name, {{ cmd.args_client.lstrip(',')}})
-        {% endif %} #args bigger than []
+        args = [{% for arg in args %}{{ arg.split("=")[0].strip() }}, {% endfor %}]
         {% endif %} #end of test if is schema_in based or not
 
-        {% if cmd.schema_out != None %}
-        # print("{{cmd.schema_out.url}}")
-        schema_out = j.data.schema.get_from_url_latest(url="{{cmd.schema_out.url}}")
-        if isinstance(res, list):
-            res2 = list(map(lambda x: schema_out.get(data=x), res))
-        else:
-            res2 = schema_out.get(data=res)
-        {% else %}
-        res2 = res
-        {% endif %}
-
-        return res2
+        def decode(res):
+            {% if cmd.stream %}
+            # result is streamed, iterate over it, the next chunks are fetched while iterating
+            {% if cmd.schema_out != None %}
+            schema_out = j.data.schema.get_from_url_latest(url="{{cmd.schema_out.url}}")
+            return self._client._cursor_iterate(res, lambda x: schema_out.get(data=x))
+            {% else %}
+            return self._client._cursor_iterate(res)
+            {% endif %}
+            {% elif cmd.schema_out != None %}
+            schema_out = j.data.schema.get_from_url_latest(url="{{cmd.schema_out.url}}")
+            if isinstance(res, list):
+                return list(map(lambda x: schema_out.get(data=x), res))
+            return schema_out.get(data=res)
+            {% else %}
+            return res
+            {% endif %}
+
+        # executed right away, or added to the batch of the client (returns a future)
+        return self._client._call(cmd_name, args, decode)
 
 
     {% endfor %}
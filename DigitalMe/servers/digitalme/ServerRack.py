@@ -1,5 +1,6 @@
 from Jumpscale import j
 import os
+import signal
 import sys
 from importlib import import_module
 
@@ -18,6 +19,7 @@ class ServerRack(JSBASE):
     def __init__(self):
         JSBASE.__init__(self)
         self.servers = {}
+        self.workers = None
         self._monkeypatch_done = False
 
     def add(self, name, server):
@@ -68,8 +70,34 @@ class ServerRack(JSBASE):
             name, data={"template_repo": "git@github.com:threefoldtech/0-templates.git", "block": False}
         )
 
-    def start(self):
+    def start(self, workers=1):
+        """
+        :param workers: nr of processes serving, forked once all servers are added,
+                        each process binds the addresses of the servers with SO_REUSEPORT
+        """
         self._monkeypatch()
+        if workers > 1:
+            from DigitalMe.servers.gedis.GedisWorkers import GedisWorkers
+
+            self.workers = GedisWorkers(self._worker_serve, size=workers)
+            try:
+                self.workers.start()
+            except KeyboardInterrupt:
+                self.workers.stop()
+            return
+        self._serve()
+
+    def _worker_serve(self, nr):
+        from DigitalMe.servers.gedis.GedisWorkers import reuseport_listener
+
+        self.workers = None
+        for server in self.servers.values():
+            if getattr(server, "socket", None) is None and isinstance(getattr(server, "address", None), tuple):
+                # gevent server which didn't bind yet
+                server.socket = reuseport_listener(server.address)
+        self._serve()
+
+    def _serve(self):
         started = []
         try:
             for key, server in self.servers.items():
@@ -82,10 +110,13 @@ class ServerRack(JSBASE):
             raise
 
         forever = event.Event()
+        stop_handler = gevent.signal(signal.SIGTERM, forever.set)
         try:
             forever.wait()
         except KeyboardInterrupt:
-            self.stop()
+            pass
+        stop_handler.cancel()
+        self.stop()
 
     def stop(self, servers=None):
         self._log_info("stopping server rack")
@@ -0,0 +1,440 @@
+import asyncio
+import collections
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from Jumpscale import j
+
+from .cache import MISS
+from .GedisWorkers import unix_listener
+from .compression import arguments_decompress
+from .handlers import (
+    BATCH_NAMES,
+    PIPELINE_FLUSH_MAX,
+    BusyError,
+    DeadlineError,
+    Handler,
+    Request,
+    ResponseWriter,
+    Session,
+)
+from .ratelimit import RateLimitError
+from .protocol import RedisRequestReader
+
+JSBASE = j.application.JSBaseClass
+
+
+class _TransportSocket:
+    """
+    the part of a socket the RedisResponseWriter uses, on top of an asyncio transport
+    """
+
+    __slots__ = ("transport",)
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def sendall(self, data):
+        self.transport.write(data)
+
+
+class GedisProtocol(asyncio.Protocol):
+    """
+    1 connection of a client, the requests are executed one after the other so the replies keep their order
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.reader = RedisRequestReader()
+        self.requests = collections.deque()  # Request objects received and not processed yet
+        self.session = Session()
+        self.transport = None
+        self.writer = None
+        self.address = None
+        self.task = None
+        self.loop = None
+        self.reading = True
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.writer = ResponseWriter(_TransportSocket(transport))
+        # (ip, port), ipv6 adds flowinfo & scope id, a client on the unix socket has no address
+        self.address = (transport.get_extra_info("peername") or ("unix", 0))[:2]
+        self.loop = asyncio.get_event_loop()
+        self.session.push = self.push
+        self.handler.connection_made(self)
+
+    def data_received(self, data):
+        try:
+            # made when received, the timeout of a request starts then
+            self.requests.extend(Request(raw_request) for raw_request in self.reader.feed(data))
+        except ValueError as e:
+            self.writer.error(str(e))
+            self.transport.close()
+            return
+        if self.requests and self.task is None:
+            self.task = asyncio.ensure_future(self.handler.requests_process(self))
+        if self.reading and len(self.requests) >= PIPELINE_FLUSH_MAX:
+            # the client sends faster than we execute
+            self.transport.pause_reading()
+            self.reading = False
+
+    def connection_lost(self, exc):
+        self.handler.connection_lost(self)
+        self._writable.set()
+        if self.task is not None:
+            self.task.cancel()
+
+    def push(self, message):
+        """
+        send a Push (RESP3) to the client, can be called from any thread
+        """
+        if self.transport is None or self.transport.is_closing():
+            raise ConnectionError("connection is closed")
+        self.loop.call_soon_threadsafe(self._push, message)
+
+    def _push(self, message):
+        if not self.transport.is_closing():
+            self.writer.push(message)
+
+    def pause_writing(self):
+        self._writable.clear()
+
+    def resume_writing(self):
+        self._writable.set()
+
+    async def drain(self):
+        """
+        wait until the replies which are written are sent (enough) to the client
+        """
+        await self._writable.wait()
+
+
+class AsyncHandler(Handler):
+    """
+    executes the requests of the asyncio backend
+
+    async def methods of the actors are awaited in the event loop,
+    the other methods are executed in a thread pool so they don't block the loop
+    """
+
+    def __init__(self, gedis_server, threads=None):
+        """
+        :param threads: max nr of threads executing the methods which are not async, None is the default of python
+        """
+        Handler.__init__(self, gedis_server)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="gedis")
+        # set once all connections are idle after drain()
+        self._idle = None
+        # event loop serving the connections, set by GedisAsyncServer.start()
+        self.loop = None
+
+    def connection_made(self, protocol):
+        if self.draining:
+            protocol.transport.close()
+            return
+        session = protocol.session
+        session.admitted = not self.connections_max or self.connections_active < self.connections_max
+        if session.admitted:
+            self.connections_active += 1
+        self.connections[protocol] = session
+        self._log_info("new incoming connection", context="%s:%s" % protocol.address)
+
+    def connection_lost(self, protocol):
+        session = self.connections.pop(protocol, None)
+        self.pubsub.unsubscribe_all(protocol.session)
+        if session is not None and session.admitted:
+            self.connections_active -= 1
+        self._idle_check()
+        self._log_info("connection closed", context="%s:%s" % protocol.address)
+
+    async def requests_process(self, protocol):
+        """
+        execute the requests received on 1 connection, the replies of pipelined requests are sent in 1 write
+        """
+        session = protocol.session
+        writer = protocol.writer
+        address = protocol.address
+        nr_buffered = 0
+        try:
+            while protocol.requests:
+                session.idle = False
+                request = protocol.requests.popleft()
+                try:
+                    await self._request_process_async(writer, request, address, session)
+                except BusyError as e:
+                    writer.error(str(e), flush=False, code="BUSY")
+                    if not session.admitted:
+                        # shed the connection, the client can come back later
+                        writer.flush()
+                        protocol.transport.close()
+                        return
+                except (DeadlineError, RateLimitError) as e:
+                    writer.error(str(e), flush=False, code=e.code)
+                except Exception as e:
+                    self._log_error(str(e), context="%s:%s" % address)
+                    writer.error(str(e), flush=False)
+
+                nr_buffered += 1
+                if nr_buffered >= PIPELINE_FLUSH_MAX or not protocol.requests:
+                    writer.flush()
+                    nr_buffered = 0
+                    await protocol.drain()
+                if not protocol.reading and len(protocol.requests) < PIPELINE_FLUSH_MAX // 2:
+                    protocol.transport.resume_reading()
+                    protocol.reading = True
+        finally:
+            protocol.task = None
+            session.idle = True
+            if self.draining:
+                protocol.transport.close()
+                self._idle_check()
+
+    async def _request_process_async(self, writer, request, address, session):
+        """
+        execute the request and write the result in the write buffer, keeps the statistics
+        """
+        request.session = session
+        self.nr_requests += 1
+        buffered = writer.buffered
+        start = time.perf_counter()
+        error = True
+        try:
+            if session.compressor is not None:
+                request.arguments = arguments_decompress(request.arguments)
+                result = session.compressor.result_compress(await self._handle_request_async(request, address, session))
+            else:
+                result = await self._handle_request_async(request, address, session)
+            writer.write(result, flush=False, resp3=session.protover == 3)
+            error = False
+        finally:
+            self._request_record(request, address, time.perf_counter() - start, writer.buffered - buffered, error)
+
+    async def _handle_request_async(self, request, address, session):
+        cmd = self.dispatch.get(request.name)
+        if cmd is None:
+            if request.name.lower() in BATCH_NAMES:
+                return await self._batch_async(request, address, session)
+            result = self._predefined_process(request, address, session)
+            if result is not MISS:
+                return result
+            cmd = self._cmd_get(request)
+        request.cmd = cmd
+        self.ratelimits.check(cmd.key, session.dmid or address[0])
+        self._headers_split(cmd, request)
+        time_left = self._deadline_check(request)
+
+        cache_key = None
+        if cmd.cache:
+            cache_key = (cmd.key, tuple(request.arguments), request.content_type, request.response_type)
+            result = self.cache.get(cache_key)
+            if result is not MISS:
+                return result
+
+        self._admit(cmd, session)
+
+        self.requests_active += 1
+        try:
+            if time_left is None:
+                result = await self._execute_async(cmd, request)
+            else:
+                # the coroutine is cancelled when the deadline passes,
+                # a method executed in the thread pool can't be stopped, its result is dropped
+                result = await asyncio.wait_for(self._execute_async(cmd, request), time_left)
+        except asyncio.TimeoutError:
+            if time_left is None:
+                raise
+            raise DeadlineError("deadline of %s passed while executing it" % cmd.key)
+        finally:
+            self.requests_active -= 1
+
+        if cache_key is not None:
+            self.cache.set(cache_key, result, cmd.cache)
+        return result
+
+    async def _batch_async(self, request, address, session):
+        """
+        like Handler._batch
+        """
+        requests, concurrent = self._batch_requests_get(request)
+        if concurrent:
+            return await asyncio.gather(*[self._batch_call_async(item, address, session) for item in requests])
+        return [await self._batch_call_async(item, address, session) for item in requests]
+
+    async def _batch_call_async(self, request, address, session):
+        request.session = session
+        start = time.perf_counter()
+        error = True
+        try:
+            result = await self._handle_request_async(request, address, session)
+            error = False
+            return result
+        except Exception as e:
+            return e
+        finally:
+            self._request_record(request, address, time.perf_counter() - start, 0, error)
+
+    async def _execute_async(self, cmd, request):
+        """
+        like Handler._execute, the cpu bound cmds are executed in the thread pool as well
+        """
+        start = time.perf_counter()
+        params_list, params_dict = self._params_get(cmd, request)
+        decoded = time.perf_counter()
+        request.time_decode = decoded - start
+        if cmd.coroutine:
+            result = await cmd.method(*params_list, **params_dict)
+        else:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(self.executor, partial(cmd.method, *params_list, **params_dict))
+        request.time_execute = time.perf_counter() - decoded
+        return self._result_process(cmd, request, result)
+
+    def actor_evict(self, namespace, actor):
+        """
+        like Handler.actor_evict, done in the event loop because the reload can run in a thread of the pool
+        """
+        if self.loop is None:
+            Handler.actor_evict(self, namespace, actor)
+        else:
+            self.loop.call_soon_threadsafe(Handler.actor_evict, self, namespace, actor)
+
+    def drain(self):
+        """
+        stop reading new requests, idle connections are closed right away,
+        the others once the requests they already received are done
+        """
+        self.draining = True
+        self._idle = asyncio.Event()
+        for protocol, session in list(self.connections.items()):
+            protocol.transport.pause_reading()
+            if session.idle:
+                protocol.transport.close()
+        self._idle_check()
+
+    def _idle_check(self):
+        if self._idle is not None and all(session.idle for session in self.connections.values()):
+            self._idle.set()
+
+    async def wait_idle(self):
+        """
+        wait until the requests running when drain() was called are done
+        """
+        await self._idle.wait()
+
+
+class GedisAsyncServer(JSBASE):
+    """
+    asyncio backend of a gedis server, serves the actors of the gedis server without gevent
+
+    to embed gedis in an asyncio service:
+
+        gedis = j.servers.gedis.get("main")
+        server = gedis.asyncio_server_get()
+        await server.start()
+        ...
+        await server.stop()
+    """
+
+    def __init__(self, gedis_server, threads=None):
+        """
+        :param gedis_server: GedisServer with the actors
+        :param threads: max nr of threads executing the methods which are not async
+        """
+        JSBASE.__init__(self)
+        self.gedis_server = gedis_server
+        self.handler = AsyncHandler(gedis_server, threads=threads)
+        self.server = None
+        self.unix_server = None
+        # set to stop serve_forever, see stop_threadsafe
+        self._stopped = None
+        self._stop_timeout = None
+
+    async def start(self, reuse_port=False):
+        """
+        start listening on host:port and/or the unix socket of the gedis server
+
+        :param reuse_port: bind with SO_REUSEPORT, used when more worker processes serve the port
+        """
+        loop = asyncio.get_event_loop()
+        self.handler.loop = loop
+        data = self.gedis_server.data
+        if data.unix_socket:
+            listener = self.gedis_server.unix_listener or unix_listener(data.unix_socket)
+            self.unix_server = await loop.create_unix_server(lambda: GedisProtocol(self.handler), sock=listener)
+            self._log_info("%s RUNNING (asyncio) on %s", str(self.gedis_server), data.unix_socket)
+        if not data.tcp:
+            return
+        ssl_context = None
+        if self.gedis_server.ssl:
+            import ssl
+
+            if not self.gedis_server.ssl_cert_path:
+                self.gedis_server.ssl_priv_key_path, self.gedis_server.ssl_cert_path = (
+                    self.gedis_server.sslkeys_generate()
+                )
+            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_context.load_cert_chain(self.gedis_server.ssl_cert_path, self.gedis_server.ssl_priv_key_path)
+        self.server = await loop.create_server(
+            lambda: GedisProtocol(self.handler),
+            host=self.gedis_server.host,
+            port=self.gedis_server.port,
+            ssl=ssl_context,
+            reuse_port=reuse_port or None,
+        )
+        self._log_info("%s RUNNING (asyncio)", str(self.gedis_server))
+
+    async def serve_forever(self, reuse_port=False):
+        """
+        start and serve until SIGINT or SIGTERM
+        """
+        await self.start(reuse_port=reuse_port)
+        loop = asyncio.get_event_loop()
+        self._stopped = asyncio.Event()
+        for sig in [signal.SIGINT, signal.SIGTERM]:
+            loop.add_signal_handler(sig, self._stopped.set)
+        try:
+            await self._stopped.wait()
+        finally:
+            for sig in [signal.SIGINT, signal.SIGTERM]:
+                loop.remove_signal_handler(sig)
+            self._stopped = None
+            await self.stop(timeout=self._stop_timeout)
+
+    def stop_threadsafe(self, timeout=None):
+        """
+        make serve_forever stop, can be called from any thread, serve_forever returns once the server is drained
+
+        :param timeout: max nr of seconds to wait for running requests, defaults to stop_timeout of the config
+        """
+        if self._stopped is None:
+            return
+        self._stop_timeout = timeout
+        self.handler.loop.call_soon_threadsafe(self._stopped.set)
+
+    async def stop(self, timeout=None):
+        """
+        stop receiving requests and close the server, running requests get up to timeout seconds to finish
+
+        :param timeout: defaults to stop_timeout of the config
+        """
+        if timeout is None:
+            timeout = self.gedis_server.data.stop_timeout
+        servers = [server for server in [self.server, self.unix_server] if server is not None]
+        for server in servers:
+            server.close()
+        self.handler.drain()
+        try:
+            await asyncio.wait_for(self.handler.wait_idle(), timeout)
+        except asyncio.TimeoutError:
+            self._log_warning("requests still running after %ss, closing their connections" % timeout)
+        for protocol in list(self.handler.connections):
+            protocol.transport.close()
+        for server in servers:
+            await server.wait_closed()
+        self.handler.executor.shutdown(wait=False)
+        self._log_info("server stopped")
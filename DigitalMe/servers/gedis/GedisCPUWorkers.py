@@ -0,0 +1,214 @@
+import multiprocessing
+import os
+import pickle
+import struct
+
+import gevent
+from gevent import socket
+from gevent.queue import Queue
+from Jumpscale import j
+
+JSBASE = j.application.JSBaseClass
+
+# a message over the pipe of a worker is its size followed by the pickled object
+HEADER = struct.Struct("!Q")
+# max nr of bytes read or written at once, the server greenlets get their turn in between
+CHUNK_SIZE = 256 * 1024
+
+
+class GedisCPUWorkers(JSBASE):
+    """
+    pool of worker processes executing the cmds marked as cpu bound
+
+    the workers are forked from the gedis server once all actors are loaded,
+    so they have the same actors & schemas as the server
+    the name & the arguments of the request are sent as they are after decompression & taking out the headers,
+    with the content & response type of the request, the worker decodes the arguments,
+    executes the method and encodes the result, only bytes go over the pipes
+
+    the greenlet of the request sends & reads the messages in chunks on a gevent socket,
+    so the other connections keep being served, also while a big result is transferred
+
+    REMARK: actors added or reloaded after the start of the workers are not known by the workers
+    """
+
+    def __init__(self, server, size=2):
+        JSBASE.__init__(self)
+        self.server = server
+        self.size = size
+        self.running = False
+        self._context = multiprocessing.get_context("fork")
+        self._idle = Queue()
+        self._workers = []
+
+    def start(self):
+        self.running = True
+        for _ in range(self.size):
+            self._idle.put(self._worker_start())
+        self._log_info("started %s cpu workers" % self.size)
+
+    def stop(self):
+        self.running = False
+        for process, sock in self._workers:
+            sock.close()
+            process.terminate()
+        self._workers = []
+        self._idle = Queue()
+
+    def _worker_start(self):
+        sock, sock_child = socket.socketpair()
+        process = self._context.Process(target=_worker_main, args=(self.server, sock_child), daemon=True)
+        process.start()
+        sock_child.close()
+        worker = (process, sock)
+        self._workers.append(worker)
+        return worker
+
+    def _worker_get(self):
+        """
+        :return: an idle worker, the workers which died are replaced first
+        """
+        if not self.running:
+            raise RuntimeError("cpu workers are stopped")
+        while len(self._workers) < self.size:
+            self._idle.put(self._worker_start())
+        return self._idle.get()
+
+    def _worker_drop(self, worker):
+        """
+        forget a worker which died or is in the middle of a request, it's replaced by the next _worker_get
+        """
+        process, sock = worker
+        self._log_warning("cpu worker %s is dropped, a new one will be started" % process.pid)
+        sock.close()
+        # reaped by multiprocessing when the next worker is started
+        process.terminate()
+        if worker in self._workers:
+            self._workers.remove(worker)
+
+    def execute(self, request):
+        """
+        execute the request in one of the workers, blocks the calling greenlet only
+
+        :param request: handlers.Request
+        :return: the encoded result of the method
+        """
+        worker = self._worker_get()
+        try:
+            sock = worker[1]
+            _send(sock, ([request.name] + list(request.arguments), request.content_type, request.response_type))
+            ok, result = _recv(sock)
+        except (EOFError, OSError) as e:
+            self._worker_drop(worker)
+            raise RuntimeError("cpu worker died while executing %s: %s" % (request.name, e))
+        except BaseException:
+            # e.g. killed or the deadline of the request passed,
+            # the reply of this request would be read by the next one, start from a clean worker
+            self._worker_drop(worker)
+            raise
+        # only a worker which replied goes back to the pool
+        self._idle.put(worker)
+
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+
+def _pack(obj):
+    """
+    :return: the message of obj: its size followed by obj pickled
+    """
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    return HEADER.pack(len(data)) + data
+
+
+def _send(sock, obj):
+    """
+    send obj to the worker in chunks, waits (cooperatively) while the pipe is full
+    """
+    view = memoryview(_pack(obj))
+    while True:
+        view = view[sock.send(view[:CHUNK_SIZE]) :]
+        if not view:
+            return
+        gevent.sleep(0)
+
+
+def _recv(sock):
+    """
+    :return: the next object sent by the worker, read in chunks
+    """
+    size = HEADER.unpack(_recv_exactly(sock, HEADER.size))[0]
+    return pickle.loads(_recv_exactly(sock, size))
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    while view:
+        nr = sock.recv_into(view, min(len(view), CHUNK_SIZE))
+        if not nr:
+            raise EOFError("cpu worker closed its pipe")
+        view = view[nr:]
+        if view:
+            gevent.sleep(0)
+    return buffer
+
+
+def _worker_main(server, sock):
+    """
+    loop of a worker process, executes the requests coming in on sock
+
+    the worker only serves 1 request at a time, it uses the fd of sock blocking
+    """
+    from .handlers import Handler, Request
+
+    fd = sock.fileno()
+    os.set_blocking(fd, True)
+    handler = Handler(server)
+    handler.cursors = _ItemsCollector()
+    while True:
+        try:
+            size = HEADER.unpack(_worker_read(fd, HEADER.size))[0]
+        except EOFError:
+            return
+        raw_request, content_type, response_type = pickle.loads(_worker_read(fd, size))
+        request = Request(raw_request)
+        # the headers are taken out of the arguments by the server already
+        request._headers = {}
+        request._content_type = content_type
+        request._response_type = response_type
+        try:
+            cmd = handler._cmd_get(request)
+            result = (True, handler._execute(cmd, request))
+        except Exception as e:
+            result = (False, str(e))
+        try:
+            message = _pack(result)
+        except Exception as e:
+            # result could not be pickled
+            message = _pack((False, "could not send result of %s: %s" % (request.name, e)))
+        view = memoryview(message)
+        while view:
+            view = view[os.write(fd, view) :]
+
+
+def _worker_read(fd, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    while view:
+        nr = os.readv(fd, [view])
+        if not nr:
+            raise EOFError("server closed the pipe")
+        view = view[nr:]
+    return buffer
+
+
+class _ItemsCollector:
+    """
+    cursors of a worker: all items of a streamed cmd are encoded in the worker and sent at once,
+    the cursor over them is kept by the server, where the client asks the next chunks
+    """
+
+    def new(self, items, encode):
+        return [encode(item) for item in items]
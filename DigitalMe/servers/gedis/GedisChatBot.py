@@ -5,6 +5,7 @@ from captcha.image import ImageCaptcha
 from importlib import import_module
 
 import gevent
+import gevent.queue
 
 from Jumpscale import j
 
@@ -12,10 +13,15 @@ JSBASE = j.application.JSBaseClass
 
 
 class GedisChatBotFactory(JSBASE):
-    def __init__(self):
+    def __init__(self, publish=None):
+        """
+        :param publish: method(channel, message) of the gedis server, pushes the messages of a session
+                        to the connections subscribed to chat.<session id>
+        """
         JSBASE.__init__(self)
         self.sessions = {}  # all chat sessions
         self.chat_flows = {}  # are the flows to run, code being executed to interact with user
+        self.publish = publish
 
     def session_new(self, topic, **kwargs):
         """
@@ -27,7 +33,7 @@ class GedisChatBotFactory(JSBASE):
         """
         session_id = str(uuid.uuid4())
         topic_method = self.chat_flows[topic]
-        session = GedisChatBotSession(session_id, topic_method, **kwargs)
+        session = GedisChatBotSession(session_id, topic_method, publish=self.publish, **kwargs)
         self.sessions[session_id] = session
         return session_id
 
@@ -71,22 +77,40 @@ class GedisChatBotFactory(JSBASE):
             self.chat_flows[module_name] = loaded_chatflow.chat
 
 
+class _ChatQueue(gevent.queue.Queue):
+    """
+    messages to the browser, pushed to the connections subscribed to the channel of the session (RESP3),
+    only queued for session_work_get when there are none
+    """
+
+    def __init__(self, channel, publish=None):
+        gevent.queue.Queue.__init__(self)
+        self.channel = channel
+        self.publish = publish
+
+    def put(self, item, block=True, timeout=None):
+        if self.publish is not None and self.publish(self.channel, item):
+            return
+        gevent.queue.Queue.put(self, item, block=block, timeout=timeout)
+
+
 class GedisChatBotSession(JSBASE):
     """
     Contains the basic helper methods for asking questions
     It also have the main queues q_in, q_out that are used to pass questions and answers between browser and server
     """
 
-    def __init__(self, session_id, topic_method, **kwargs):
+    def __init__(self, session_id, topic_method, publish=None, **kwargs):
         """
         :param session_id: user session id created by ChatBotFactory session_new method
         :param topic_method: the bot topic (chatflow)
+        :param publish: method(channel, message) the messages to the browser are pushed with (chat.<session id>)
         :param kwargs: any extra kwargs that is passed while creating the session
                        (i.e. can be used for passing any query parameters)
         """
         JSBASE.__init__(self)
         self.session_id = session_id
-        self.q_out = gevent.queue.Queue()  # to browser
+        self.q_out = _ChatQueue("chat.%s" % session_id, publish)  # to browser
         self.q_in = gevent.queue.Queue()  # from browser
         self.kwargs = kwargs
         gevent.spawn(topic_method, bot=self)
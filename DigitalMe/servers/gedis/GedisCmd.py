@@ -18,11 +18,24 @@ class GedisCmd(JSBASE):
         # schema_in = ""
         # schema_out = ""
         # args = (ls)
+        # cpu = false (B)
+        # stream = false (B)
+        # cache = 0 (I)
         self.cmdobj = cmd
 
         # self.data = cmd._data
         self.namespace = namespace
         self.name = cmd.name
+        # method is cpu bound, server executes it in a worker process
+        self.cpu = cmd.cpu
+        # result is sent in chunks behind a cursor
+        self.stream = cmd.stream
+        # nr of seconds the server caches the result, 0 is no caching
+        self.cache = 0 if self.stream else cmd.cache
+        # method is async def, set by the handler
+        self.coroutine = False
+        # nr of arguments the client sends before the headers, None for *args, set by the handler
+        self.nr_args = None
 
         if cmd.schema_in_url != "":
             if cmd.schema_in_url not in j.data.schema.url_to_md5:
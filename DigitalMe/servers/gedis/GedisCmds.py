@@ -1,4 +1,5 @@
 import inspect
+import time
 
 from Jumpscale import j
 
@@ -19,6 +20,9 @@ comment = ""
 schema_in_url = ""
 schema_out_url = ""
 args = (ls)
+cpu = false (B)
+stream = false (B)
+cache = 0 (I)
 
 @url = jumpscale.gedis.schema
 md5 = ""
@@ -32,7 +36,11 @@ class GedisCmds(JSBASE):
     cmds understood by gedis server
     """
 
-    def __init__(self, server=None, namespace="default", name="", path="", data=None):
+    def __init__(self, server=None, namespace="default", name="", path="", data=None, reload=False):
+        """
+        :param reload: load the code of the actor again, the actor obj is not registered in server.actors,
+                       the server swaps it in (see GedisServer.actor_reload)
+        """
         JSBASE.__init__(self)
 
         if path is "" and data is None:
@@ -45,18 +53,32 @@ class GedisCmds(JSBASE):
         self.schema = j.data.schema.get_from_url_latest(url="jumpscale.gedis.api")
 
         self._cmds = {}
+        self.actor = None  # the actor obj, None when created from data
 
         if data:
             self.data = self.schema.get(data=data)
             self.cmds
         else:
             cname = j.sal.fs.getBaseName(path)[:-3]
-            klass = j.tools.codeloader.load(obj_key=cname, path=path, reload=False)
+            klass = j.tools.codeloader.load(obj_key=cname, path=path, reload=reload)
             kobj = klass()  # this is the actor obj
-
-            key = "%s__%s" % (namespace, cname.replace(".", "_"))
-
-            self.server.actors[key] = kobj  # as used in gedis server (when serving the commands)
+            self.actor = kobj
+
+            if not reload:
+                key = "%s__%s" % (namespace, cname.replace(".", "_"))
+                self.server.actors[key] = kobj  # as used in gedis server (when serving the commands)
+
+            start = time.perf_counter()
+            metacache = getattr(self.server, "metacache", None)
+            if metacache:
+                content_hash = metacache.content_hash(path)
+                entry = metacache.get(path, namespace, content_hash)
+                if entry:
+                    # actor unchanged since it was parsed
+                    self.data = self.schema.get(data=entry["data"])
+                    self.cmds
+                    metacache.hit(entry, time.perf_counter() - start)
+                    return
 
             self.data = self.schema.new()
             self.data.name = name
@@ -72,9 +94,16 @@ class GedisCmds(JSBASE):
                 if inspect.isfunction(item):
                     cmd = self.data.cmds.new()
                     cmd.name = member_name
+                    # the items a generator yields are always streamed to the client
+                    cmd.stream = inspect.isgeneratorfunction(item)
                     code = inspect.getsource(item)
                     self._method_source_process(cmd, code)
 
+            if metacache:
+                time_parse = time.perf_counter() - start
+                metacache.set(path, namespace, content_hash, self.data._data, time_parse)
+                metacache.miss(time_parse)
+
     @property
     def name(self):
         return self.data.name
@@ -116,12 +145,15 @@ class GedisCmds(JSBASE):
         comment = ""
         schema_in = ""
         schema_out = ""
+        options = ""
         args = []
 
         state = "START"
 
         for line in txt.split("\n"):
             lstrip = line.strip().lower()
+            if state == "START" and lstrip.startswith("async def"):
+                lstrip = lstrip[len("async ") :]
             if state == "START" and lstrip.startswith("def"):
                 state = "DEF"
                 if "self" in lstrip:
@@ -144,11 +176,13 @@ class GedisCmds(JSBASE):
                     continue
                 raise RuntimeError()
             if lstrip.startswith("```") or lstrip.startswith("'''"):
-                if state.startswith("SCHEMA"):  # are already in schema go back to comment
+                if state.startswith("SCHEMA") or state == "OPTIONS":  # are already in block go back to comment
                     state = "COMMENT"
                     continue
                 if state == "COMMENT":  # are in comment, now found the schema
-                    if lstrip.endswith("out"):
+                    if lstrip.endswith("gedis"):
+                        state = "OPTIONS"
+                    elif lstrip.endswith("out"):
                         state = "SCHEMAO"
                     else:
                         state = "SCHEMAI"
@@ -160,6 +194,9 @@ class GedisCmds(JSBASE):
             if state == "SCHEMAO":
                 schema_out += "%s\n" % line
                 continue
+            if state == "OPTIONS":
+                options += "%s\n" % line
+                continue
             if state == "COMMENT":
                 comment += "%s\n" % line
                 continue
@@ -176,12 +213,43 @@ class GedisCmds(JSBASE):
         s = self._schema_process(cmd, schema_out)
         if s:
             cmd.schema_out_url = s.url
+        self._options_process(cmd, options)
 
         if "schema_out" in args:
             args.pop(args.index("schema_out"))
         cmd.args = args
         return cmd
 
+    def _options_process(self, cmd, txt):
+        """
+        process the gedis options of a method, they are in a block in the docstring e.g.
+
+        ```gedis
+        cpu = true
+        ```
+
+        - cpu: method is cpu bound, is executed in a worker process so it doesn't block the server
+        - stream: method returns an iterable which is sent to the client in chunks, behind a cursor
+                  (set automatically for generator methods)
+        - cache: nr of seconds the result is cached by the server, per arguments & response type,
+                 only for methods which return the same for the same arguments (reads)
+        """
+        for line in txt.split("\n"):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if "=" not in line:
+                raise ValueError("gedis option of %s needs to be key = value, now '%s'" % (cmd.name, line))
+            key, val = [item.strip() for item in line.split("=", 1)]
+            if key == "cpu":
+                cmd.cpu = val.lower() in ["true", "1", "yes"]
+            elif key == "stream":
+                cmd.stream = val.lower() in ["true", "1", "yes"]
+            elif key == "cache":
+                cmd.cache = int(val)
+            else:
+                raise ValueError("unknown gedis option '%s' for %s" % (key, cmd.name))
+
     def _schema_get(self, url):
         url = url.lower().strip("!").strip()
         for s in self.data.schemas:
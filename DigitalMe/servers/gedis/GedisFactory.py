@@ -40,6 +40,40 @@ class GedisFactory(JSConfigFactory):
         namespace, name = key.split("__")
         return GedisCmds(namespace=namespace, name=name, data=data)
 
+    def benchmark(
+        self, clients=8, depth=1, nr=10000, sizes=None, workloads=None, backend="gevent", path=None, compare=None
+    ):
+        """
+        start a gedis server with the actor of the pytests and measure the ops/sec, the p50/p99/p999 latency
+        of a round trip & the average time per request of plain args, schema_in/schema_out & list results
+        for every payload size
+
+        kosmos 'j.servers.gedis.benchmark(clients=16, depth=16, path="/tmp/gedis_bench.json")'
+        kosmos 'j.servers.gedis.benchmark(path="/tmp/after.json", compare="/tmp/before.json")'
+
+        :param clients: nr of concurrent clients, each client is a process
+        :param depth: nr of requests a client pipelines, the latency is of 1 round trip of depth requests
+        :param nr: nr of requests per workload & payload size
+        :param sizes: payload sizes in bytes, default [16, 1024, 65536]
+        :param workloads: names of benchmark.WORKLOADS, default all
+        :param backend: gevent or asyncio
+        :param path: json file the results are written to
+        :param compare: json file of a previous run, the change of ops/sec & p99 is printed
+        :return: dict with the config & the results
+        """
+        from .benchmark import benchmark_run
+
+        return benchmark_run(
+            clients=clients,
+            depth=depth,
+            nr=nr,
+            sizes=sizes,
+            workloads=workloads,
+            backend=backend,
+            path=path,
+            compare=compare,
+        )
+
     def test(self, name="basic"):
         """
         it's run all tests
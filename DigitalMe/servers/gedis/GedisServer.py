@@ -1,6 +1,8 @@
+import asyncio
 import os
 import signal
 import sys
+import weakref
 
 import gevent
 from gevent import time
@@ -8,12 +10,29 @@ from gevent.pool import Pool
 from gevent.server import StreamServer
 from Jumpscale import j
 
+from .GedisAsyncServer import GedisAsyncServer
 from .GedisChatBot import GedisChatBotFactory
-from .GedisCmds import GedisCmds
+from .GedisCPUWorkers import GedisCPUWorkers
+from .GedisCmds import SCHEMA, GedisCmds
+from .GedisWorkers import GedisWorkers, reuseport_listener, unix_listener
+from .auth import VerifyKeyCache
+from .cache import ResponseCache
+from .cursors import GedisCursors
+from .metacache import ActorsMetaCache
+from .pubsub import PubSub
+from .ratelimit import RateLimits
+from .stats import GedisStats, SlowLog
 from .handlers import Handler
 
 JSBaseConfig = j.application.JSBaseConfigClass
 
+# nr of connections above connections_max which still get a greenlet to be answered with -BUSY,
+# beyond that new connections wait in the listen backlog
+CONNECTIONS_BUSY_MAX = 100
+
+# gevent: StreamServer, asyncio: GedisAsyncServer (async def methods are awaited, the others run in threads)
+BACKENDS = ["gevent", "asyncio"]
+
 
 def waiter(job):
     while job.result is None:
@@ -27,8 +46,26 @@ class GedisServer(JSBaseConfig):
         name* = "main" (S)
         host = "0.0.0.0" (ipaddress)
         port = 9900 (ipport)
+        tcp = true (B)
+        unix_socket = "" (S)
         ssl = False (B)
         password_ = "" (S)
+        backend = "gevent" (S)
+        connections_max = 1000 (I)
+        requests_max = 500 (I)
+        workers = 1 (I)
+        cpu_workers = 2 (I)
+        stop_timeout = 10 (I)
+        slowlog_slower_than = 100000 (I)
+        slowlog_max_len = 128 (I)
+        cursor_chunk_size = 100 (I)
+        cursor_timeout = 300 (I)
+        cache_size = 10000 (I)
+        actors_cache = true (B)
+        compression_min = 4096 (I)
+        auth_cache_ttl = 600 (I)
+        auth_cache_ttl_negative = 60 (I)
+        ratelimits = (LS)
         """
 
     def _init(self):
@@ -49,10 +86,52 @@ class GedisServer(JSBaseConfig):
         self.web_client_code = None
         self.code_generated_dir = j.sal.fs.joinPaths(j.dirs.VARDIR, "codegen", "gedis", self.name, "server")
 
-        self.chatbot = GedisChatBotFactory()
+        # channels the RESP3 connections subscribe to, see publish()
+        self.pubsub = PubSub()
+        self.chatbot = GedisChatBotFactory(publish=self.publish)
+
+        # listening socket on unix_socket (no ssl), made in start() before the workers are forked so they share it
+        self.unix_listener = None
+        self.unix_server = None
+        self.redis_server = None
+        # GedisAsyncServer when serving with the asyncio backend, see stop()
+        self._async_server = None
+        # processes serving the port when workers > 1, started in start()
+        self._workers_supervisor = None
+        # methods(server, worker_nr) called in every worker process after the fork,
+        # e.g. to reconnect clients which can't be shared between processes
+        self.workers_init = []
+        # worker processes for the cmds marked as cpu bound, started in start()
+        self._cpu_pool = None
+        self.handler = None
+        # all handlers serving the actors (gevent, asyncio, cpu workers), see actor_reload
+        self.handlers = weakref.WeakSet()
+
+        # statistics per cmd, see system.stats
+        self.stats = GedisStats()
+        # requests slower than slowlog_slower_than microseconds, see system.slowlog_get
+        self.slowlog = SlowLog(slower_than=self.data.slowlog_slower_than, max_len=self.data.slowlog_max_len)
+        # results of the streamed cmds which are not completely sent yet
+        self.cursors = GedisCursors(chunk_size=self.data.cursor_chunk_size, timeout=self.data.cursor_timeout)
+        # results of the cmds with the cache option, actors call cache.invalidate() after writes
+        self.cache = ResponseCache(size=self.data.cache_size)
+        # requests per sec of 1 client per namespace, actor or cmd, e.g. "default.notary_actor.register 1 5"
+        self.ratelimits = RateLimits(self.data.ratelimits)
+
+        # verify keys of the threebots authenticating, set verify_keys.source to use another source than tfchain
+        self.verify_keys = VerifyKeyCache(ttl=self.data.auth_cache_ttl, ttl_negative=self.data.auth_cache_ttl_negative)
 
         self.namespaces = ["system", "default"]
 
+        # parsed metadata of the actors, unchanged actors are not parsed again, see startup_report()
+        self.metacache = None
+        if self.data.actors_cache:
+            self.metacache = ActorsMetaCache(j.sal.fs.joinPaths(j.dirs.VARDIR, "cache", "gedis", "actors"), SCHEMA)
+
+        # state shared by the actors (e.g. the order_book), see the context property
+        self.context_factory = dict
+        self._context = None
+
         # hook to allow external servers to find this gedis
         j.servers.gedis.latest = self
 
@@ -74,6 +153,22 @@ class GedisServer(JSBaseConfig):
         for sig in [signal.SIGINT, signal.SIGTERM]:
             self._sig_handler.append(gevent.signal(sig, self.stop))
 
+    @property
+    def context(self):
+        """
+        state shared by the actors, a dict in the memory of the process by default
+
+        with workers > 1 every worker process has its own copy, set context_factory to a method returning a dict like
+        object kept in redis or BCDB (before start) to share the state between the workers
+        """
+        if self._context is None:
+            self._context = self.context_factory()
+        return self._context
+
+    @context.setter
+    def context(self, value):
+        self._context = value
+
     ########################POPULATION OF SERVER#########################
     #
     # def models_add(self, models, namespace="default"):
@@ -142,6 +237,47 @@ class GedisServer(JSBaseConfig):
         name = actor_name(path, namespace)
         key = actor_key(name, namespace)
         self.cmds_meta[key] = GedisCmds(server=self, path=path, name=name, namespace=namespace)
+        # the metadata of the namespace the clients get changed
+        self.cache.invalidate(namespace="system", actor="system", cmd="api_meta_get")
+
+    def actor_reload(self, path, namespace="default"):
+        """
+        load the code of 1 actor again while the server keeps serving
+
+        the new code & metadata are loaded completely before anything is changed, then they are swapped in:
+        requests which are running finish on the old version, the next ones use the new one,
+        only the results of this actor and the metadata of the actors (api_meta_get) are removed from the response cache
+
+        :param path: of the actor file
+        :return: GedisCmds of the reloaded actor
+        """
+        name = actor_name(path, namespace)
+        key = actor_key(name, namespace)
+        if key not in self.cmds_meta:
+            raise j.exceptions.Input("actor %s is not loaded in namespace %s, use actor_add" % (name, namespace))
+
+        cmds_meta = GedisCmds(server=self, path=path, name=name, namespace=namespace, reload=True)
+
+        # the metadata holds the actor obj, so 1 assignment swaps both for the handlers
+        self.cmds_meta[key] = cmds_meta
+        self.actors[key] = cmds_meta.actor
+        for handler in list(self.handlers):
+            handler.actor_evict(namespace, name)
+        self.cache.invalidate(namespace=namespace, actor=name)
+        self.cache.invalidate(namespace="system", actor="system", cmd="api_meta_get")
+        self._log_info("reloaded actor %s:%s" % (namespace, name))
+        return cmds_meta
+
+    def actor_find(self, path):
+        """
+        :param path: of an actor file
+        :return: the namespace the actor at path is loaded in, None if not loaded
+        """
+        path = j.sal.fs.pathNormalize(path)
+        for cmds_meta in list(self.cmds_meta.values()):
+            if cmds_meta.path and j.sal.fs.pathNormalize(cmds_meta.path) == path:
+                return cmds_meta.namespace
+        return None
 
     ####################################################################
 
@@ -192,7 +328,7 @@ class GedisServer(JSBaseConfig):
 
     ##########################CLIENT FROM SERVER #######################
 
-    def client_get(self, namespace="default"):
+    def client_get(self, namespace="default", unix_socket=False):
         """
         Helper method to get a client that connect to this instance of the server
 
@@ -200,6 +336,7 @@ class GedisServer(JSBaseConfig):
 
         :param namespace: namespace to use, defaults to "default"
         :param namespace: str, optional
+        :param unix_socket: connect over the unix socket of the server instead of tcp
         :return: gedis client
         :rtype: GedisClient
         """
@@ -210,6 +347,11 @@ class GedisServer(JSBaseConfig):
         data["password_"] = self.password_
         data["ssl"] = self.ssl
         data["namespace"] = namespace
+        if unix_socket:
+            if not self.data.unix_socket:
+                raise RuntimeError("gedis server %s does not listen on a unix socket" % self.name)
+            data["host"] = self.data.unix_socket
+            data["ssl"] = False
 
         return j.clients.gedis.get(name=self.name, configureonly=False, **data)
 
@@ -242,12 +384,54 @@ class GedisServer(JSBaseConfig):
         """
         job = self.workers_queue.enqueue_call(func=method, kwargs=kwargs, timeout=timeout, depends_on=depends_on)
         greenlet = gevent.spawn(waiter, job)
+        # the result is pushed to the connections subscribed to job.<job id>
+        greenlet.link_value(lambda g: self.publish("job.%s" % job.id, g.value))
         job.greenlet = greenlet
         self.workers_jobs[job.id] = job
         if wait:
             greenlet.get(block=True, timeout=timeout)
         return job
 
+    def publish(self, channel, message):
+        """
+        push a message to the connections subscribed to channel (RESP3, SUBSCRIBE channel)
+
+            chat.<session id>: the messages of a chat session
+            job.<job id>: the result of a job of job_schedule()
+
+        :param message: bytes, str, or anything the RESP3 encoder handles (dict, list, int, ...)
+        :return: nr of connections the message is pushed to
+        """
+        return self.pubsub.publish(channel, message)
+
+    def startup_report(self):
+        """
+        :return: text with the time spent loading the metadata of the actors, and the time the actors cache saved
+        """
+        if not self.metacache:
+            return "actors cache disabled"
+        report = self.metacache.report()
+        return (
+            "actors: %(hits)s from the cache in %(time_load).2fs, %(misses)s parsed in %(time_parse).2fs, "
+            "the cache saved %(time_saved).2fs" % report
+        )
+
+    def cpu_workers_start(self):
+        """
+        fork the worker processes executing the cmds marked as cpu bound
+        needs to happen after all actors are added, the workers only know the actors loaded at this time
+        """
+        if self._cpu_pool or not self.data.cpu_workers:
+            return
+        for cmds in self.cmds_meta.values():
+            if any(cmd.cpu for cmd in cmds.cmds.values()):
+                break
+        else:
+            # no cpu bound cmds
+            return
+        self._cpu_pool = GedisCPUWorkers(self, size=self.data.cpu_workers)
+        self._cpu_pool.start()
+
     def sslkeys_generate(self):
         if not self.ssl:
             raise RuntimeError("sslkeys_generate: gedis server is not configure to use ssl")
@@ -269,38 +453,145 @@ class GedisServer(JSBaseConfig):
         # WHEN USED OVER WEB, USE THE DIGITALME FRAMEWORK
         self._log_info("start Server on {0} - PORT: {1}".format(self.host, self.port))
 
-        handler = Handler(self)
+        if self.data.backend not in BACKENDS:
+            raise ValueError("backend needs to be one of %s, not %s" % (BACKENDS, self.data.backend))
+        if not self.data.tcp and not self.data.unix_socket:
+            raise ValueError("gedis server needs tcp or a unix_socket to listen on")
+        if self.data.unix_socket:
+            self.unix_listener = unix_listener(self.data.unix_socket)
+        if self.metacache:
+            self._log_info(self.startup_report())
         if self.ssl:
             self.ssl_priv_key_path, self.ssl_cert_path = self.sslkeys_generate()
+        if self.data.workers > 1:
+            # this process only supervises the workers
+            self._workers_supervisor = GedisWorkers(self._worker_serve, size=self.data.workers)
+            self._workers_supervisor.start()
+            return
+        if self.data.backend == "asyncio":
+            self._asyncio_serve()
+            return
+        self._serve()
+
+    def asyncio_server_get(self, threads=None):
+        """
+        asyncio backend serving the actors of this server, to embed gedis in an asyncio service
+
+            server = gedis.asyncio_server_get()
+            await server.start()
+
+        :param threads: max nr of threads executing the methods of the actors which are not async
+        :return: GedisAsyncServer
+        """
+        return GedisAsyncServer(self, threads=threads)
+
+    def _worker_serve(self, nr):
+        """
+        serve in worker process nr, forked by GedisWorkers
+        """
+        self._workers_supervisor = None
+        for h in self._sig_handler:
+            h.cancel()
+        self._sig_handler = [gevent.signal(sig, self.stop) for sig in [signal.SIGINT, signal.SIGTERM]]
+        for method in self.workers_init:
+            method(self, nr)
+        if self.data.backend == "asyncio":
+            self._asyncio_serve(reuse_port=True)
+            return
+        self._serve(listener=reuseport_listener((self.host, self.port)) if self.data.tcp else None)
+
+    def _asyncio_serve(self, reuse_port=False):
+        """
+        serve with the asyncio backend until SIGINT or SIGTERM
+        """
+        # no asyncio.run, it's not there in python 3.6
+        self._async_server = self.asyncio_server_get()
+        loop = asyncio.get_event_loop()
+        try:
+            loop.run_until_complete(self._async_server.serve_forever(reuse_port=reuse_port))
+        finally:
+            self._async_server = None
+
+    def _serve(self, listener=None):
+        """
+        :param listener: listening socket, defaults to a new one on host:port
+        """
+        listener = listener or (self.host, self.port)
+        self.cpu_workers_start()
+        self.handler = handler = Handler(self)
+        if self.data.connections_max:
+            pool = Pool(self.data.connections_max + CONNECTIONS_BUSY_MAX)
+        else:
+            pool = Pool()
+        if self.unix_listener is not None:
+            # local clients, no ssl needed
+            self.unix_server = StreamServer(self.unix_listener, spawn=pool, handle=handler.handle_redis)
+            if not self.data.tcp:
+                self._log_info("%s RUNNING on %s", str(self), self.data.unix_socket)
+                self.unix_server.serve_forever()
+                return
+            self.unix_server.start()
+        if self.ssl:
             # Server always supports SSL
             # client can use to talk to it in SSL or not
             self.redis_server = StreamServer(
-                (self.host, self.port),
-                spawn=Pool(),
+                listener,
+                spawn=pool,
                 handle=handler.handle_redis,
                 keyfile=self.ssl_priv_key_path,
                 certfile=self.ssl_cert_path,
             )
         else:
-            self.redis_server = StreamServer((self.host, self.port), spawn=Pool(), handle=handler.handle_redis)
+            self.redis_server = StreamServer(listener, spawn=pool, handle=handler.handle_redis)
         self._log_info("%s RUNNING", str(self))
         self.redis_server.serve_forever()
 
-    def stop(self):
+    def stop(self, timeout=None):
         """
         stop receiving requests and close the server
-        """
-        # TODO: gracefull shutdown. wait for the greenlet to finish
-        # since we start the server by passing it a gevent.Pool we can control
-        # all the greenlet used by the server
 
+        the server is drained first: no new connections are accepted, idle connections are closed
+        and running requests get up to timeout seconds to finish, after that they are killed
+
+        :param timeout: max nr of seconds to wait for running requests, defaults to stop_timeout of the config
+        """
         # prevent the signal handler to be called again if
         # more signal are received
         for h in self._sig_handler:
             h.cancel()
 
-        self._log_info("stopping server")
-        self.redis_server.stop()
+        if timeout is None:
+            timeout = self.data.stop_timeout
+
+        self._log_info("stopping server, waiting max %ss for running requests" % timeout)
+        if self._workers_supervisor:
+            # the workers drain on SIGTERM
+            self._workers_supervisor.stop(timeout=timeout)
+            self._workers_supervisor = None
+            self._log_info("server stopped")
+            return
+        if self._async_server:
+            # the gevent signal handlers don't run under asyncio, the asyncio server drains in its event loop
+            self._async_server.stop_threadsafe(timeout=timeout)
+            return
+        if self.handler:
+            self.handler.drain()
+        servers = [server for server in (self.unix_server, self.redis_server) if server]
+        for server in servers:
+            # serve_forever stops the server as well once it is closed, with its stop_timeout
+            server.stop_timeout = timeout
+            server.close()
+        if servers:
+            # both servers spawn in the same pool, its greenlets get timeout seconds and are killed after that
+            pool = servers[0].pool
+            pool.join(timeout=timeout)
+            pool.kill(block=True, timeout=1)
+        self.unix_server = None
+        self.redis_server = None
+        if self._cpu_pool:
+            self._cpu_pool.stop()
+            self._cpu_pool = None
+        self._log_info("server stopped")
 
     def test(self, name=""):
         if name:
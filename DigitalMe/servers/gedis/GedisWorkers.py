@@ -0,0 +1,155 @@
+import os
+import signal
+import stat
+import time
+
+import gevent
+from gevent import socket
+from Jumpscale import j
+
+JSBASE = j.application.JSBaseClass
+
+# nr of seconds between 2 checks of the worker processes
+POLL_INTERVAL = 0.2
+
+# a worker dying within this nr of seconds after its start is restarted with this delay, avoids a fork loop
+RESTART_DELAY = 1
+
+
+def reuseport_listener(address, backlog=1024):
+    """
+    :param address: (host, port)
+    :return: listening socket with SO_REUSEPORT, each worker process binds its own socket on the same port
+             and the kernel spreads the new connections over them
+    """
+    host, port = address
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, int(port)))
+    sock.listen(backlog)
+    return sock
+
+
+def unix_listener(path, backlog=1024):
+    """
+    :param path: of the unix socket, a socket file left by a server which is gone is removed
+    :return: listening unix socket, only the user running the server (and its group) can connect
+    """
+    if os.path.lexists(path):
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            raise RuntimeError("cannot listen on %s, it exists and is not a unix socket" % path)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # nobody listens on it anymore
+            os.unlink(path)
+        else:
+            raise RuntimeError("cannot listen on %s, another server is listening on it" % path)
+        finally:
+            probe.close()
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # the socket file is made with these permissions, there is no moment other users can connect
+    umask = os.umask(0o117)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(umask)
+    sock.listen(backlog)
+    return sock
+
+
+class GedisWorkers(JSBASE):
+    """
+    supervisor of the processes serving the same port(s)
+
+    the workers are forked once all actors & schemas are loaded, so they share them copy-on-write,
+    workers which die are restarted
+
+    state kept in memory by the actors is per worker, see the docs of the gedis server (workers)
+    """
+
+    def __init__(self, serve, size=2):
+        """
+        :param serve: method(worker_nr) serving in the worker process, returns when the worker is stopped
+        :param size: nr of worker processes
+        """
+        JSBASE.__init__(self)
+        self.serve = serve
+        self.size = size
+        self.pids = {}  # pid -> worker nr
+        self._started = {}  # worker nr -> time of the start
+        self._stopping = False
+
+    def start(self):
+        """
+        fork the workers and restart the ones which die, returns once all workers are stopped
+        """
+        self._stopping = False
+        for nr in range(self.size):
+            self._fork(nr)
+        self._log_info("started %s workers" % self.size)
+        while self.pids:
+            self._reap()
+            gevent.sleep(POLL_INTERVAL)
+
+    def stop(self, timeout=10):
+        """
+        stop the workers, they get SIGTERM and timeout seconds to drain, after that they are killed
+        """
+        self._stopping = True
+        self._kill(signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while self.pids and time.monotonic() < deadline:
+            self._reap()
+            gevent.sleep(POLL_INTERVAL)
+        if self.pids:
+            self._log_warning("%s workers did not stop in %ss, killing them" % (len(self.pids), timeout))
+            self._kill(signal.SIGKILL)
+            while self.pids:
+                self._reap()
+                gevent.sleep(POLL_INTERVAL)
+
+    def _fork(self, nr):
+        pid = gevent.fork()
+        if pid == 0:
+            # worker process, never returns to the code of the supervisor
+            code = 0
+            try:
+                self.serve(nr)
+            except BaseException as e:
+                self._log_error("worker %s failed: %s" % (nr, e))
+                code = 1
+            finally:
+                os._exit(code)
+        self.pids[pid] = nr
+        self._started[nr] = time.monotonic()
+
+    def _reap(self):
+        for pid in list(self.pids):
+            try:
+                pid2, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                pid2, status = pid, None
+            if not pid2:
+                continue
+            nr = self.pids.pop(pid, None)
+            if nr is None or self._stopping:
+                continue
+            self._log_warning("worker %s (pid %s) died with status %s, restarting it" % (nr, pid, status))
+            if time.monotonic() - self._started[nr] < RESTART_DELAY:
+                gevent.sleep(RESTART_DELAY)
+            if not self._stopping:
+                self._fork(nr)
+
+    def _kill(self, sig):
+        for pid in self.pids:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
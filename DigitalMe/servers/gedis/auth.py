@@ -0,0 +1,133 @@
+import time
+
+import nacl.encoding
+import nacl.exceptions
+import nacl.signing
+from gevent.event import AsyncResult
+from Jumpscale import j
+
+
+def tfchain_verify_key_get(dm_id):
+    """
+    default source of the verify keys, reads the public key of the threebot from tfchain
+
+    :param dm_id: threebot identification, can be one of the name or the unique integer of a threebot
+    :type dm_id: str
+    :return: hex encoded public key or None if the threebot is not known
+    :rtype: str
+    """
+    tfchain = j.clients.tfchain.new("3bot", network_type="TEST")
+    try:
+        record = tfchain.threebot.record_get(dm_id)
+    except j.exceptions.NotFound:
+        return None
+    return str(record.public_key.hash)
+
+
+class VerifyKeyCache:
+    """
+    caches the verify keys of the threebots which authenticate to gedis,
+    so a reconnect of many clients doesn't mean a lookup on tfchain for each of them
+
+    unknown threebots are cached as well (for a shorter time),
+    concurrent requests for a dm_id which is not cached wait for 1 lookup
+
+    the source is pluggable, e.g. in tests use a dict:
+
+        cache.source = {"kristof.ibiza": "<hex public key>"}.get
+    """
+
+    def __init__(self, source=None, ttl=600, ttl_negative=60, size=10000):
+        """
+        :param source: method(dm_id) returning the hex encoded public key or None if not found
+        :param ttl: nr of seconds a found key stays valid
+        :param ttl_negative: nr of seconds an unknown dm_id is remembered
+        :param size: max nr of keys kept, the oldest ones are evicted first
+        """
+        self.source = source or tfchain_verify_key_get
+        self.ttl = ttl
+        self.ttl_negative = ttl_negative
+        self.size = size
+        self._keys = {}  # dm_id -> (expiration, VerifyKey or None)
+        self._lookups = {}  # dm_id -> AsyncResult of the lookup in progress
+
+    def get(self, dm_id):
+        """
+        :param dm_id: threebot identification
+        :return: the VerifyKey of the threebot
+        :rtype: nacl.signing.VerifyKey
+        :raises: PermissionError when the threebot is not known
+        """
+        cached = self._keys.get(dm_id)
+        if cached is not None and cached[0] > time.monotonic():
+            verify_key = cached[1]
+        else:
+            verify_key = self._lookup(dm_id)
+
+        if verify_key is None:
+            raise PermissionError("Could not find 3bot: {}".format(dm_id))
+        return verify_key
+
+    def _lookup(self, dm_id):
+        """
+        get the key of dm_id from the source and cache it, a lookup which is in progress is waited for
+        :return: VerifyKey, None if the threebot is not known
+        """
+        lookup = self._lookups.get(dm_id)
+        if lookup is not None:
+            return lookup.get()
+        lookup = self._lookups[dm_id] = AsyncResult()
+        try:
+            public_key = self.source(dm_id)
+            now = time.monotonic()
+            if public_key:
+                verify_key = nacl.signing.VerifyKey(public_key, encoder=nacl.encoding.HexEncoder)
+                self._set(dm_id, verify_key, now + self.ttl)
+            else:
+                verify_key = None
+                self._set(dm_id, None, now + self.ttl_negative)
+        except BaseException as e:
+            # the waiting requests fail as well, the next one tries again
+            lookup.set_exception(e)
+            raise
+        finally:
+            del self._lookups[dm_id]
+        lookup.set(verify_key)
+        return verify_key
+
+    def _set(self, dm_id, verify_key, expiration):
+        self._keys.pop(dm_id, None)
+        while len(self._keys) >= self.size:
+            # dicts keep insertion order, first one is the oldest
+            self._keys.pop(next(iter(self._keys)))
+        self._keys[dm_id] = (expiration, verify_key)
+
+    def delete(self, dm_id=None):
+        """
+        forget the key of dm_id, or all keys when dm_id is None
+        """
+        if dm_id is None:
+            self._keys = {}
+        else:
+            self._keys.pop(dm_id, None)
+
+    def verify(self, dm_id, epoch, signed_message):
+        """
+        :param dm_id: threebot identification
+        :type dm_id: str
+        :param epoch: the epoch param that is signed
+        :type epoch: bytes
+        :param signed_message: the epoch param signed by the private key
+        :type signed_message: bytes
+        :return: True if the verification succeeded
+        :rtype: bool
+        :raises: PermissionError in case of wrong message
+        """
+        verify_key = self.get(dm_id)
+        try:
+            message = verify_key.verify(signed_message)
+        except nacl.exceptions.BadSignatureError:
+            message = None
+        if message != epoch:
+            raise PermissionError("You couldn't authenticate your 3bot: {}".format(dm_id))
+        return True
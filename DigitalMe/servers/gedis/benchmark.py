@@ -0,0 +1,230 @@
+import json
+import multiprocessing
+import os
+import time
+
+from Jumpscale import j
+
+# name -> method(payload size) returning the cmd & its arguments, all cmds are of the pytests/actors/actor.py actor
+WORKLOADS = {
+    # no actor, the overhead of the server itself
+    "ping": lambda size: ["system.ping"],
+    # plain argument, echoed back
+    "echo": lambda size: ["actor.echo", "x" * size],
+    # schema_in with only simple properties, the json is cleaned field by field
+    "args_in": lambda size: ["actor.args_in", json.dumps({"foo": "x" * size, "bar": 1})],
+    # schema_in & schema_out, a data object both ways
+    "schema_in_out": lambda size: ["actor.schema_in_out", json.dumps({"x": {"foo": "x" * size}})],
+    # list of schema objects as result
+    "schema_in_list_out": lambda size: ["actor.schema_in_list_out", json.dumps({"x": {"foo": "x" * size}})],
+    # list result of a generator, size is the nr of items
+    "numbers": lambda size: ["actor.numbers", str(size)],
+}
+
+# workloads whose result doesn't depend on the payload size, executed for the 1st size only
+WORKLOADS_FIXED = ["ping"]
+
+serverscript = """
+
+gedis = j.servers.gedis.configure(name="benchmark", port={port}, host="127.0.0.1", ssl=False, password="")
+gedis.backend = "{backend}"
+gedis.workers = {workers}
+gedis.actor_add("{actor_path}")
+gedis.save()
+gedis.start()
+
+"""
+
+
+def percentile(durations, pct):
+    """
+    :param durations: sorted list
+    :return: None when there are too few durations for the percentile, e.g. less than 1000 for p99.9
+    """
+    if len(durations) < round(100 / (100 - pct)):
+        return None
+    return durations[min(len(durations) - 1, int(len(durations) * pct / 100))]
+
+
+def _ms(duration):
+    return None if duration is None else duration * 1000
+
+
+def _ms_format(duration):
+    return "    n/a" if duration is None else "%7.3f" % duration
+
+
+def _client_run(host, port, request, nr, depth, start_event, conn):
+    """
+    1 client process: sends nr requests, depth at a time, once all clients are connected
+    sends back (start, end, latencies of the round trips)
+    """
+    import redis
+
+    client = redis.Redis(host=host, port=port, socket_timeout=60)
+    try:
+        client.execute_command(*request)
+        conn.send((True, None))
+        start_event.wait()
+        durations = []
+        begin = time.perf_counter()
+        for _ in range(max(1, nr // depth)):
+            start = time.perf_counter()
+            if depth == 1:
+                client.execute_command(*request)
+            else:
+                pipe = client.pipeline(transaction=False)
+                for _ in range(depth):
+                    pipe.execute_command(*request)
+                pipe.execute()
+            durations.append(time.perf_counter() - start)
+        conn.send((True, (begin, time.perf_counter(), durations)))
+    except Exception as e:
+        conn.send((False, "%s: %s" % (request[0], e)))
+    finally:
+        conn.close()
+
+
+def workload_run(host, port, request, clients=8, nr=10000, depth=1):
+    """
+    drive the server with concurrent clients, every client is a process so the clients are not the bottleneck
+
+    :param request: the cmd & its arguments
+    :param clients: nr of concurrent clients
+    :param nr: nr of requests of all clients together
+    :param depth: nr of requests sent at once (pipelined) by a client
+    :return: dict with requests, ops_sec, the nr of round trips (samples), the p50/p99/p999 latency of 1 round trip
+             in ms & request_avg, the average ms per request (a round trip divided by depth),
+             a percentile is None when there are too few samples, e.g. less than 1000 for p999
+    """
+    context = multiprocessing.get_context("fork")
+    nr_client = max(depth, nr // clients)
+    start_event = context.Event()
+    procs = []
+    for _ in range(clients):
+        conn_parent, conn_child = context.Pipe(duplex=False)
+        proc = context.Process(
+            target=_client_run, args=(host, port, request, nr_client, depth, start_event, conn_child)
+        )
+        proc.start()
+        procs.append((proc, conn_parent))
+
+    # all clients are connected & did a 1st request
+    errors = [res for ok, res in (conn.recv() for _, conn in procs) if not ok]
+    start_event.set()
+    begin = end = None
+    durations = []
+    for proc, conn in procs:
+        if not errors:
+            ok, res = conn.recv()
+            if ok:
+                begin = res[0] if begin is None else min(begin, res[0])
+                end = res[1] if end is None else max(end, res[1])
+                durations.extend(res[2])
+            else:
+                errors.append(res)
+        proc.join()
+    if errors:
+        raise RuntimeError("benchmark client failed: %s" % errors[0])
+
+    durations.sort()
+    nr_requests = len(durations) * depth
+    return {
+        "requests": nr_requests,
+        "ops_sec": nr_requests / (end - begin),
+        "samples": len(durations),
+        "p50": _ms(percentile(durations, 50)),
+        "p99": _ms(percentile(durations, 99)),
+        "p999": _ms(percentile(durations, 99.9)),
+        # the requests of a pipeline share the round trip
+        "request_avg": _ms(sum(durations) / nr_requests),
+    }
+
+
+def benchmark_run(
+    clients=8,
+    depth=1,
+    nr=10000,
+    sizes=None,
+    workloads=None,
+    backend="gevent",
+    workers=1,
+    port=8886,
+    path=None,
+    compare=None,
+):
+    """
+    start a gedis server with the actor of the pytests and measure its throughput & latency
+
+    :param sizes: payload sizes in bytes (nr of items for the list results)
+    :param workloads: names of WORKLOADS, all of them by default
+    :param path: json file the results are written to
+    :param compare: json file of a previous run, the change of ops_sec & p99 is printed
+    :return: dict with the config & the results
+    """
+    sizes = sizes or [16, 1024, 65536]
+    workloads = workloads or list(WORKLOADS.keys())
+    actor_path = os.path.join(os.path.dirname(__file__), "pytests", "actors", "actor.py")
+    cmd = j.tools.startupcmd.get(
+        "gedis_benchmark",
+        serverscript.format(port=port, backend=backend, workers=workers, actor_path=actor_path),
+        cmd_stop="",
+        path="/tmp",
+        timeout=30,
+        env={},
+        ports=[port],
+        process_strings=[],
+        interpreter="jumpscale",
+        daemon=True,
+    )
+    cmd.start(foreground=False)
+
+    report = {
+        "time": int(time.time()),
+        "config": {"clients": clients, "depth": depth, "nr": nr, "backend": backend, "workers": workers},
+        "results": [],
+    }
+    try:
+        if not j.sal.nettools.waitConnectionTest("localhost", port, timeoutTotal=30):
+            raise RuntimeError("Could not start gedis server on port:%s" % port)
+        for name in workloads:
+            for size in sizes[:1] if name in WORKLOADS_FIXED else sizes:
+                res = workload_run("127.0.0.1", port, WORKLOADS[name](size), clients=clients, nr=nr, depth=depth)
+                res.update({"workload": name, "size": size})
+                report["results"].append(res)
+                latencies = "  ".join("%s %s ms" % (pct, _ms_format(res[pct])) for pct in ["p50", "p99", "p999"])
+                print(
+                    "[*] %-18s %6d  %9.0f ops/sec  %s  %s ms/request"
+                    % (name, size, res["ops_sec"], latencies, _ms_format(res["request_avg"]))
+                )
+    finally:
+        cmd.stop()
+
+    if path:
+        j.sal.fs.writeFile(path, json.dumps(report, indent=2, sort_keys=True))
+    if compare:
+        report_compare(json.loads(j.sal.fs.readFile(compare)), report)
+    return report
+
+
+def report_compare(old, new):
+    """
+    print the change of ops_sec & p99 latency of the workloads which are in both reports
+    :return: dict (workload, size) -> (% change of ops_sec, % change of p99), None when a p99 is missing
+    """
+    previous = {(res["workload"], res["size"]): res for res in old["results"]}
+    changes = {}
+    for res in new["results"]:
+        key = (res["workload"], res["size"])
+        if key not in previous:
+            continue
+        ops = 100.0 * (res["ops_sec"] / previous[key]["ops_sec"] - 1)
+        p99 = None
+        if res["p99"] and previous[key]["p99"]:
+            p99 = 100.0 * (res["p99"] / previous[key]["p99"] - 1)
+        changes[key] = (ops, p99)
+        print(
+            "[*] %-18s %6d  ops/sec %+6.1f%%  p99 %s"
+            % (key[0], key[1], ops, "    n/a" if p99 is None else "%+6.1f%%" % p99)
+        )
+    return changes
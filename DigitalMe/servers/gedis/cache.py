@@ -0,0 +1,83 @@
+import time
+from collections import OrderedDict
+
+# returned by ResponseCache.get when there is no valid entry, None is a valid result
+MISS = object()
+
+
+class ResponseCache:
+    """
+    LRU cache of the results of the cmds with the cache option, e.g.
+
+        ```gedis
+        cache = 300
+        ```
+
+    key is (namespace.actor.cmd, arguments, content_type, response_type), the result is stored encoded,
+    so a hit skips the method and the encoding of the result
+    """
+
+    def __init__(self, size=10000):
+        self.size = size
+        self._entries = OrderedDict()  # key -> (expiration, result)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        :return: the cached result or MISS
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISS
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return MISS
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, result, ttl):
+        """
+        :param ttl: nr of seconds the result stays valid
+        """
+        if not self.size:
+            return
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, namespace=None, actor=None, cmd=None):
+        """
+        remove the cached results, e.g. call from an actor after a write which changes what a cached cmd returns
+
+            j.servers.gedis.latest.cache.invalidate(actor="farmer")
+
+        :param namespace: only of this namespace
+        :param actor: only of this actor
+        :param cmd: only of this cmd
+        :return: nr of entries removed
+        """
+        if namespace is None and actor is None and cmd is None:
+            nr = len(self._entries)
+            self._entries.clear()
+            return nr
+        to_delete = []
+        for key in self._entries:
+            namespace2, actor2, cmd2 = key[0].split(".", 2)
+            if namespace is not None and namespace != namespace2:
+                continue
+            if actor is not None and actor != actor2:
+                continue
+            if cmd is not None and cmd != cmd2:
+                continue
+            to_delete.append(key)
+        for key in to_delete:
+            del self._entries[key]
+        return len(to_delete)
+
+    def __len__(self):
+        return len(self._entries)
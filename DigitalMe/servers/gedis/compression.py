@@ -0,0 +1,163 @@
+# compression of the bulk values of a connection, negotiated with HELLO ... COMPRESSION lz4,zstd
+#
+# a compressed value is MAGIC + codec id + the compressed bytes, values which start with MAGIC by themselves
+# are sent as MAGIC + RAW + value, so the receiver never mistakes data for a compressed value
+#
+# only the reply itself and the items of a reply which is a list are compressed (not deeper),
+# the receiver decompresses the same levels
+MAGIC = b"\x00gz"
+RAW = b"0"
+
+# values smaller than this nr of bytes are sent as they are, see compression_min of the server & client config
+MIN_SIZE = 4096
+
+# compressed values which decompress to more than this nr of bytes are refused,
+# the server decompresses the arguments before the client is authenticated or rate limited
+MAX_SIZE = 64 * 1024 * 1024
+
+
+def _lz4():
+    import lz4.frame
+
+    def decompress(data, max_size):
+        decompressor = lz4.frame.LZ4FrameDecompressor()
+        value = decompressor.decompress(data, max_length=max_size + 1)
+        if len(value) > max_size:
+            raise ValueError("decompressed value is bigger than %s bytes" % max_size)
+        if not decompressor.eof:
+            raise ValueError("compressed value is not a complete lz4 frame")
+        return value
+
+    return lz4.frame.compress, decompress
+
+
+def _zstd():
+    import zstandard
+
+    def decompress(data, max_size):
+        # the size in the frame header is allocated at once, max_output_size only applies when it is not there
+        try:
+            if zstandard.frame_content_size(data) > max_size:
+                raise ValueError("decompressed value is bigger than %s bytes" % max_size)
+            return zstandard.ZstdDecompressor().decompress(data, max_output_size=max_size)
+        except zstandard.ZstdError as e:
+            raise ValueError("cannot decompress: %s" % e)
+
+    return zstandard.compress, decompress
+
+
+# name -> (codec id, method returning (compress, decompress(data, max_size))), in order of preference
+CODECS = {"lz4": (b"4", _lz4), "zstd": (b"z", _zstd)}
+
+_loaded = {}  # codec id -> (compress, decompress) of the codecs which are installed
+
+
+def _codec_get(codec_id):
+    if codec_id not in _loaded:
+        for _, (id2, load) in CODECS.items():
+            if id2 == codec_id:
+                try:
+                    _loaded[codec_id] = load()
+                except ImportError:
+                    _loaded[codec_id] = None
+                break
+        else:
+            raise ValueError("unknown compression codec %r" % codec_id)
+    return _loaded[codec_id]
+
+
+def codecs_available():
+    """
+    :return: names of the codecs which are installed (pip3 install lz4 zstandard)
+    """
+    return [name for name, (codec_id, _) in CODECS.items() if _codec_get(codec_id) is not None]
+
+
+def compressor_get(names, min_size=MIN_SIZE):
+    """
+    :param names: codecs the other side supports, in order of preference e.g. "lz4,zstd"
+    :return: Compressor for the first one which is installed, None if there is none
+    """
+    if isinstance(names, str):
+        names = names.split(",")
+    for name in names:
+        name = name.strip().lower()
+        if name in CODECS and _codec_get(CODECS[name][0]) is not None:
+            return Compressor(name, min_size=min_size)
+    return None
+
+
+class Compressor:
+    """
+    compresses the values of 1 connection with the codec which is negotiated
+    """
+
+    __slots__ = ("name", "min_size", "_codec_id", "_compress")
+
+    def __init__(self, name, min_size=MIN_SIZE):
+        if name not in CODECS:
+            raise ValueError("unknown compression codec %r" % name)
+        codec = _codec_get(CODECS[name][0])
+        if codec is None:
+            raise ValueError("compression codec %s is not installed" % name)
+        self.name = name
+        self.min_size = min_size
+        self._codec_id = CODECS[name][0]
+        self._compress = codec[0]
+
+    def compress(self, value):
+        """
+        :param value: bytes, str or anything else which is not compressed
+        :return: the value to send, compressed when it is big enough and gets smaller
+        """
+        if isinstance(value, str):
+            if len(value) < self.min_size and not value.startswith("\x00"):
+                return value
+            value = value.encode()
+        elif not isinstance(value, (bytes, bytearray)):
+            return value
+        if len(value) >= self.min_size:
+            compressed = self._compress(bytes(value))
+            if len(compressed) + 4 < len(value):
+                return MAGIC + self._codec_id + compressed
+        if value[:3] == MAGIC:
+            return MAGIC + RAW + value
+        return value
+
+    def result_compress(self, result):
+        """
+        :return: the result with the reply or the items of the reply compressed
+        """
+        if type(result) is list:
+            return [self.compress(item) for item in result]
+        return self.compress(result)
+
+    arguments_compress = result_compress
+
+
+def decompress(value, max_size=MAX_SIZE):
+    """
+    :param max_size: max nr of bytes of the decompressed value, ValueError when it is bigger
+    :return: value decompressed when it is a compressed value, otherwise the value itself
+    """
+    if not isinstance(value, bytes) or value[:3] != MAGIC:
+        return value
+    codec_id = value[3:4]
+    if codec_id == RAW:
+        return value[4:]
+    codec = _codec_get(codec_id)
+    if codec is None:
+        raise ValueError("cannot decompress, codec %r is not installed" % codec_id)
+    return codec[1](value[4:], max_size)
+
+
+def result_decompress(result, max_size=MAX_SIZE):
+    """
+    :return: the result with the reply or the items of the reply decompressed
+    """
+    if type(result) is list:
+        return [decompress(item, max_size) for item in result]
+    return decompress(result, max_size)
+
+
+arguments_decompress = result_decompress
@@ -0,0 +1,114 @@
+import time
+import uuid
+
+# the cursor id sent when all items are sent, like the redis SCAN
+CURSOR_DONE = "0"
+
+# nr of seconds between 2 checks for expired cursors
+SWEEP_INTERVAL = 10
+
+
+class Cursor:
+    """
+    server side state of 1 streamed result
+    """
+
+    __slots__ = ("id", "items", "encode", "expiration")
+
+    def __init__(self, id, items, encode):
+        self.id = id
+        self.items = items  # iterator over the not yet sent items
+        self.encode = encode  # method(item) encoding 1 item for the client
+        self.expiration = None
+
+    def chunk(self, size):
+        """
+        :return: list of the next size items, encoded, less when the items are exhausted
+        """
+        res = []
+        for item in self.items:
+            res.append(self.encode(item))
+            if len(res) >= size:
+                break
+        return res
+
+    def close(self):
+        close = getattr(self.items, "close", None)
+        if close is not None:
+            # stops the generator of the actor
+            close()
+
+
+class GedisCursors:
+    """
+    cursors of the results which are streamed to the clients in chunks
+
+    the reply of a streamed cmd and of cursor_next is [cursor_id, [items]],
+    cursor_id is CURSOR_DONE once all items are sent
+    cursors which are not used for timeout seconds are closed
+    """
+
+    def __init__(self, chunk_size=100, timeout=300):
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._cursors = {}  # cursor id -> Cursor
+        self._sweep_next = 0
+
+    def new(self, items, encode):
+        """
+        :param items: iterable over the result of the method of the actor
+        :param encode: method(item) encoding 1 item for the client
+        :return: [cursor_id, [first chunk of items]]
+        """
+        self._sweep()
+        cursor = Cursor(uuid.uuid4().hex, iter(items), encode)
+        return self._next(cursor)
+
+    def next(self, cursor_id, chunk_size=None):
+        """
+        :param cursor_id: as returned by new() or a previous next()
+        :param chunk_size: max nr of items to return, defaults to chunk_size of the cursors
+        :return: [cursor_id, [next chunk of items]]
+        """
+        self._sweep()
+        cursor = self._cursors.pop(cursor_id, None)
+        if cursor is None:
+            raise KeyError("cursor %s not found, it is exhausted or expired" % cursor_id)
+        return self._next(cursor, chunk_size)
+
+    def close(self, cursor_id):
+        """
+        close the cursor before all its items are sent
+        :return: True if the cursor existed
+        """
+        cursor = self._cursors.pop(cursor_id, None)
+        if cursor is None:
+            return False
+        cursor.close()
+        return True
+
+    def _next(self, cursor, chunk_size=None):
+        chunk_size = chunk_size or self.chunk_size
+        try:
+            items = cursor.chunk(chunk_size)
+        except Exception:
+            cursor.close()
+            raise
+        if len(items) < chunk_size:
+            cursor.close()
+            return [CURSOR_DONE, items]
+        cursor.expiration = time.monotonic() + self.timeout
+        self._cursors[cursor.id] = cursor
+        return [cursor.id, items]
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now < self._sweep_next:
+            return
+        self._sweep_next = now + SWEEP_INTERVAL
+        for cursor_id, cursor in list(self._cursors.items()):
+            if cursor.expiration < now:
+                self.close(cursor_id)
+
+    def __len__(self):
+        return len(self._cursors)
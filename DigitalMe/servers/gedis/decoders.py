@@ -0,0 +1,78 @@
+from Jumpscale import j
+
+CONTENT_TYPES = ["auto", "json", "capnp"]
+
+# types of the properties which can be cleaned without creating a data object
+SIMPLE_TYPES = ["string", "integer", "float", "bool"]
+
+
+class SchemaDecoder:
+    """
+    decodes the argument of a cmd with a schema_in into the kwargs of the method
+
+    compiled once per cmd:
+    - with content_type auto the format is recognised on the first byte (json starts with {),
+      no speculative decoding
+    - json for a schema with only simple properties is cleaned field by field into the kwargs,
+      no data object is created
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.names = list(schema.propertynames)
+        self._cleaners = self._cleaners_get(schema)
+
+    @staticmethod
+    def _cleaners_get(schema):
+        """
+        :return: list of (name, clean method) when all properties are simple types, otherwise None
+        """
+        cleaners = []
+        for prop in schema.properties:
+            jumpscaletype = getattr(prop, "jumpscaletype", None)
+            name = getattr(jumpscaletype, "NAME", "").split(",")[0].strip().lower()
+            if name not in SIMPLE_TYPES:
+                return None
+            cleaners.append((prop.name, jumpscaletype.clean))
+        return cleaners
+
+    def decode(self, data, content_type="auto"):
+        """
+        :param data: the argument as received from the client
+        :param content_type: json, capnp or auto
+        :return: dict with the kwargs for the method
+        """
+        if content_type == "auto":
+            content_type = "json" if data.lstrip()[:1] == b"{" else "capnp"
+        if content_type == "json":
+            return self.json_decode(data)
+        elif content_type == "capnp":
+            return self.capnp_decode(data)
+        raise ValueError("invalid content type was provided the valid types are %s" % CONTENT_TYPES)
+
+    def json_decode(self, data):
+        try:
+            ddict = j.data.serializers.json.loads(data)
+            if self._cleaners is not None and len(ddict) == len(self._cleaners):
+                try:
+                    return {name: clean(ddict[name]) for name, clean in self._cleaners}
+                except KeyError:
+                    # not all fields given, data object fills in the defaults
+                    pass
+            return self._kwargs_get(self.schema.get(data=ddict))
+        except Exception as e:
+            raise ValueError("the content is not valid json while you provided content_type=json\n%s\n%s" % (e, data))
+
+    def capnp_decode(self, data):
+        try:
+            # capnp is combination of msgpack of a list of id/capnpdata
+            id, data2 = j.data.serializers.msgpack.loads(data)
+            args = self.schema.get(data=data2)
+            if id:
+                args.id = id
+            return self._kwargs_get(args)
+        except Exception as e:
+            raise ValueError("the content is not valid capnp while you provided content_type=capnp\n%s\n%s" % (e, data))
+
+    def _kwargs_get(self, args):
+        return {name: getattr(args, name) for name in self.names}
@@ -1,16 +1,85 @@
+import inspect
+import socket as socket_module
+import time
+import types
+from functools import partial
+
 from Jumpscale import j
 from redis.exceptions import ConnectionError
-import nacl
 
-from .protocol import RedisCommandParser, RedisResponseWriter
+from .cache import MISS
+from .compression import arguments_decompress, compressor_get
+from .decoders import CONTENT_TYPES, SchemaDecoder
+from .protocol import Push, RedisCommandParser, RedisResponseWriter, Replies
+from .ratelimit import RateLimitError
 
 JSBASE = j.application.JSBaseClass
 
+# max nr of replies of pipelined requests kept in the write buffer before they get flushed
+PIPELINE_FLUSH_MAX = 256
+
+# max nr of seconds a push to a subscriber may take, a connection which doesn't read its pushes is closed
+PUSH_TIMEOUT = 1
+
+# 1 out of LOG_SAMPLE_RATE requests is logged (debug)
+LOG_SAMPLE_RATE = 1000
+
+# map: schema objects are sent as RESP3 maps, only on connections which did HELLO 3
+RESPONSE_TYPES = ["auto", "json", "capnp", "msgpack", "map"]
+
+# key in the statistics of the requests which are not for an actor (predefined cmds, unknown cmds)
+STATS_KEY_OTHER = "system.other"
+
+# names of the batch command, executes a msgpack list of [cmd, args, headers] and replies a list of results/errors
+BATCH_NAMES = [b"batch", b"system.batch"]
+# max nr of calls in 1 batch
+BATCH_MAX = 1000
+
+# names of the predefined cmds, see Handler._predefined_process
+# they change the connection or reply in a way of their own, so they can't be called in a batch
+PREDEFINED_NAMES = BATCH_NAMES + [b"command", b"ping", b"hello", b"subscribe", b"unsubscribe", b"auth"]
+
+
+class BusyError(RuntimeError):
+    """
+    the server is at its limit of connections or requests in flight, sent to the client as -BUSY
+    """
+
+    code = "BUSY"
+
+
+class DeadlineError(RuntimeError):
+    """
+    the timeout the client set in the headers of the request passed, sent to the client as -TIMEOUT
+    """
+
+    code = "TIMEOUT"
+
 
 class Session:
+    """
+    state of 1 connection, every connection gets its own session
+    """
+
     def __init__(self):
         self.dmid = None  # is the digital me id e.g. kristof.ibiza
         self.admin = False
+        # False when the connection came in while the server was at its max nr of connections,
+        # only the system commands (e.g. ping) are served on such a connection
+        self.admitted = True
+        # True while waiting for the next request of the client
+        self.idle = True
+        # set by HELLO, used when the request has no headers
+        self.name = None
+        self.content_type = "auto"
+        self.response_type = "auto"
+        # Compressor of the bulk values, set by HELLO ... COMPRESSION
+        self.compressor = None
+        # RESP version, 3 after HELLO 3
+        self.protover = 2
+        # channels subscribed to (RESP3 only) & method(Push) sending a message to the client, set by the handler
+        self.channels = set()
+        self.push = None
 
 
 def _command_split(cmd, namespace="system"):
@@ -53,6 +122,8 @@ class Command:
     - command name
     """
 
+    __slots__ = ("_namespace", "_actor", "_command")
+
     def __init__(self, command):
         self._namespace, self._actor, self._command = _command_split(command)
 
@@ -80,41 +151,84 @@ class Request:
     Request is an helper object that
     encapsulate a raw gedis command and expose some property
     for easy access of the different part of the request
+
+    every part is parsed only once, the Command & the headers only when they are used
     """
 
+    __slots__ = (
+        "_request",
+        "name",
+        "arguments",
+        "cmd",
+        "session",
+        "time_decode",
+        "time_execute",
+        "received",
+        "_command",
+        "_headers",
+        "_content_type",
+        "_response_type",
+    )
+
     def __init__(self, request):
-        self._request_ = request
+        self._request = request
+        # raw name of the command as sent by the client, the dispatch table of the Handler is looked up with it
+        self.name = request[0]
+        # the list of arguments of any or an emtpy list
+        self.arguments = request[1:]
+        # the GedisCmd executing the request, set by the Handler
+        self.cmd = None
+        # Session of the connection, its content & response type are used when not in the headers
+        self.session = None
+        # nr of seconds spent decoding the arguments & executing the method, set by the Handler
+        self.time_decode = None
+        self.time_execute = None
+        # time.monotonic() the server read the request, the timeout in the headers starts then
+        self.received = time.monotonic()
+        self._command = None
+        self._headers = None
+        self._content_type = None
+        self._response_type = None
 
     @property
-    def _request(self):
-        return self._request_
+    def size(self):
+        """
+        :return: nr of bytes of the name & the arguments
+        """
+        return sum(len(item) for item in self._request if isinstance(item, bytes))
 
     @property
     def command(self):
         """
         return a Command object
         """
-        return Command(self._request[0].decode().lower())
+        if self._command is None:
+            self._command = Command(self.name.decode().lower())
+        return self._command
 
     @property
-    def arguments(self):
+    def headers(self):
         """
-        :return: the list of arguments of any or an emtpy list
-        :rtype: list
+        :return: return the headers of the request or an emtpy dict
+        :rtype: dict
         """
-        if len(self._request) > 1:
-            return self._request[1:]
-        return []
+        if self._headers is None:
+            headers = None
+            if len(self._request) > 2:
+                # is a normal argument of a method which is not schema based when it is not a dict
+                headers = _headers_parse(self._request[2])
+            self._headers = headers or {}
+        return self._headers
 
     @property
-    def headers(self):
+    def deadline(self):
         """
-        :return: return the headers of the request or an emtpy dict
-        :rtype: dict
+        :return: time.monotonic() the request has to be done by, None when the client didn't set a timeout
         """
-        if len(self._request) > 2:
-            return j.data.serializers.json.loads(self._request[2])
-        return {}
+        timeout = self.headers.get("timeout")
+        if timeout is None:
+            return None
+        return self.received + float(timeout)
 
     @property
     def content_type(self):
@@ -122,7 +236,10 @@ class Request:
         :return: read the content type of the request form the headers
         :rtype: string
         """
-        return self.headers.get("content_type", "auto").casefold()
+        if self._content_type is None:
+            default = self.session.content_type if self.session else "auto"
+            self._content_type = self.headers.get("content_type", default).casefold()
+        return self._content_type
 
     @property
     def response_type(self):
@@ -130,7 +247,10 @@ class Request:
         :return: read the response type from the headers
         :rtype: string
         """
-        return self.headers.get("response_type", "auto").casefold()
+        if self._response_type is None:
+            default = self.session.response_type if self.session else "auto"
+            self._response_type = self.headers.get("response_type", default).casefold()
+        return self._response_type
 
 
 class ResponseWriter:
@@ -143,11 +263,27 @@ class ResponseWriter:
         self._socket = socket
         self._writer = RedisResponseWriter(socket)
 
-    def write(self, value):
-        self._writer.encode(value)
+    def write(self, value, flush=True, resp3=False):
+        self._writer.encode(value, flush=flush, resp3=resp3)
+
+    def push(self, message):
+        """
+        send a Push (RESP3) right away, together with the replies which are still buffered
+        """
+        self._writer.encode(message, flush=True, resp3=True)
+
+    @property
+    def buffered(self):
+        """
+        :return: nr of bytes in the write buffer
+        """
+        return len(self._writer.buffer)
 
-    def error(self, value):
-        self._writer.error(value)
+    def error(self, value, flush=True, code="ERR"):
+        self._writer.error(value, flush=flush, code=code)
+
+    def flush(self):
+        self._writer.flush()
 
 
 class GedisSocket:
@@ -160,9 +296,13 @@ class GedisSocket:
     """
 
     def __init__(self, socket):
+        from gevent.lock import Semaphore
+
         self._socket = socket
         self._parser = RedisCommandParser(socket)
         self._writer = ResponseWriter(self._socket)
+        # held while sending, pushes are sent by other greenlets than the one serving the requests
+        self.write_lock = Semaphore()
 
     def read(self):
         """
@@ -180,6 +320,14 @@ class GedisSocket:
     def writer(self):
         return self._writer
 
+    @property
+    def pending(self):
+        """
+        :return: True when more requests of the client are already waiting in the read buffer
+        :rtype: bool
+        """
+        return self._parser.has_pending()
+
     def on_disconnect(self):
         """
         make sur to always call this method before closing the socket
@@ -187,6 +335,16 @@ class GedisSocket:
         if self._parser:
             self._parser.on_disconnect()
 
+    def shutdown(self):
+        """
+        close the connection from the server side, a greenlet waiting in read() gets a ConnectionError
+        """
+        try:
+            self._socket.shutdown(socket_module.SHUT_RDWR)
+        except OSError:
+            # already closed by the client
+            pass
+
     @property
     def closed(self):
         return self._socket.closed
@@ -197,76 +355,509 @@ class Handler(JSBASE):
         JSBASE.__init__(self)
         self.gedis_server = gedis_server
         self.cmds = {}  # caching of commands
+        # name of the cmd as the clients send it -> GedisCmd with the method to execute,
+        # only the names of _dispatch_names are kept, other spellings are resolved on every request
+        self.dispatch = {}
         self.actors = self.gedis_server.actors
         self.cmds_meta = self.gedis_server.cmds_meta
-        self.session = Session()
+        self.verify_keys = self.gedis_server.verify_keys
+        self.stats = self.gedis_server.stats
+        self.slowlog = self.gedis_server.slowlog
+        self.cursors = self.gedis_server.cursors
+        self.cache = self.gedis_server.cache
+        self.pubsub = self.gedis_server.pubsub
+        self.ratelimits = self.gedis_server.ratelimits
+        self.nr_requests = 0
+        # GedisCPUWorkers executing the cpu bound cmds, None when there are none
+        self.cpu_workers = self.gedis_server._cpu_pool
+        # values smaller than this nr of bytes are not compressed
+        self.compression_min = self.gedis_server.data.compression_min
+        # told about reloaded actors, see GedisServer.actor_reload
+        self.gedis_server.handlers.add(self)
+
+        # admission control, 0 means no limit
+        self.connections_max = self.gedis_server.data.connections_max
+        self.requests_max = self.gedis_server.data.requests_max
+        self.connections_active = 0
+        self.requests_active = 0
+
+        # when draining no new requests are read, connections are closed once their running request is done
+        self.draining = False
+        self.connections = {}  # GedisSocket -> Session of all open connections
 
     def handle_redis(self, socket, address):
+        # (ip, port), ipv6 adds flowinfo & scope id, a client on the unix socket has no address
+        address = address[:2] if address else ("unix", 0)
 
         # BUG: if we start a server with kosmos --debug it should get in the debugger but it does not if errors trigger, maybe something in redis?
         # w=self.t
         # raise RuntimeError("d")
         gedis_socket = GedisSocket(socket)
+        if self.draining:
+            gedis_socket.shutdown()
+            gedis_socket.on_disconnect()
+            return
+        session = Session()
+        session.admitted = not self.connections_max or self.connections_active < self.connections_max
+        if session.admitted:
+            self.connections_active += 1
+        session.push = partial(self._push, gedis_socket)
+        self.connections[gedis_socket] = session
 
         try:
-            self._handle_redis_session(gedis_socket, address)
+            self._handle_redis_session(gedis_socket, address, session)
         finally:
+            self.pubsub.unsubscribe_all(session)
+            if session.admitted:
+                self.connections_active -= 1
+            self.connections.pop(gedis_socket, None)
             gedis_socket.on_disconnect()
             self._log_info("connection closed", context="%s:%s" % address)
 
-    def _handle_redis_session(self, gedis_socket, address):
+    def _handle_redis_session(self, gedis_socket, address, session):
         """
         deal with 1 specific session
-        :param socket:
+        :param gedis_socket:
         :param address:
-        :param parser:
-        :param response:
+        :param session: Session of this connection
         :return:
         """
         self._log_info("new incoming connection", context="%s:%s" % address)
 
+        # replies are buffered as long as the client has pipelined more requests
+        # they all get flushed in 1 write when the read buffer is drained
+        nr_buffered = 0
         while True:
+            session.idle = not gedis_socket.pending
+            if session.idle and self.draining:
+                return
             try:
                 request = gedis_socket.read()
-                self._log_info("request received: %s" % request.command)
-                result = self._handle_request(request, address)
-                gedis_socket.writer.write(result)
+                session.idle = False
+                self._request_process(gedis_socket, request, address, session)
             except ConnectionError as err:
                 self._log_info("connection error: %s" % str(err), context="%s:%s" % address)
                 return
+            except BusyError as e:
+                if gedis_socket.closed:
+                    return
+                gedis_socket.writer.error(str(e), flush=False, code="BUSY")
+                if not session.admitted:
+                    # shed the connection, the client can come back later
+                    with gedis_socket.write_lock:
+                        gedis_socket.writer.flush()
+                    return
+            except (DeadlineError, RateLimitError) as e:
+                if gedis_socket.closed:
+                    return
+                gedis_socket.writer.error(str(e), flush=False, code=e.code)
             except Exception as e:
                 self._log_error(str(e), context="%s:%s" % address)
-                if not gedis_socket.closed:
-                    gedis_socket.writer.error(str(e))
+                if gedis_socket.closed:
+                    return
+                gedis_socket.writer.error(str(e), flush=False)
+
+            nr_buffered += 1
+            if nr_buffered >= PIPELINE_FLUSH_MAX or not gedis_socket.pending:
+                try:
+                    with gedis_socket.write_lock:
+                        gedis_socket.writer.flush()
+                except OSError as err:
+                    self._log_info("connection error: %s" % str(err), context="%s:%s" % address)
+                    return
+                nr_buffered = 0
+
+    def _request_process(self, gedis_socket, request, address, session):
+        """
+        execute the request and write the result in the write buffer, keeps the statistics
+        """
+        request.session = session
+        self.nr_requests += 1
+        if not self.nr_requests % LOG_SAMPLE_RATE:
+            self._log_debug("request received: %s" % request.name, context="%s:%s" % address)
+
+        writer = gedis_socket.writer
+        buffered = writer.buffered
+        start = time.perf_counter()
+        error = True
+        try:
+            if session.compressor is not None:
+                request.arguments = arguments_decompress(request.arguments)
+                result = session.compressor.result_compress(self._handle_request(request, address, session))
+            else:
+                result = self._handle_request(request, address, session)
+            writer.write(result, flush=False, resp3=session.protover == 3)
+            error = False
+        finally:
+            self._request_record(request, address, time.perf_counter() - start, writer.buffered - buffered, error)
+
+    def _push(self, gedis_socket, message):
+        """
+        send a Push to the client of the connection, called from the greenlet publishing the message
+
+        a client which doesn't read would block the publisher (e.g. a chat flow), after PUSH_TIMEOUT
+        the connection is closed, part of the push could be sent already
+        """
+        import gevent
+
+        if gedis_socket.closed:
+            raise ConnectionError("connection is closed")
+        try:
+            with gevent.Timeout(PUSH_TIMEOUT):
+                with gedis_socket.write_lock:
+                    gedis_socket.writer.push(message)
+        except gevent.Timeout:
+            gedis_socket.shutdown()
+            raise ConnectionError("push timed out after %ss, connection closed" % PUSH_TIMEOUT)
+
+    def _request_record(self, request, address, duration, bytes_out, error):
+        """
+        keep the statistics & the slowlog of a processed request
+        """
+        cmd = request.cmd
+        size = request.size
+        self.stats.record(cmd.key if cmd is not None else STATS_KEY_OTHER, duration, size, bytes_out, error)
+        if self.slowlog.is_slow(duration):
+            self.slowlog.record(
+                duration,
+                request.name.decode(errors="replace"),
+                size,
+                address,
+                request.time_decode,
+                request.time_execute,
+            )
+
+    def drain(self):
+        """
+        stop reading new requests, idle connections are closed right away,
+        the others once the requests they are executing (or already received) are done
+        """
+        self.draining = True
+        for gedis_socket, session in list(self.connections.items()):
+            if session.idle:
+                gedis_socket.shutdown()
 
-    def _handle_request(self, request, address):
+    def _handle_request(self, request, address, session):
         """
         deal with 1 specific request
         :param request:
+        :param address:
+        :param session: Session of the connection the request came in on
         :return:
         """
-        # process the predefined commands
-        if request.command == "command":
+        # cmd is cmd metadata + cmd.method is what needs to be executed
+        cmd = self.dispatch.get(request.name)
+        if cmd is None:
+            result = self._predefined_process(request, address, session)
+            if result is not MISS:
+                return result
+            cmd = self._cmd_get(request)
+        request.cmd = cmd
+        # authenticated clients are limited by their dm_id, the others by their ip address
+        self.ratelimits.check(cmd.key, session.dmid or address[0])
+        self._headers_split(cmd, request)
+        # expired requests are not decoded nor executed
+        time_left = self._deadline_check(request)
+
+        cache_key = None
+        if cmd.cache:
+            cache_key = (cmd.key, tuple(request.arguments), request.content_type, request.response_type)
+            result = self.cache.get(cache_key)
+            if result is not MISS:
+                return result
+
+        self._admit(cmd, session)
+
+        timeout = None
+        if time_left is not None:
+            import gevent
+
+            # raised in this greenlet when the deadline passes while the method is executed
+            timeout = gevent.Timeout.start_new(time_left)
+        self.requests_active += 1
+        try:
+            if cmd.cpu and self.cpu_workers:
+                result = self.cpu_workers.execute(request)
+                if cmd.stream:
+                    # the worker sent all items encoded
+                    result = self.cursors.new(result, _item_encoded)
+            else:
+                result = self._execute(cmd, request)
+        except BaseException as e:
+            if timeout is not None and e is timeout:
+                raise DeadlineError("deadline of %s passed while executing it" % cmd.key)
+            raise
+        finally:
+            self.requests_active -= 1
+            if timeout is not None:
+                timeout.close()
+
+        if cache_key is not None:
+            self.cache.set(cache_key, result, cmd.cache)
+        return result
+
+    def _predefined_process(self, request, address, session):
+        """
+        process the predefined commands
+        :return: the result, MISS if the request is not for a predefined command
+        """
+        name = request.name.lower()
+        if name in BATCH_NAMES:
+            return self._batch(request, address, session)
+        elif name == b"command":
             return "OK"
-        elif request.command == "ping":
+        elif name == b"ping":
             return "PONG"
-        elif request.command == "auth":
-            dm_id, epoch, signed_message = request[1:]
-            if self.dm_verify(dm_id, epoch, signed_message):
-                self.session.dmid = dm_id
-                self.session.admin = True
+        elif name == b"hello":
+            return self._hello(request, session)
+        elif name == b"subscribe" or name == b"unsubscribe":
+            return self._subscribe(request, session)
+        elif name == b"auth":
+            dm_id, epoch, signed_message = request.arguments
+            dm_id = dm_id.decode()
+            if self.verify_keys.verify(dm_id, epoch, signed_message):
+                session.dmid = dm_id
+                session.admin = True
                 return True
+        return MISS
 
-        self._log_debug(
-            "command received %s %s %s" % (request.command.namespace, request.command.actor, request.command.command),
-            context="%s:%s" % address,
-        )
+    def _batch(self, request, address, session):
+        """
+        execute the calls of a batch, one after the other or concurrently when flagged
 
-        # cmd is cmd metadata + cmd.method is what needs to be executed
-        cmd = self._cmd_obj_get(
-            cmd=request.command.command, namespace=request.command.namespace, actor=request.command.actor
-        )
+            system.batch <msgpack list of [cmd, args, headers]> [concurrent 0|1]
+
+        :return: list with the result or the error of every call
+        """
+        requests, concurrent = self._batch_requests_get(request)
+        if concurrent:
+            import gevent
+
+            greenlets = [gevent.spawn(self._batch_call, item, address, session) for item in requests]
+            gevent.joinall(greenlets)
+            return [greenlet.value for greenlet in greenlets]
+        return [self._batch_call(item, address, session) for item in requests]
 
+    def _batch_requests_get(self, request):
+        """
+        :return: (list of Request, concurrent)
+        """
+        if not request.arguments:
+            raise ValueError("batch needs a msgpack list of [cmd, args, headers]")
+        calls = j.data.serializers.msgpack.loads(request.arguments[0])
+        if not isinstance(calls, list):
+            raise ValueError("batch needs a msgpack list of [cmd, args, headers]")
+        if len(calls) > BATCH_MAX:
+            raise ValueError("max %s calls in 1 batch" % BATCH_MAX)
+        concurrent = len(request.arguments) > 1 and request.arguments[1].lower() in [b"1", b"true"]
+
+        requests = []
+        for call in calls:
+            name, args, headers = (list(call) + [[], None])[:3]
+            item = Request([_arg_encode(name)] + [_arg_encode(arg) for arg in args])
+            if item.name.lower() in PREDEFINED_NAMES:
+                raise ValueError("%s can't be called in a batch" % item.name.decode(errors="replace"))
+            if headers:
+                item._headers = headers
+            # the timeout of a call starts when the batch is read
+            item.received = request.received
+            requests.append(item)
+        return requests, concurrent
+
+    def _batch_call(self, request, address, session):
+        """
+        :return: the result of 1 call of a batch, the exception if it failed
+        """
+        request.session = session
+        start = time.perf_counter()
+        error = True
+        try:
+            result = self._handle_request(request, address, session)
+            error = False
+            return result
+        except Exception as e:
+            return e
+        finally:
+            self._request_record(request, address, time.perf_counter() - start, 0, error)
+
+    def _headers_split(self, cmd, request):
+        """
+        take the headers out of the arguments of the request, the client sends them after the arguments:
+        [data, headers] for a schema based method, [arg1, ..., argN, headers] for the others
+        """
+        if request._headers is not None or cmd.nr_args is None:
+            # headers of a call of a batch, or a method with *args
+            return
+        headers = None
+        if len(request.arguments) == cmd.nr_args + 1:
+            headers = _headers_parse(request.arguments[-1])
+            if headers is not None:
+                request.arguments = request.arguments[:-1]
+        request._headers = headers or {}
+
+    def _deadline_check(self, request):
+        """
+        raise DeadlineError when the deadline of the request passed
+        :return: nr of seconds left before the deadline, None when the request has none
+        """
+        deadline = request.deadline
+        if deadline is None:
+            return None
+        time_left = deadline - time.monotonic()
+        if time_left <= 0:
+            raise DeadlineError(
+                "deadline of %s passed %.3f sec ago" % (request.name.decode(errors="replace"), -time_left)
+            )
+        return time_left
+
+    def _admit(self, cmd, session):
+        """
+        raise BusyError when the server is at its limits
+        system commands (e.g. ping for health checks) are always served
+        """
+        if cmd.namespace == "system":
+            return
+        if not session.admitted:
+            raise BusyError("max nr of connections reached")
+        if self.requests_max and self.requests_active >= self.requests_max:
+            raise BusyError("max nr of requests in flight reached")
+
+    def _hello(self, request, session):
+        """
+        handshake of a connection, like the redis HELLO
+
+            HELLO [2|3] [SETNAME name] [CONTENT_TYPE auto|json|capnp] [RESPONSE_TYPE auto|json|capnp|msgpack|map]
+                  [COMPRESSION lz4,zstd]
+
+        the content & response type are used for all requests of the connection without headers,
+        so the content doesn't need to be recognised on every request
+
+        HELLO 3 switches the connection to RESP3: maps, doubles, booleans & null get their own type,
+        schema objects are sent as maps (response type map) unless an other response type is asked,
+        and the connection can SUBSCRIBE to channels the server pushes messages on
+
+        with COMPRESSION the server picks the first codec it has installed, from then on replies & arguments
+        bigger than compression_min bytes are compressed, see compression.py
+
+        :return: the properties of the connection
+        """
+        args = [arg.decode() for arg in request.arguments]
+        protover = session.protover
+        if args and args[0].isdigit():
+            protover = int(args.pop(0))
+            if protover not in (2, 3):
+                raise ValueError("NOPROTO unsupported protocol version %s" % protover)
+            if protover == 2 and session.channels:
+                raise ValueError("cannot switch to RESP2 while subscribed to channels, UNSUBSCRIBE first")
+        response_type = None
+        if len(args) % 2:
+            raise ValueError("HELLO needs key value pairs after the protocol version")
+        for key, val in zip(args[::2], args[1::2]):
+            key = key.lower()
+            if key == "setname":
+                session.name = val
+            elif key == "content_type":
+                val = val.casefold()
+                if val not in CONTENT_TYPES:
+                    raise ValueError("invalid content type, the valid types are %s" % CONTENT_TYPES)
+                session.content_type = val
+            elif key == "response_type":
+                val = val.casefold()
+                if val not in RESPONSE_TYPES:
+                    raise ValueError("invalid response type, the valid types are %s" % RESPONSE_TYPES)
+                response_type = val
+            elif key == "compression":
+                session.compressor = compressor_get(val, min_size=self.compression_min)
+            else:
+                raise ValueError("unknown HELLO option %s" % key)
+        if response_type is None:
+            if protover == 3 and session.response_type == "auto":
+                response_type = "map"
+            elif protover == 2 and session.response_type == "map":
+                response_type = "auto"
+        if response_type == "map" and protover != 3:
+            raise ValueError("response type map needs RESP3, use HELLO 3")
+        session.protover = protover
+        if response_type is not None:
+            session.response_type = response_type
+        result = [
+            "server",
+            "gedis",
+            "proto",
+            protover,
+            "content_type",
+            session.content_type,
+            "response_type",
+            session.response_type,
+            "compression",
+            session.compressor.name if session.compressor else "",
+        ]
+        if protover == 3:
+            return dict(zip(result[::2], result[1::2]))
+        return result
+
+    def _subscribe(self, request, session):
+        """
+        SUBSCRIBE channel [channel ...] / UNSUBSCRIBE [channel ...], only on RESP3 connections
+
+        like redis the reply is a Push per channel with the nr of channels the connection is subscribed to,
+        the messages published on the channels are pushed as ["message", channel, data],
+        the connection keeps serving requests
+        """
+        if session.protover != 3:
+            raise ValueError("SUBSCRIBE needs RESP3, use HELLO 3")
+        channels = [arg.decode() for arg in request.arguments]
+        if request.name.lower() == b"subscribe":
+            if not channels:
+                raise ValueError("SUBSCRIBE needs at least 1 channel")
+            return Replies(Push(["subscribe", ch, self.pubsub.subscribe(session, ch)]) for ch in channels)
+        if not channels:
+            channels = sorted(session.channels)
+            if not channels:
+                return Replies([Push(["unsubscribe", None, 0])])
+        return Replies(Push(["unsubscribe", ch, self.pubsub.unsubscribe(session, ch)]) for ch in channels)
+
+    def _cmd_get(self, request):
+        """
+        :param request:
+        :return: the cmd object of the request, from the dispatch table or resolved and added to it
+        """
+        cmd = self.dispatch.get(request.name)
+        if cmd is None:
+            self._log_debug(
+                "command received %s %s %s"
+                % (request.command.namespace, request.command.actor, request.command.command)
+            )
+            cmd = self._cmd_obj_get(
+                cmd=request.command.command, namespace=request.command.namespace, actor=request.command.actor
+            )
+            if request.name in _dispatch_names(cmd.key):
+                self.dispatch[request.name] = cmd
+        return cmd
+
+    def _execute(self, cmd, request):
+        """
+        decode the arguments, execute the method of the cmd and encode its result
+        :param cmd: GedisCmd, cmd.method is what needs to be executed
+        :param request:
+        :return:
+        """
+        if cmd.coroutine:
+            raise RuntimeError("%s is an async method, it needs the asyncio backend of the server" % cmd.key)
+        start = time.perf_counter()
+        params_list, params_dict = self._params_get(cmd, request)
+
+        # now execute the method() of the cmd
+        decoded = time.perf_counter()
+        request.time_decode = decoded - start
+        result = cmd.method(*params_list, **params_dict)
+        request.time_execute = time.perf_counter() - decoded
+        return self._result_process(cmd, request, result)
+
+    def _params_get(self, cmd, request):
+        """
+        :return: (list, dict) the args & kwargs of the method
+        """
         params_list = []
         params_dict = {}
         if cmd.schema_in:
@@ -280,12 +871,17 @@ class Handler(JSBASE):
         # makes sure we understand which schema to use to return result from method
         if cmd.schema_out:
             params_dict["schema_out"] = cmd.schema_out
+        return params_list, params_dict
 
-        # now execute the method() of the cmd
-        result = None
-
-        self._log_debug("params cmd %s %s" % (params_list, params_dict))
-        result = cmd.method(*params_list, **params_dict)
+    def _result_process(self, cmd, request, result):
+        """
+        :return: the result of the method encoded for the client
+        """
+        if cmd.stream:
+            # result is sent in chunks, the client gets [cursor_id, [first chunk]] and continues with cursor_next
+            return self.cursors.new(result, partial(_result_encode, cmd, request.response_type))
+        if isinstance(result, types.GeneratorType):
+            result = list(result)
         if isinstance(result, list):
             result = [_result_encode(cmd, request.response_type, r) for r in result]
         else:
@@ -296,61 +892,13 @@ class Handler(JSBASE):
     def _read_input_args_schema(self, request, command):
         """
         get the arguments from an input which is a schema
-        :param content_type:
         :param request:
-        :param cmd:
-        :return:
+        :param command:
+        :return: dict with the kwargs of the method
         """
-
-        def capnp_decode(request, command, die=True):
-            try:
-                # Try capnp which is combination of msgpack of a list of id/capnpdata
-                id, data = j.data.serializers.msgpack.loads(request.arguments[0])
-                args = command.schema_in.get(data=data)
-                if id:
-                    args.id = id
-                return args
-            except Exception as e:
-                if die:
-                    raise ValueError(
-                        "the content is not valid capnp while you provided content_type=capnp\n%s\n%s"
-                        % (e, request.arguments[0])
-                    )
-                return None
-
-        def json_decode(request, command, die=True):
-            try:
-                args = command.schema_in.get(data=j.data.serializers.json.loads(request.arguments[0]))
-                return args
-            except Exception as e:
-                if die:
-                    raise ValueError(
-                        "the content is not valid json while you provided content_type=json\n%s\n%s"
-                        % (str, request.arguments[0])
-                    )
-                return None
-
-        if request.content_type == "auto":
-            args = capnp_decode(request=request, command=command, die=False)
-            if args is None:
-                args = json_decode(request=request, command=command)
-        elif request.content_type == "json":
-            args = json_decode(request=request, command=command)
-        elif request.content_type == "capnp":
-            args = capnp_decode(request=request, command=command)
-        else:
-            raise ValueError("invalid content type was provided the valid types are ['json', 'capnp', 'auto']")
-
-        method_arguments = command.cmdobj.args
-        if "schema_out" in method_arguments:
+        if "schema_out" in command.cmdobj.args:
             raise RuntimeError("schema_out should not be in arguments of method")
-
-        params = {}
-
-        for key in command.schema_in.propertynames:
-            params[key] = getattr(args, key)
-
-        return params
+        return command.decoder.decode(request.arguments[0], request.content_type)
 
     def _cmd_obj_get(self, namespace, actor, cmd):
         """
@@ -391,7 +939,8 @@ class Handler(JSBASE):
         cmd_obj = meta.cmds[cmd]
 
         try:
-            cl = self.actors[key]
+            # the actor obj of the metadata, both are swapped at once when the actor is reloaded
+            cl = meta.actor if meta.actor is not None else self.actors[key]
             cmd_method = getattr(cl, cmd)
         except Exception as e:
             raise j.exceptions.Input(
@@ -399,10 +948,78 @@ class Handler(JSBASE):
             )
 
         cmd_obj.method = cmd_method
+        # async def methods are awaited by the asyncio backend
+        cmd_obj.coroutine = inspect.iscoroutinefunction(cmd_method)
+        cmd_obj.nr_args = 1 if cmd_obj.schema_in else _nr_args(cmd_method)
+        if cmd_obj.schema_in:
+            cmd_obj.decoder = SchemaDecoder(cmd_obj.schema_in)
+        cmd_obj.key = "%s.%s.%s" % (meta.namespace, meta.name, cmd)
         self.cmds[key_cmd] = cmd_obj
 
         return self.cmds[key_cmd]
 
+    def actor_evict(self, namespace, actor):
+        """
+        forget the resolved cmds of 1 actor, they are resolved again from the (reloaded) metadata
+
+        the tables are replaced instead of changed, a request being resolved never sees half of them
+        and requests which already have their cmd finish with it
+        """
+        prefix = "%s.%s." % (namespace, actor)
+        self.cmds = {key: cmd for key, cmd in self.cmds.items() if not cmd.key.startswith(prefix)}
+        self.dispatch = {name: cmd for name, cmd in self.dispatch.items() if not cmd.key.startswith(prefix)}
+
+
+def _dispatch_names(key):
+    """
+    a client can send endless spellings of the same cmd (case, a prefix before __ in the actor),
+    keeping only these names bounds the dispatch table to a few names per cmd
+
+    :param key: namespace.actor.cmd of the cmd
+    :return: the names of the cmd which are kept in the dispatch table: namespace.actor.cmd, actor.cmd
+             & cmd for the system actor
+    """
+    namespace, actor, cmd = key.split(".")
+    names = [key.encode(), ("%s.%s" % (actor, cmd)).encode()]
+    if namespace == "system" and actor == "system":
+        names.append(cmd.encode())
+    return names
+
+
+def _headers_parse(value):
+    """
+    :return: the headers (dict) in value, None when value is not a json dict
+    """
+    try:
+        headers = j.data.serializers.json.loads(value)
+    except (ValueError, TypeError):
+        return None
+    return headers if isinstance(headers, dict) else None
+
+
+def _nr_args(method):
+    """
+    :return: nr of arguments the client sends to a method which is not schema based, None when it has *args
+    """
+    nr = 0
+    for param in inspect.signature(method).parameters.values():
+        if param.kind == param.VAR_POSITIONAL:
+            return None
+        if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD) and param.name != "schema_out":
+            nr += 1
+    return nr
+
+
+def _arg_encode(arg):
+    """
+    the arguments of the calls of a batch as the client would send them
+    """
+    if isinstance(arg, bytes):
+        return arg
+    if isinstance(arg, str):
+        return arg.encode()
+    return str(arg).encode()
+
 
 def _result_encode(cmd, response_type, item):
 
@@ -411,6 +1028,8 @@ def _result_encode(cmd, response_type, item):
             return item._msgpack
         elif response_type == "capnp" or response_type == "auto":
             return item._data
+        elif response_type == "map":
+            return item._ddict
         else:
             return item._json
     else:
@@ -418,31 +1037,15 @@ def _result_encode(cmd, response_type, item):
         if isinstance(item, j.data.schema.DataObjBase):
             if response_type == "json":
                 return item._json
+            elif response_type == "map":
+                return item._ddict
             else:
                 return item._data
         return item
 
 
-def dm_verify(dm_id, epoch, signed_message):
+def _item_encoded(item):
     """
-    retrieve the verify key of the threebot identified by bot_id
-    from tfchain
-
-    :param dm_id: threebot identification, can be one of the name or the unique integer
-                    of a threebot
-    :type dm_id: string
-    :param epoch: the epoch param that is signed
-    :type epoch: str
-    :param signed_message: the epoch param signed by the private key
-    :type signed_message: str
-    :return: True if the verification succeeded
-    :rtype: bool
-    :raises: PermissionError in case of wrong message
+    encode method of the cursor over the items of a cpu bound cmd, they are encoded by the worker already
     """
-    tfchain = j.clients.tfchain.new("3bot", network_type="TEST")
-    record = tfchain.threebot.record_get(dm_id)
-    verify_key = nacl.signing.VerifyKey(str(record.public_key.hash), encoder=nacl.encoding.HexEncoder)
-    if verify_key.verify(signed_message) != epoch:
-        raise PermissionError("You couldn't authenticate your 3bot: {}".format(dm_id))
-
-    return True
+    return item
@@ -0,0 +1,89 @@
+from Jumpscale import j
+
+# change when the metadata of a cmd changes meaning, all entries are parsed again
+CACHE_VERSION = 1
+
+
+class ActorsMetaCache:
+    """
+    on disk cache of the parsed metadata (jumpscale.gedis.api data incl. the schema texts) of the actors
+
+    an entry is used as long as the content of the actor file and the api schema are unchanged,
+    so unchanged actors don't need inspect.getsource & the parsing of the docstrings of all their methods
+    """
+
+    def __init__(self, path, api_schema_text):
+        """
+        :param path: dir of the cache files
+        :param api_schema_text: text of the jumpscale.gedis.api schema, part of the key of the entries
+        """
+        self.path = path
+        j.sal.fs.createDir(path)
+        self._version = j.data.hash.md5_string("%s:%s" % (CACHE_VERSION, api_schema_text))
+        self.hits = 0
+        self.misses = 0
+        self.time_parse = 0.0  # nr of seconds spent parsing the actors which were not in the cache
+        self.time_load = 0.0  # nr of seconds spent loading the actors from the cache
+        self.time_saved = 0.0  # nr of seconds the parsing of the actors from the cache took when they were added
+
+    def _entry_path(self, actor_path, namespace):
+        key = j.data.hash.md5_string("%s:%s" % (namespace, j.sal.fs.pathNormalize(actor_path)))
+        return j.sal.fs.joinPaths(self.path, "%s.msgpack" % key)
+
+    def content_hash(self, actor_path):
+        return j.data.hash.md5_string(j.sal.fs.readFile(actor_path))
+
+    def get(self, actor_path, namespace, content_hash):
+        """
+        :return: the data of the jumpscale.gedis.api object, None if not in the cache or the actor changed
+        """
+        entry_path = self._entry_path(actor_path, namespace)
+        if not j.sal.fs.exists(entry_path):
+            return None
+        try:
+            entry = j.data.serializers.msgpack.loads(j.sal.fs.readFile(entry_path, binary=True))
+        except Exception:
+            # corrupt, is written again
+            return None
+        if entry.get("version") != self._version or entry.get("hash") != content_hash:
+            return None
+        return entry
+
+    def set(self, actor_path, namespace, content_hash, data, time_parse):
+        """
+        :param data: the data of the jumpscale.gedis.api object
+        :param time_parse: nr of seconds the parsing took
+        """
+        entry = {"version": self._version, "hash": content_hash, "data": data, "time_parse": time_parse}
+        entry_path = self._entry_path(actor_path, namespace)
+        # write & rename, a server starting at the same time never reads half an entry
+        j.sal.fs.writeFile(entry_path + ".tmp", j.data.serializers.msgpack.dumps(entry))
+        j.sal.fs.moveFile(entry_path + ".tmp", entry_path)
+
+    def hit(self, entry, time_load):
+        self.hits += 1
+        self.time_load += time_load
+        self.time_saved += max(entry["time_parse"] - time_load, 0)
+
+    def miss(self, time_parse):
+        self.misses += 1
+        self.time_parse += time_parse
+
+    def report(self):
+        """
+        :return: dict with the nr of actors loaded from the cache & parsed, the time spent & saved
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "time_parse": self.time_parse,
+            "time_load": self.time_load,
+            "time_saved": self.time_saved,
+        }
+
+    def reset(self):
+        """
+        remove all entries
+        """
+        j.sal.fs.remove(self.path)
+        j.sal.fs.createDir(self.path)
@@ -1,4 +1,4 @@
-from io import BytesIO
+import itertools
 
 from Jumpscale import j
 from redis.connection import Encoder, PythonParser, SocketBuffer
@@ -23,6 +23,13 @@ class RedisCommandParser(PythonParser):
         # rename the function to map more with server side
         return self.read_response()
 
+    def has_pending(self):
+        """
+        :return: True when the read buffer still holds bytes of requests the client already sent (pipelining)
+        :rtype: bool
+        """
+        return self._buffer is not None and self._buffer.length > 0
+
     def request_to_dict(self, request):
         # request.pop(0) #first one is command it self
         key = None
@@ -39,75 +46,263 @@ class RedisCommandParser(PythonParser):
         return res
 
 
+class _Incomplete(Exception):
+    """
+    the buffer ends in the middle of a request
+    """
+
+
+class RedisRequestReader:
+    """
+    incremental parser of the requests of a client, for transports which push the received bytes (asyncio)
+
+        reader.feed(data) -> list of the requests which are complete, the rest stays buffered
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # nr of bytes needed before a request can be complete, avoids parsing a big bulk again for every chunk
+        self._wait = 0
+
+    def feed(self, data):
+        """
+        :param data: bytes received from the client
+        :return: list of the complete requests, each one a list of bytes
+        """
+        buffer = self._buffer
+        buffer += data
+        if len(buffer) < self._wait:
+            return []
+        self._wait = 0
+
+        requests = []
+        pos = 0
+        try:
+            while pos < len(buffer):
+                start = pos
+                try:
+                    if buffer[pos] == 42:  # *
+                        request, pos = self._array_parse(buffer, pos)
+                    else:
+                        request, pos = self._inline_parse(buffer, pos)
+                except _Incomplete as e:
+                    self._wait = e.args[0] - start if e.args else 0
+                    pos = start
+                    break
+                if request:
+                    requests.append(request)
+        finally:
+            del buffer[:pos]
+        return requests
+
+    @property
+    def pending(self):
+        """
+        :return: True when part of a request is buffered
+        """
+        return len(self._buffer) > 0
+
+    @staticmethod
+    def _line_end(buffer, pos):
+        end = buffer.find(b"\r\n", pos)
+        if end < 0:
+            raise _Incomplete()
+        return end
+
+    def _array_parse(self, buffer, pos):
+        end = self._line_end(buffer, pos)
+        try:
+            nr = int(buffer[pos + 1 : end])
+        except ValueError:
+            raise ValueError("Protocol error: invalid multibulk length")
+        pos = end + 2
+        request = []
+        for _ in range(nr):
+            if pos >= len(buffer):
+                raise _Incomplete()
+            if buffer[pos] != 36:  # $
+                raise ValueError("Protocol error: expected '$', got '%s'" % chr(buffer[pos]))
+            end = self._line_end(buffer, pos)
+            try:
+                length = int(buffer[pos + 1 : end])
+            except ValueError:
+                raise ValueError("Protocol error: invalid bulk length")
+            pos = end + 2
+            if len(buffer) < pos + length + 2:
+                raise _Incomplete(pos + length + 2)
+            request.append(bytes(buffer[pos : pos + length]))
+            pos += length + 2
+        return request, pos
+
+    def _inline_parse(self, buffer, pos):
+        # like redis-cli & telnet send them: PING\r\n
+        end = self._line_end(buffer, pos)
+        return bytes(buffer[pos:end]).split(), end + 2
+
+
+class Push(list):
+    """
+    out of band message of RESP3 (>), e.g. ["message", channel, data] for the subscribers of a channel
+    """
+
+
+class Replies(list):
+    """
+    more than 1 reply to 1 request, the items are encoded one after the other (e.g. a Push per channel of SUBSCRIBE)
+    """
+
+
 class RedisResponseWriter(object):
-    """Writes data back to client as dictated by the Redis Protocol."""
+    """
+    Writes data back to client as dictated by the Redis Protocol.
+
+    a complete reply (also nested arrays) is encoded into 1 bytearray and sent with 1 write
+    """
 
     def __init__(self, socket):
         self.socket = socket
-        self.buffer = BytesIO()
+        self.buffer = bytearray()
 
-    def encode(self, value):
-        """Respond with data."""
-        if value is None:
-            self._write_buffer("$-1\r\n")
-        elif isinstance(value, int):
-            self._write_buffer(":%d\r\n" % value)
-        elif isinstance(value, bool):
-            self._write_buffer(":%d\r\n" % (1 if value else 0))
-        elif isinstance(value, str):
-            if "\n" in value:
-                self._bulk(value)
-            else:
-                self._write_buffer("+%s\r\n" % value)
-        elif isinstance(value, bytes):
-            self._bulkbytes(value)
-        elif isinstance(value, list):
-            if value and value[0] == "*REDIS*":
-                value = value[1:]
-            self._array(value)
-        elif hasattr(value, "__repr__"):
-            self._bulk(value.__repr__())
-        else:
-            value = j.data.serializers.json.dumps(value, encoding="utf-8")
-            self.encode(value)
+    def encode(self, value, flush=True, resp3=False):
+        """
+        Respond with data.
+
+        :param flush: when False the reply stays in the buffer until flush() is called,
+                      used to send the replies of pipelined requests in one write
+        :param resp3: the connection switched to RESP3 (HELLO 3): maps, doubles, booleans, null & push
+        """
+        buffer = self.buffer
+        mark = len(buffer)
+        try:
+            _encode(value, buffer, resp3)
+        except Exception:
+            # never leave half a reply in the buffer, the error will be sent instead
+            del buffer[mark:]
+            raise
 
-        self._send()
+        if flush:
+            self._send()
 
-    def status(self, msg="OK"):
+    def status(self, msg="OK", flush=True):
         """Send a status."""
-        self._write_buffer("+%s\r\n" % msg)
-        self._send()
+        self.buffer += b"+%s\r\n" % _line(msg)
+        if flush:
+            self._send()
 
-    def error(self, msg):
-        """Send an error."""
+    def error(self, msg, flush=True, code="ERR"):
+        """
+        Send an error.
+
+        :param code: error code, first word of the error e.g. ERR or BUSY
+        """
         print("###:%s" % msg)
-        self._write_buffer("-ERR %s\r\n" % str(msg))
-        self._send()
+        self.buffer += b"-%s %s\r\n" % (code.encode(), _line(msg))
+        if flush:
+            self._send()
 
-    def _bulk(self, value):
-        """Send part of a multiline reply."""
-        data = ["$", str(len(value)), "\r\n", value, "\r\n"]
-        self._write_buffer("".join(data))
+    def flush(self):
+        """Send everything which is buffered in one write."""
+        if self.buffer:
+            self._send()
 
-    def _array(self, value):
-        """send an array."""
-        self._write_buffer("*%d\r\n" % len(value))
-        for item in value:
-            self.encode(item)
+    def _send(self):
+        # a new buffer before sending, what is encoded while sendall() waits (e.g. a push) is sent next time
+        buffer, self.buffer = self.buffer, bytearray()
+        self.socket.sendall(buffer)
 
-    def _bulkbytes(self, value):
-        data = [b"$", str(len(value)).encode(), b"\r\n", value, b"\r\n"]
-        self._write_buffer(b"".join(data))
 
-    def _write_buffer(self, data):
-        if isinstance(data, str):
-            data = data.encode()
+def _line(msg):
+    """
+    status & error replies are 1 line, newlines would break the protocol
+    """
+    return str(msg).replace("\r", " ").replace("\n", " ").encode()
 
-        self.buffer.write(data)
 
-    def _send(self):
-        self.socket.sendall(self.buffer.getvalue())
-        self.buffer = BytesIO()  # seems faster then truncating
+def _encode(value, buffer, resp3=False):
+    """
+    encode value in RESP and append it to buffer
+
+    arrays are walked with a stack of iterators instead of recursion,
+    so nested lists of schema objects don't need a call (& buffer) per element
+
+    :param resp3: dict, float, bool, None, set & Push get their own RESP3 type,
+                  in RESP2 they are sent as before (bulk string, integer, nil)
+    """
+    stack = []
+    while True:
+        vtype = type(value)
+        # fast paths for the most common types
+        if vtype is bytes:
+            buffer += b"$%d\r\n" % len(value)
+            buffer += value
+            buffer += b"\r\n"
+        elif vtype is str:
+            if "\n" in value:
+                value = value.encode()
+                buffer += b"$%d\r\n" % len(value)
+                buffer += value
+                buffer += b"\r\n"
+            else:
+                buffer += b"+%s\r\n" % value.encode()
+        elif vtype is int:
+            buffer += b":%d\r\n" % value
+        elif value is None:
+            buffer += b"_\r\n" if resp3 else b"$-1\r\n"
+        elif vtype is list:
+            if value and value[0] == "*REDIS*":
+                value = value[1:]
+            buffer += b"*%d\r\n" % len(value)
+            if value:
+                stack.append(iter(value))
+        elif isinstance(value, bool):
+            if resp3:
+                buffer += b"#t\r\n" if value else b"#f\r\n"
+            else:
+                buffer += b":1\r\n" if value else b":0\r\n"
+        elif resp3 and isinstance(value, dict):
+            buffer += b"%%%d\r\n" % len(value)
+            if value:
+                stack.append(itertools.chain.from_iterable(value.items()))
+        elif resp3 and isinstance(value, float):
+            buffer += b",%s\r\n" % repr(value).encode()
+        elif resp3 and isinstance(value, (set, frozenset)):
+            buffer += b"~%d\r\n" % len(value)
+            if value:
+                stack.append(iter(value))
+        elif vtype is Push:
+            buffer += b">%d\r\n" % len(value)
+            stack.append(iter(value))
+        elif vtype is Replies:
+            if value:
+                stack.append(iter(value))
+        elif isinstance(value, int):
+            buffer += b":%d\r\n" % value
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            buffer += b"$%d\r\n" % len(value)
+            buffer += value
+            buffer += b"\r\n"
+        elif isinstance(value, Exception):
+            # error inside an array, e.g. the result of 1 call of a batch
+            buffer += b"-%s %s\r\n" % (getattr(value, "code", "ERR").encode(), _line(value))
+        elif isinstance(value, str):
+            stack.append(iter([str(value)]))
+        elif isinstance(value, list):
+            stack.append(iter([list(value)]))
+        else:
+            value = repr(value).encode()
+            buffer += b"$%d\r\n" % len(value)
+            buffer += value
+            buffer += b"\r\n"
+
+        # go to the next element of the array which is being encoded
+        while stack:
+            try:
+                value = next(stack[-1])
+                break
+            except StopIteration:
+                stack.pop()
+        else:
+            return
 
 
 class WebsocketResponseWriter:
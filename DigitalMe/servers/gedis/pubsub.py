@@ -0,0 +1,59 @@
+from .protocol import Push
+
+
+class PubSub:
+    """
+    channels the connections in RESP3 (HELLO 3) subscribe to, the messages are pushed to them
+
+        SUBSCRIBE chat.<session id> job.<job id>
+        gedis_server.publish("chat.<session id>", {"cat": "md_show", "msg": "..."})
+
+    a connection which is gone or too slow to take a push is removed from its channels,
+    the channels are per process (see the workers of the gedis server)
+    """
+
+    def __init__(self):
+        self.channels = {}  # channel -> {Session}
+
+    def subscribe(self, session, channel):
+        """
+        :return: nr of channels the session is subscribed to
+        """
+        self.channels.setdefault(channel, set()).add(session)
+        session.channels.add(channel)
+        return len(session.channels)
+
+    def unsubscribe(self, session, channel):
+        """
+        :return: nr of channels the session is still subscribed to
+        """
+        sessions = self.channels.get(channel)
+        if sessions is not None:
+            sessions.discard(session)
+            if not sessions:
+                del self.channels[channel]
+        session.channels.discard(channel)
+        return len(session.channels)
+
+    def unsubscribe_all(self, session):
+        for channel in list(session.channels):
+            self.unsubscribe(session, channel)
+
+    def publish(self, channel, message):
+        """
+        :param message: bytes, str, or anything the RESP3 encoder handles (dict, list, int, ...)
+        :return: nr of connections the message is pushed to
+        """
+        sessions = self.channels.get(channel)
+        if not sessions:
+            return 0
+        push = Push(["message", channel, message])
+        nr = 0
+        for session in list(sessions):
+            try:
+                session.push(push)
+                nr += 1
+            except Exception:
+                # connection is gone or closed because it didn't read, the next messages don't wait for it
+                self.unsubscribe_all(session)
+        return nr
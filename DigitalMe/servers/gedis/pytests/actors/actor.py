@@ -84,5 +84,23 @@ class actor(JSBASE):
         """
         return "%s %s" % (foo, bar)
 
+    def fibonacci(self, n):
+        """
+        ```gedis
+        cpu = true
+        ```
+        """
+        a, b = 0, 1
+        for _ in range(int(n)):
+            a, b = b, a + b
+        return a
+
+    def numbers(self, nr):
+        for i in range(int(nr)):
+            yield i
+
+    async def echo_async(self, input):
+        return input
+
     def raise_error(self):
         raise RuntimeError("woopsy daisy")
@@ -0,0 +1,83 @@
+import time
+
+import gevent
+import nacl.encoding
+import nacl.signing
+import pytest
+from DigitalMe.servers.gedis.auth import VerifyKeyCache
+
+
+class KeySource:
+    def __init__(self, keys):
+        self.keys = keys
+        self.lookups = 0
+
+    def __call__(self, dm_id):
+        self.lookups += 1
+        return self.keys.get(dm_id)
+
+
+def test_verify_key_cache():
+    signing_key = nacl.signing.SigningKey.generate()
+    public_key = signing_key.verify_key.encode(encoder=nacl.encoding.HexEncoder)
+    source = KeySource({"test.bot": public_key})
+    cache = VerifyKeyCache(source=source, ttl=600, ttl_negative=600)
+
+    epoch = str(int(time.time())).encode()
+    signed = signing_key.sign(epoch)
+    for _ in range(10):
+        assert cache.verify("test.bot", epoch, signed)
+    assert source.lookups == 1
+
+    with pytest.raises(PermissionError):
+        cache.verify("test.bot", b"1234", signed)
+
+    # unknown bots are cached as well
+    for _ in range(10):
+        with pytest.raises(PermissionError):
+            cache.verify("unknown.bot", epoch, signed)
+    assert source.lookups == 2
+
+
+def test_verify_key_cache_expiration():
+    signing_key = nacl.signing.SigningKey.generate()
+    public_key = signing_key.verify_key.encode(encoder=nacl.encoding.HexEncoder)
+    source = KeySource({"test.bot": public_key})
+    cache = VerifyKeyCache(source=source, ttl=0, ttl_negative=0, size=1)
+
+    cache.get("test.bot")
+    cache.get("test.bot")
+    assert source.lookups == 2
+    with pytest.raises(PermissionError):
+        cache.get("unknown.bot")
+    assert list(cache._keys.keys()) == ["unknown.bot"]
+
+
+def test_verify_key_cache_single_flight():
+    signing_key = nacl.signing.SigningKey.generate()
+    public_key = signing_key.verify_key.encode(encoder=nacl.encoding.HexEncoder)
+    keys = {"test.bot": public_key}
+    lookups = []
+
+    def source(dm_id):
+        lookups.append(dm_id)
+        gevent.sleep(0.05)
+        if dm_id == "broken.bot":
+            raise ConnectionError("tfchain not reachable")
+        return keys.get(dm_id)
+
+    cache = VerifyKeyCache(source=source)
+    # the requests of many clients reconnecting at once
+    greenlets = [gevent.spawn(cache.get, "test.bot") for _ in range(10)]
+    gevent.joinall(greenlets, raise_error=True)
+    assert lookups == ["test.bot"]
+    assert len({greenlet.value for greenlet in greenlets}) == 1
+
+    # a failed lookup fails all requests waiting for it, the next request tries again
+    greenlets = [gevent.spawn(cache.get, "broken.bot") for _ in range(10)]
+    gevent.joinall(greenlets)
+    assert all(isinstance(greenlet.exception, ConnectionError) for greenlet in greenlets)
+    assert lookups == ["test.bot", "broken.bot"]
+    with pytest.raises(ConnectionError):
+        cache.get("broken.bot")
+    assert lookups == ["test.bot", "broken.bot", "broken.bot"]
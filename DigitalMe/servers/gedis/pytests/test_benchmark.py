@@ -0,0 +1,88 @@
+import json
+import socketserver
+import threading
+import time
+
+from DigitalMe.servers.gedis.benchmark import WORKLOADS, _client_run, percentile, report_compare
+
+
+def test_percentile():
+    durations = list(range(1000))
+    assert percentile(durations, 50) == 500
+    assert percentile(durations, 99.9) == 999
+    # too few samples
+    assert percentile(durations[:999], 99.9) is None
+    assert percentile(durations[:99], 99) is None
+    assert percentile([1], 99.9) is None
+    assert percentile([1, 2], 50) == 2
+
+
+def test_workloads():
+    for name, request in WORKLOADS.items():
+        args = request(16)
+        assert args[0].split(".")[0] in ["system", "actor"]
+    assert json.loads(WORKLOADS["schema_in_out"](16)[1]) == {"x": {"foo": "x" * 16}}
+
+
+class SlowPingHandler(socketserver.StreamRequestHandler):
+    """
+    replies PONG to every request after 5 ms
+    """
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            for _ in range(int(line[1:]) * 2):
+                self.rfile.readline()
+            time.sleep(0.005)
+            self.wfile.write(b"+PONG\r\n")
+
+
+class Conn:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, obj):
+        self.sent.append(obj)
+
+    def close(self):
+        pass
+
+
+def test_client_run():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SlowPingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    start_event = threading.Event()
+    start_event.set()
+    conn = Conn()
+    try:
+        _client_run("127.0.0.1", server.server_address[1], ["system.ping"], 20, 4, start_event, conn)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert conn.sent[0] == (True, None)
+    ok, (begin, end, durations) = conn.sent[1]
+    assert ok
+    # 1 sample per round trip of 4 pipelined requests, not divided by the depth
+    assert len(durations) == 5
+    assert min(durations) >= 0.02
+
+
+def test_report_compare():
+    old = {"results": [{"workload": "echo", "size": 16, "ops_sec": 1000.0, "p99": 2.0}]}
+    new = {
+        "results": [
+            {"workload": "echo", "size": 16, "ops_sec": 900.0, "p99": 3.0},
+            {"workload": "numbers", "size": 16, "ops_sec": 100.0, "p99": 1.0},
+        ]
+    }
+    changes = report_compare(old, new)
+    assert list(changes) == [("echo", 16)]
+    ops, p99 = changes[("echo", 16)]
+    assert round(ops) == -10
+    assert round(p99) == 50
+
+    new["results"][0]["p99"] = None
+    assert report_compare(old, new)[("echo", 16)][1] is None
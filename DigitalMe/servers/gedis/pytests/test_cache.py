@@ -0,0 +1,44 @@
+import time
+
+from DigitalMe.servers.gedis.cache import MISS, ResponseCache
+
+
+def test_cache():
+    cache = ResponseCache(size=2)
+    key = ("default.farmer.farmers_get", (b"{}",), "auto")
+    assert cache.get(key) is MISS
+    cache.set(key, None, 10)
+    assert cache.get(key) is None
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+    # least recently used is removed first
+    cache.set(("default.farmer.country_list", (), "auto"), ["be"], 10)
+    cache.get(key)
+    cache.set(("default.notary_actor.get", (b"hash",), "auto"), b"reservation", 10)
+    assert len(cache) == 2
+    assert cache.get(("default.farmer.country_list", (), "auto")) is MISS
+    assert cache.get(key) is None
+
+
+def test_cache_expiration():
+    cache = ResponseCache()
+    key = ("default.farmer.farmers_get", (), "auto")
+    cache.set(key, [], 0.01)
+    time.sleep(0.02)
+    assert cache.get(key) is MISS
+    assert len(cache) == 0
+
+
+def test_cache_invalidate():
+    cache = ResponseCache()
+    cache.set(("default.farmer.farmers_get", (), "auto"), [], 10)
+    cache.set(("default.farmer.country_list", (), "auto"), [], 10)
+    cache.set(("default.notary_actor.get", (b"hash",), "json"), b"", 10)
+    cache.set(("system.system.api_meta_get", (b"default",), "auto"), b"", 10)
+
+    assert cache.invalidate(actor="farmer", cmd="farmers_get") == 1
+    assert cache.invalidate(namespace="default") == 2
+    assert len(cache) == 1
+    assert cache.invalidate() == 1
+    assert len(cache) == 0
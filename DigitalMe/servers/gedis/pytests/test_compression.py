@@ -0,0 +1,92 @@
+import pytest
+
+from DigitalMe.servers.gedis.compression import (
+    MAGIC,
+    Compressor,
+    codecs_available,
+    compressor_get,
+    decompress,
+    result_decompress,
+)
+
+
+@pytest.mark.parametrize("name", ["lz4", "zstd"])
+def test_compress(name):
+    if name not in codecs_available():
+        pytest.skip("%s is not installed" % name)
+    compressor = compressor_get("%s,lz4" % name, min_size=100)
+    assert compressor.name == name
+
+    value = b'{"node_zos_id": "abc", "farmer_id": 1}' * 100
+    compressed = compressor.compress(value)
+    assert compressed.startswith(MAGIC)
+    assert len(compressed) < len(value)
+    assert decompress(compressed) == value
+
+    # str replies become bulk values
+    assert decompress(compressor.compress(value.decode())) == value
+
+    # small values & values which don't get smaller are sent as they are
+    assert compressor.compress(b"pong") == b"pong"
+    assert compressor.compress("pong") == "pong"
+    assert compressor.compress(1) == 1
+    incompressible = bytes(range(256))
+    assert compressor.compress(incompressible) == incompressible
+
+    # items of a list are compressed, deeper levels not
+    result = compressor.result_compress([value, b"small", [value]])
+    assert result[0] != value
+    assert result_decompress(result) == [value, b"small", [value]]
+
+
+def test_escape():
+    compressor = compressor_get(codecs_available(), min_size=100)
+    if compressor is None:
+        pytest.skip("no codec installed")
+    # data which looks like a compressed value is never mistaken for one
+    value = MAGIC + b"4 not compressed"
+    sent = compressor.compress(value)
+    assert sent != value
+    assert decompress(sent) == value
+    # uncompressed values of connections without compression are left alone
+    assert decompress(b"pong") == b"pong"
+    assert decompress(None) is None
+
+
+@pytest.mark.parametrize("name", ["lz4", "zstd"])
+def test_decompress_max_size(name):
+    if name not in codecs_available():
+        pytest.skip("%s is not installed" % name)
+    compressor = compressor_get(name, min_size=100)
+    value = b"\0" * 10000
+    compressed = compressor.compress(value)
+    assert decompress(compressed, max_size=10000) == value
+    # a small value which decompresses to a lot is refused
+    with pytest.raises(ValueError):
+        decompress(compressed, max_size=9999)
+    with pytest.raises(ValueError):
+        result_decompress([b"small", compressed], max_size=9999)
+    with pytest.raises(ValueError):
+        decompress(compressed[:-10])
+
+
+def test_decompress_max_size_zstd_streamed():
+    if "zstd" not in codecs_available():
+        pytest.skip("zstd is not installed")
+    import zstandard
+
+    # no size in the frame header
+    compressed = MAGIC + b"z" + zstandard.ZstdCompressor(write_content_size=False).compress(b"\0" * 10000)
+    assert decompress(compressed) == b"\0" * 10000
+    with pytest.raises(ValueError):
+        decompress(compressed, max_size=9999)
+
+
+def test_compressor_get():
+    assert compressor_get("snappy") is None
+    assert compressor_get("") is None
+
+
+def test_compressor_unknown():
+    with pytest.raises(ValueError):
+        Compressor("snappy")
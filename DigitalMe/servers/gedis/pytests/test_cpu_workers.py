@@ -0,0 +1,91 @@
+import os
+import time
+
+import gevent
+import pytest
+from types import SimpleNamespace
+
+from DigitalMe.servers.gedis.GedisCPUWorkers import GedisCPUWorkers
+from DigitalMe.servers.gedis.handlers import Request
+from DigitalMe.servers.gedis.pytests.test_handlers import handler_get
+
+
+class Actor:
+    def big(self, size):
+        return b"x" * int(size)
+
+    def pid(self):
+        return str(os.getpid()).encode()
+
+    def exit(self):
+        os._exit(1)
+
+    def sleep(self, seconds):
+        time.sleep(float(seconds))
+        return b"done"
+
+
+@pytest.fixture
+def workers():
+    server = handler_get().gedis_server
+    actor = Actor()
+    server.actors["default__actor"] = actor
+    cmds = {
+        name: SimpleNamespace(schema_in=None, schema_out=None, stream=False) for name in ["big", "pid", "exit", "sleep"]
+    }
+    server.cmds_meta["default__actor"] = SimpleNamespace(namespace="default", name="actor", actor=actor, cmds=cmds)
+    workers = GedisCPUWorkers(server, size=1)
+    workers.start()
+    yield workers
+    workers.stop()
+
+
+def execute(workers, *args):
+    request = Request([arg.encode() for arg in args])
+    request._content_type = request._response_type = "auto"
+    return workers.execute(request)
+
+
+def test_big_result(workers):
+    ticks = []
+
+    def tick():
+        while True:
+            ticks.append(time.monotonic())
+            gevent.sleep(0.001)
+
+    ticker = gevent.spawn(tick)
+    gevent.sleep(0.01)
+    size = 64 * 1024 * 1024
+    start = time.monotonic()
+    # the result is read in chunks, the other greenlets keep running while it is transferred
+    assert len(execute(workers, "actor.big", str(size))) == size
+    ticker.kill()
+    assert len([t for t in ticks if t > start]) > 2
+    assert execute(workers, "actor.big", "3") == b"xxx"
+
+
+def test_worker_died(workers):
+    pid = execute(workers, "actor.pid")
+    with pytest.raises(RuntimeError, match="cpu worker died"):
+        execute(workers, "actor.exit")
+    # the dead worker is not put back, the next request gets a new one
+    assert len(workers._workers) == 0
+    assert execute(workers, "actor.pid") != pid
+    assert len(workers._workers) == 1
+
+
+def test_worker_timeout(workers):
+    pid = execute(workers, "actor.pid")
+    with pytest.raises(gevent.Timeout):
+        with gevent.Timeout(0.1):
+            execute(workers, "actor.sleep", "5")
+    # the reply of the request which timed out is not read by the next one
+    assert execute(workers, "actor.sleep", "0") == b"done"
+    assert execute(workers, "actor.pid") != pid
+
+
+def test_stopped(workers):
+    workers.stop()
+    with pytest.raises(RuntimeError, match="stopped"):
+        execute(workers, "actor.pid")
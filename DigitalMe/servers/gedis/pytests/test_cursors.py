@@ -0,0 +1,46 @@
+import pytest
+from DigitalMe.servers.gedis.cursors import CURSOR_DONE, GedisCursors
+
+
+def test_cursors():
+    cursors = GedisCursors(chunk_size=10)
+    cursor_id, items = cursors.new(range(25), str)
+    assert items == [str(i) for i in range(10)]
+
+    cursor_id, items = cursors.next(cursor_id)
+    assert items == [str(i) for i in range(10, 20)]
+    cursor_id, items = cursors.next(cursor_id, chunk_size=100)
+    assert cursor_id == CURSOR_DONE
+    assert items == [str(i) for i in range(20, 25)]
+    assert len(cursors) == 0
+
+    with pytest.raises(KeyError):
+        cursors.next(cursor_id)
+
+
+def test_cursors_close():
+    closed = []
+
+    def numbers():
+        try:
+            for i in range(100):
+                yield i
+        finally:
+            closed.append(True)
+
+    cursors = GedisCursors(chunk_size=10)
+    cursor_id, items = cursors.new(numbers(), lambda x: x)
+    assert items == list(range(10))
+    assert cursors.close(cursor_id)
+    assert closed == [True]
+    assert not cursors.close(cursor_id)
+
+
+def test_cursors_expiration():
+    cursors = GedisCursors(chunk_size=1, timeout=-1)
+    cursor_id, _ = cursors.new(range(10), str)
+    assert len(cursors) == 1
+    # force the check for expired cursors
+    cursors._sweep_next = 0
+    with pytest.raises(KeyError):
+        cursors.next(cursor_id)
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+from Jumpscale import j
+
+from DigitalMe.servers.gedis.decoders import SchemaDecoder
+
+
+class FakeSchema:
+    """
+    schema with a default for every property, get() records the data objects it makes
+    """
+
+    def __init__(self, **properties):
+        """
+        :param properties: name -> (jumpscale type name, clean method, default)
+        """
+        self.properties = [
+            SimpleNamespace(name=name, jumpscaletype=SimpleNamespace(NAME=type_name, clean=clean))
+            for name, (type_name, clean, _) in properties.items()
+        ]
+        self.propertynames = list(properties)
+        self.defaults = {name: default for name, (_, _, default) in properties.items()}
+        self.objects = []
+
+    def get(self, data):
+        obj = SimpleNamespace(**dict(self.defaults, **data))
+        self.objects.append(obj)
+        return obj
+
+
+def schema_simple():
+    return FakeSchema(foo=("string", str, ""), bar=("integer", int, 0))
+
+
+def test_decode_auto():
+    schema = schema_simple()
+    decoder = SchemaDecoder(schema)
+    # json starts with {
+    assert decoder.decode(b' {"foo": "x", "bar": "1"}') == {"foo": "x", "bar": 1}
+    # otherwise it's capnp: msgpack of [id, data]
+    data = j.data.serializers.msgpack.dumps([5, {"foo": "y"}])
+    assert decoder.decode(data) == {"foo": "y", "bar": 0}
+    assert schema.objects[-1].id == 5
+
+
+def test_decode_simple_fast_path():
+    schema = schema_simple()
+    decoder = SchemaDecoder(schema)
+    assert decoder.decode(b'{"foo": 1, "bar": "2"}', "json") == {"foo": "1", "bar": 2}
+    # cleaned field by field, no data object
+    assert schema.objects == []
+
+
+def test_decode_missing_fields():
+    schema = schema_simple()
+    decoder = SchemaDecoder(schema)
+    # the data object fills in the default
+    assert decoder.decode(b'{"foo": "x"}', "json") == {"foo": "x", "bar": 0}
+    assert len(schema.objects) == 1
+    # same nr of fields, but not the same ones
+    assert decoder.decode(b'{"foo": "x", "other": 1}', "json") == {"foo": "x", "bar": 0}
+    assert len(schema.objects) == 2
+
+
+def test_decode_not_simple():
+    schema = FakeSchema(foo=("string", str, ""), items=("list", list, []))
+    decoder = SchemaDecoder(schema)
+    assert decoder.decode(b'{"foo": "x", "items": [1]}') == {"foo": "x", "items": [1]}
+    assert len(schema.objects) == 1
+
+
+def test_decode_invalid():
+    decoder = SchemaDecoder(schema_simple())
+    with pytest.raises(ValueError):
+        decoder.decode(b"{foo", "json")
+    with pytest.raises(ValueError):
+        decoder.decode(b'{"foo": "x"}', "yaml")
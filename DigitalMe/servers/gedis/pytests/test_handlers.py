@@ -0,0 +1,537 @@
+import time
+import weakref
+
+import gevent
+import pytest
+from Jumpscale import j
+from gevent import socket
+from gevent.event import Event
+from gevent.pool import Pool
+from gevent.server import StreamServer
+from types import SimpleNamespace
+
+from DigitalMe.servers.gedis import handlers
+from DigitalMe.servers.gedis.cache import ResponseCache
+from DigitalMe.servers.gedis.compression import MAX_SIZE, codecs_available, compressor_get
+from DigitalMe.servers.gedis.cursors import GedisCursors
+from DigitalMe.servers.gedis.decoders import SchemaDecoder
+from DigitalMe.servers.gedis.GedisWorkers import unix_listener
+from DigitalMe.servers.gedis.handlers import DeadlineError, Handler, Request, Session, _nr_args
+from DigitalMe.servers.gedis.pubsub import PubSub
+from DigitalMe.servers.gedis.pytests.test_decoders import FakeSchema
+from DigitalMe.servers.gedis.ratelimit import RateLimits
+from DigitalMe.servers.gedis.stats import GedisStats, SlowLog
+
+
+@pytest.mark.parametrize(
+    "raw,namespace,actor,command",
+    [
+        ([b"ping"], "system", "system", "ping"),
+        ([b"Actor.Echo", b"a"], "system", "actor", "echo"),
+        ([b"default.actor.echo", b"a"], "default", "actor", "echo"),
+        ([b"ibiza.model__wallet.get", b"a"], "ibiza", "wallet", "get"),
+    ],
+)
+def test_request_command(raw, namespace, actor, command):
+    request = Request(raw)
+    assert request.name == raw[0]
+    assert request.command.namespace == namespace
+    assert request.command.actor == actor
+    assert request.command.command == command
+    # parsed only once
+    assert request.command is request.command
+
+
+def test_request_headers():
+    request = Request([b"actor.schema_in", b"data", b'{"content_type": "JSON", "response_type": "msgpack"}'])
+    assert request.arguments == [b"data", b'{"content_type": "JSON", "response_type": "msgpack"}']
+    assert request.content_type == "json"
+    assert request.response_type == "msgpack"
+
+    # a 2nd argument of a method which is not schema based is not a header
+    request = Request([b"actor.args_in", b"hello", b"1"])
+    assert request.headers == {}
+    assert request.content_type == "auto"
+
+    request = Request([b"actor.ping"])
+    assert request.arguments == []
+    assert request.response_type == "auto"
+
+
+def test_actor_evict():
+    handler = Handler.__new__(Handler)
+    echo = SimpleNamespace(key="default.actor.echo")
+    ping = SimpleNamespace(key="default.actor2.ping")
+    handler.cmds = {"default__actor__echo": echo, "default__actor2__ping": ping}
+    handler.dispatch = {b"actor.echo": echo, b"default.actor.echo": echo, b"actor2.ping": ping}
+    cmds = handler.cmds
+
+    handler.actor_evict("default", "actor")
+    assert handler.cmds == {"default__actor2__ping": ping}
+    assert handler.dispatch == {b"actor2.ping": ping}
+    # replaced, not changed while a request could be resolving
+    assert len(cmds) == 2
+
+
+def test_headers_split():
+    handler = Handler.__new__(Handler)
+    headers = b'{"timeout": 0.5}'
+
+    # the headers come after the arguments of a method which is not schema based
+    cmd = SimpleNamespace(nr_args=2)
+    request = Request([b"actor.args_in", b"hello", b"1", headers])
+    handler._headers_split(cmd, request)
+    assert request.arguments == [b"hello", b"1"]
+    assert request.deadline == request.received + 0.5
+
+    # a 2nd argument is not taken for the headers
+    request = Request([b"actor.args_in", b"hello", b'{"timeout": 1}'])
+    handler._headers_split(cmd, request)
+    assert request.arguments == [b"hello", b'{"timeout": 1}']
+    assert request.deadline is None
+
+    # after the data of a schema based method
+    cmd = SimpleNamespace(nr_args=1)
+    request = Request([b"actor.schema_in", b"data", headers])
+    handler._headers_split(cmd, request)
+    assert request.arguments == [b"data"]
+    assert request.deadline == request.received + 0.5
+
+
+def test_nr_args():
+    class Actor:
+        def echo(self, input, schema_out=None):
+            pass
+
+        def args(self, *args):
+            pass
+
+    assert _nr_args(Actor().echo) == 1
+    assert _nr_args(Actor().args) is None
+
+
+def test_deadline_check():
+    handler = Handler.__new__(Handler)
+    request = Request([b"actor.ping"])
+    assert handler._deadline_check(request) is None
+
+    request._headers = {"timeout": 10}
+    assert 9 < handler._deadline_check(request) <= 10
+
+    # the timeout starts when the request is received, e.g. it waited behind other pipelined requests
+    request = Request([b"actor.ping"])
+    request._headers = {"timeout": 0.05}
+    time.sleep(0.06)
+    with pytest.raises(DeadlineError):
+        handler._deadline_check(request)
+
+    request._headers = {"timeout": 0}
+    with pytest.raises(DeadlineError):
+        handler._deadline_check(request)
+
+
+def handler_get(connections_max=0, requests_max=0):
+    """
+    :return: Handler of a server without actors, the cmds are added with cmd_add
+    """
+    gedis_server = SimpleNamespace(
+        actors={},
+        cmds_meta={},
+        verify_keys=None,
+        stats=GedisStats(),
+        slowlog=SlowLog(),
+        cursors=GedisCursors(),
+        cache=ResponseCache(),
+        pubsub=PubSub(),
+        ratelimits=RateLimits(),
+        handlers=weakref.WeakSet(),
+        _cpu_pool=None,
+        data=SimpleNamespace(connections_max=connections_max, requests_max=requests_max, compression_min=4096),
+    )
+    return Handler(gedis_server)
+
+
+def cmd_add(handler, name, method, namespace="default"):
+    """
+    :param name: actor.cmd
+    """
+    handler.dispatch[name.encode()] = SimpleNamespace(
+        key="%s.%s" % (namespace, name),
+        namespace=namespace,
+        cache=0,
+        cpu=False,
+        stream=False,
+        schema_in=None,
+        schema_out=None,
+        coroutine=False,
+        method=method,
+        nr_args=None,
+    )
+
+
+class Client:
+    """
+    raw redis connection, the replies are 1 line
+    """
+
+    def __init__(self, port):
+        self.sock = socket.create_connection(("127.0.0.1", port))
+        self.file = self.sock.makefile("rb")
+
+    def send(self, *args):
+        args = [arg if isinstance(arg, bytes) else arg.encode() for arg in args]
+        self.sock.sendall(b"*%d\r\n" % len(args) + b"".join(b"$%d\r\n%s\r\n" % (len(arg), arg) for arg in args))
+
+    def reply(self):
+        return self.file.readline()
+
+    def call(self, *args):
+        self.send(*args)
+        return self.reply()
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def serve(handler):
+        """
+        :return: port of a server handling the connections with handler
+        """
+        server = StreamServer(("127.0.0.1", 0), handler.handle_redis)
+        server.start()
+        servers.append(server)
+        return server.server_port
+
+    yield serve
+    for server in servers:
+        server.stop(timeout=1)
+
+
+def test_dispatch_bounded():
+    class Actor:
+        def echo(self):
+            return "done"
+
+    handler = handler_get()
+    actor = Actor()
+    handler.actors["default__actor"] = actor
+    cmd = SimpleNamespace(namespace="default", cache=0, cpu=False, stream=False, schema_in=None, schema_out=None)
+    handler.cmds_meta["default__actor"] = SimpleNamespace(
+        namespace="default", name="actor", actor=actor, cmds={"echo": cmd}
+    )
+    session = Session()
+
+    names = ["default.actor.echo", "actor.echo"]
+    # spellings resolving to the same cmd, a client can send endless of them
+    names += ["default.junk%s__actor.echo" % nr for nr in range(100)]
+    names += ["DEFAULT.Actor.ECHO", "Actor.Echo", "actor.ECHO"]
+    for name in names:
+        assert handler._handle_request(Request([name.encode()]), ("127.0.0.1", 0), session) == "done"
+    assert handler.dispatch == {b"default.actor.echo": cmd, b"actor.echo": cmd}
+    assert sorted(handler.cmds) == ["default__actor__echo", "system__actor__echo"]
+
+
+def test_batch():
+    def fail():
+        raise ValueError("failed")
+
+    handler = handler_get()
+    cmd_add(handler, "actor.echo", lambda value: value)
+    cmd_add(handler, "actor.fail", fail)
+    calls = j.data.serializers.msgpack.dumps(
+        [["actor.echo", ["a"]], ["actor.echo", [1], {"timeout": 5}], ["actor.fail"]]
+    )
+
+    request = Request([b"system.batch", calls])
+    requests, concurrent = handler._batch_requests_get(request)
+    assert not concurrent
+    assert [(item.name, item.arguments) for item in requests] == [
+        (b"actor.echo", [b"a"]),
+        (b"actor.echo", [b"1"]),
+        (b"actor.fail", []),
+    ]
+    # the timeout of a call starts when the batch is read
+    assert requests[1].deadline == request.received + 5
+
+    for request in [Request([b"system.batch", calls]), Request([b"batch", calls, b"1"])]:
+        results = handler._batch(request, ("127.0.0.1", 0), Session())
+        assert results[:2] == [b"a", b"1"]
+        assert isinstance(results[2], ValueError)
+
+
+@pytest.mark.parametrize("name", ["system.batch", "BATCH", "hello", "auth", "subscribe", "unsubscribe", "ping"])
+def test_batch_predefined(name):
+    handler = handler_get()
+    cmd_add(handler, "actor.echo", lambda value: value)
+    # the predefined cmds act on the connection, the batch is refused as a whole
+    calls = j.data.serializers.msgpack.dumps([["actor.echo", ["a"]], [name, ["3"]]])
+    with pytest.raises(ValueError, match="can't be called in a batch"):
+        handler._batch(Request([b"system.batch", calls]), ("127.0.0.1", 0), Session())
+
+
+class SendCounter:
+    """
+    socket of the server which keeps the size of every write
+    """
+
+    def __init__(self, sock, writes):
+        self._sock = sock
+        self.writes = writes
+
+    def sendall(self, data):
+        self.writes.append(len(data))
+        return self._sock.sendall(data)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+@pytest.mark.parametrize("flush_max,writes_min", [(256, 1), (16, 200 // 16)])
+def test_pipeline_flush(serve, monkeypatch, flush_max, writes_min):
+    monkeypatch.setattr(handlers, "PIPELINE_FLUSH_MAX", flush_max)
+    handler = handler_get()
+    cmd_add(handler, "actor.echo", lambda value: value.decode())
+    writes = []
+    server = StreamServer(
+        ("127.0.0.1", 0), lambda sock, address: handler.handle_redis(SendCounter(sock, writes), address)
+    )
+    server.start()
+    client = Client(server.server_port)
+    # 200 pipelined requests in 1 write
+    client.sock.sendall(b"".join(b"*2\r\n$10\r\nactor.echo\r\n$%d\r\n%d\r\n" % (len(str(i)), i) for i in range(200)))
+    assert [client.reply() for _ in range(200)] == [b"+%d\r\n" % i for i in range(200)]
+    # the replies are flushed when the requests in the read buffer are done, or every flush_max replies
+    assert writes_min <= len(writes) < 200
+    client.close()
+    server.stop(timeout=1)
+
+
+def test_busy_connections_max(serve):
+    handler = handler_get(connections_max=1)
+    cmd_add(handler, "actor.echo", lambda: "done")
+    cmd_add(handler, "system.ping", lambda: "PONG", namespace="system")
+    port = serve(handler)
+    client1 = Client(port)
+    assert client1.call("actor.echo") == b"+done\r\n"
+
+    # over the max, only the system cmds are served (health checks), the others get BUSY & the connection is closed
+    client2 = Client(port)
+    assert client2.call("ping") == b"+PONG\r\n"
+    assert client2.call("system.ping") == b"+PONG\r\n"
+    assert client2.call("actor.echo").startswith(b"-BUSY ")
+    assert client2.reply() == b""
+
+    assert client1.call("actor.echo") == b"+done\r\n"
+    client1.close()
+    client2.close()
+
+
+def test_busy_requests_max(serve):
+    handler = handler_get(requests_max=1)
+    release = Event()
+    cmd_add(handler, "actor.slow", lambda: release.wait() and "done")
+    cmd_add(handler, "actor.echo", lambda: "done")
+    cmd_add(handler, "system.ping", lambda: "PONG", namespace="system")
+    port = serve(handler)
+    client1 = Client(port)
+    client2 = Client(port)
+
+    client1.send("actor.slow")
+    with gevent.Timeout(5):
+        while not handler.requests_active:
+            gevent.sleep(0.01)
+    # max nr of requests in flight, the connection stays open
+    assert client2.call("actor.echo").startswith(b"-BUSY ")
+    assert client2.call("system.ping") == b"+PONG\r\n"
+
+    release.set()
+    assert client1.reply() == b"+done\r\n"
+    assert client2.call("actor.echo") == b"+done\r\n"
+    client1.close()
+    client2.close()
+
+
+def server_get(handler, stop_timeout, unix_socket=None):
+    """
+    :param unix_socket: path the server listens on as well
+    :return: what GedisServer.stop uses of the gedis server, serving with handler
+    """
+    # like GedisServer._serve, the pool is what stop waits for
+    pool = Pool()
+    redis_server = StreamServer(("127.0.0.1", 0), handler.handle_redis, spawn=pool)
+    redis_server.start()
+    unix_server = None
+    if unix_socket:
+        unix_server = StreamServer(unix_listener(unix_socket), handler.handle_redis, spawn=pool)
+        unix_server.start()
+    return SimpleNamespace(
+        _sig_handler=[],
+        _workers_supervisor=None,
+        _async_server=None,
+        _cpu_pool=None,
+        _log_info=lambda msg: None,
+        data=SimpleNamespace(stop_timeout=stop_timeout),
+        handler=handler,
+        unix_server=unix_server,
+        redis_server=redis_server,
+        port=redis_server.server_port,
+    )
+
+
+def test_drain():
+    from DigitalMe.servers.gedis.GedisServer import GedisServer
+
+    handler = handler_get()
+    release = Event()
+    cmd_add(handler, "actor.slow", lambda: release.wait() and "done")
+    cmd_add(handler, "actor.echo", lambda: "done")
+    server = server_get(handler, stop_timeout=5)
+    idle = Client(server.port)
+    assert idle.call("actor.echo") == b"+done\r\n"
+    busy = Client(server.port)
+    busy.send("actor.slow")
+    with gevent.Timeout(5):
+        while not handler.requests_active:
+            gevent.sleep(0.01)
+
+    gevent.spawn_later(0.2, release.set)
+    start = time.monotonic()
+    GedisServer.stop(server)
+    # the running request finished, the server didn't wait for the idle connection
+    assert time.monotonic() - start < 2
+    assert busy.reply() == b"+done\r\n"
+    assert busy.reply() == b""
+    assert idle.reply() == b""
+    assert server.redis_server is None
+    idle.close()
+    busy.close()
+
+
+def test_drain_stop_timeout():
+    from DigitalMe.servers.gedis.GedisServer import GedisServer
+
+    handler = handler_get()
+    cmd_add(handler, "actor.slow", lambda: Event().wait() and "done")
+    server = server_get(handler, stop_timeout=0.3)
+    client = Client(server.port)
+    client.send("actor.slow")
+    with gevent.Timeout(5):
+        while not handler.requests_active:
+            gevent.sleep(0.01)
+
+    start = time.monotonic()
+    GedisServer.stop(server)
+    # the request is killed after stop_timeout, the client gets no reply
+    assert 0.3 <= time.monotonic() - start < 2
+    assert client.reply() == b""
+    client.close()
+
+
+def test_drain_unix_socket(tmp_path):
+    from DigitalMe.servers.gedis.GedisServer import GedisServer
+
+    handler = handler_get()
+    cmd_add(handler, "actor.slow", lambda: Event().wait() and "done")
+    path = str(tmp_path / "gedis.sock")
+    server = server_get(handler, stop_timeout=0.5, unix_socket=path)
+    client = Client(server.port)
+    client.send("actor.slow")
+    unix_client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    unix_client.connect(path)
+    unix_client.sendall(b"*1\r\n$10\r\nactor.slow\r\n")
+    with gevent.Timeout(5):
+        while handler.requests_active < 2:
+            gevent.sleep(0.01)
+
+    start = time.monotonic()
+    stop = gevent.spawn(GedisServer.stop, server)
+    gevent.sleep(0.1)
+    # both listeners are closed right away
+    with pytest.raises(ConnectionRefusedError):
+        socket.create_connection(("127.0.0.1", server.port))
+    stop.join()
+    # 1 stop_timeout for both servers
+    assert 0.5 <= time.monotonic() - start < 0.9
+    assert client.reply() == b""
+    assert unix_client.recv(10) == b""
+    assert server.unix_server is None and server.redis_server is None
+    client.close()
+    unix_client.close()
+
+
+def test_hello_content_type(serve):
+    handler = handler_get()
+    cmd_add(handler, "actor.schema_in", lambda foo: "foo=%s" % foo)
+    cmd = handler.dispatch[b"actor.schema_in"]
+    cmd.schema_in = FakeSchema(foo=("string", str, ""))
+    cmd.decoder = SchemaDecoder(cmd.schema_in)
+    cmd.cmdobj = SimpleNamespace(args=["foo"])
+    cmd.nr_args = 1
+    port = serve(handler)
+    client = Client(port)
+    assert client.call("actor.schema_in", '{"foo": "x"}') == b"+foo=x\r\n"
+
+    # the content type of the connection is used for the requests without headers
+    assert client.call("HELLO", "CONTENT_TYPE", "capnp") == b"*10\r\n"
+    hello = [client.reply() for _ in range(10)]
+    assert hello[4:6] == [b"+content_type\r\n", b"+capnp\r\n"]
+    assert client.call("actor.schema_in", '{"foo": "x"}').startswith(b"-ERR the content is not valid capnp")
+    # the headers of the request overrule it
+    assert client.call("actor.schema_in", '{"foo": "x"}', '{"content_type": "json"}') == b"+foo=x\r\n"
+    client.close()
+
+
+def test_compression_max_size(serve):
+    if "lz4" not in codecs_available():
+        pytest.skip("lz4 is not installed")
+    handler = handler_get()
+    cmd_add(handler, "actor.size", lambda value: str(len(value)))
+    port = serve(handler)
+    client = Client(port)
+    assert client.call("HELLO", "2", "COMPRESSION", "lz4") == b"*10\r\n"
+    [client.reply() for _ in range(10)]
+    compressor = compressor_get("lz4")
+    assert client.call("actor.size", compressor.compress(b"\0" * 10000)) == b"+10000\r\n"
+
+    # an argument of a few 100 KB which decompresses to more than MAX_SIZE gets an error, the connection stays
+    bomb = compressor.compress(b"\0" * (MAX_SIZE + 1))
+    assert len(bomb) < 1024 * 1024
+    assert client.call("actor.size", bomb).startswith(b"-ERR decompressed value is bigger than")
+    assert client.call("actor.size", "x") == b"+1\r\n"
+    client.close()
+
+
+def test_push_timeout(serve, monkeypatch):
+    monkeypatch.setattr(handlers, "PUSH_TIMEOUT", 0.2)
+    handler = handler_get()
+    port = serve(handler)
+    stalled = Client(port)
+    reader = Client(port)
+    for client in (stalled, reader):
+        assert client.call("HELLO", "3") == b"%5\r\n"
+        [client.reply() for _ in range(10)]
+        assert [client.call("SUBSCRIBE", "job.1")] + [client.reply() for _ in range(3)] == [
+            b">3\r\n",
+            b"+subscribe\r\n",
+            b"+job.1\r\n",
+            b":1\r\n",
+        ]
+
+    def read():
+        assert [reader.reply() for _ in range(4)] == [b">3\r\n", b"+message\r\n", b"+job.1\r\n", b"$8000000\r\n"]
+        return len(reader.file.read(8000002))
+
+    # the stalled client doesn't read, the push to it times out & its connection is dropped
+    greenlet = gevent.spawn(read)
+    start = time.monotonic()
+    assert handler.pubsub.publish("job.1", b"x" * 8000000) == 1
+    assert time.monotonic() - start < 1
+    assert greenlet.get(timeout=5) == 8000002
+    assert len(handler.pubsub.channels["job.1"]) == 1
+    stalled.close()
+    reader.close()
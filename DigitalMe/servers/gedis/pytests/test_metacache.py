@@ -0,0 +1,33 @@
+from DigitalMe.servers.gedis.GedisCmds import SCHEMA
+from DigitalMe.servers.gedis.metacache import ActorsMetaCache
+
+
+def test_metacache(tmp_path):
+    actor_path = str(tmp_path / "actor.py")
+    with open(actor_path, "w") as f:
+        f.write("class actor:\n    pass\n")
+    cache = ActorsMetaCache(str(tmp_path / "cache"), SCHEMA)
+
+    content_hash = cache.content_hash(actor_path)
+    assert cache.get(actor_path, "default", content_hash) is None
+    cache.set(actor_path, "default", content_hash, b"data", 2.0)
+    entry = cache.get(actor_path, "default", content_hash)
+    assert entry["data"] == b"data"
+    # other namespace is another entry
+    assert cache.get(actor_path, "system", content_hash) is None
+
+    cache.hit(entry, 0.5)
+    cache.miss(1.0)
+    report = cache.report()
+    assert report["hits"] == 1
+    assert report["misses"] == 1
+    assert report["time_saved"] == 1.5
+
+    # actor changed
+    with open(actor_path, "w") as f:
+        f.write("class actor:\n    x = 1\n")
+    assert cache.get(actor_path, "default", cache.content_hash(actor_path)) is None
+
+    # the api schema changed
+    cache2 = ActorsMetaCache(str(tmp_path / "cache"), SCHEMA + "\nfoo = 1 (I)\n")
+    assert cache2.get(actor_path, "default", content_hash) is None
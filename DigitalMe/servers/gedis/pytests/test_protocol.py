@@ -0,0 +1,98 @@
+import pytest
+from DigitalMe.servers.gedis.protocol import Push, RedisRequestReader, Replies, _encode
+
+
+def test_reader_pipelined():
+    reader = RedisRequestReader()
+    data = b"*1\r\n$4\r\nPING\r\n*3\r\n$15\r\nactor.echo.test\r\n$5\r\nhello\r\n$0\r\n\r\nPING\r\n"
+    assert reader.feed(data) == [[b"PING"], [b"actor.echo.test", b"hello", b""], [b"PING"]]
+    assert not reader.pending
+
+
+def test_reader_partial():
+    reader = RedisRequestReader()
+    data = b"*2\r\n$4\r\necho\r\n$10\r\n0123456789\r\n"
+    requests = []
+    for i in range(len(data)):
+        requests += reader.feed(data[i : i + 1])
+        if i < len(data) - 1:
+            assert reader.pending
+    assert requests == [[b"echo", b"0123456789"]]
+    assert not reader.pending
+
+
+def test_reader_big_bulk():
+    reader = RedisRequestReader()
+    value = b"x" * 100000
+    data = b"*2\r\n$4\r\necho\r\n$%d\r\n%s\r\n" % (len(value), value)
+    assert reader.feed(data[:50000]) == []
+    assert reader.feed(data[50000:90000]) == []
+    assert reader.feed(data[90000:]) == [[b"echo", value]]
+
+
+def test_reader_invalid():
+    reader = RedisRequestReader()
+    with pytest.raises(ValueError):
+        reader.feed(b"*1\r\n:4\r\n")
+
+
+def encode(value, resp3=False):
+    buffer = bytearray()
+    _encode(value, buffer, resp3)
+    return bytes(buffer)
+
+
+def test_encode_resp3():
+    assert encode({"a": 1.5, "b": [True, None]}, resp3=True) == b"%2\r\n+a\r\n,1.5\r\n+b\r\n*2\r\n#t\r\n_\r\n"
+    assert encode({1}, resp3=True) == b"~1\r\n:1\r\n"
+    # RESP2 stays as it was
+    assert encode([True, None, 1.5]) == b"*3\r\n:1\r\n$-1\r\n$3\r\n1.5\r\n"
+
+
+def test_encode_push():
+    value = Replies([Push(["subscribe", "chat.1", 1]), Push(["subscribe", "job.2", 2])])
+    assert encode(value, resp3=True) == b">3\r\n+subscribe\r\n+chat.1\r\n:1\r\n>3\r\n+subscribe\r\n+job.2\r\n:2\r\n"
+
+
+def test_encode_fast_paths():
+    assert encode(b"value") == b"$5\r\nvalue\r\n"
+    assert encode(b"") == b"$0\r\n\r\n"
+    assert encode(42) == b":42\r\n"
+    assert encode(-1) == b":-1\r\n"
+    assert encode("OK") == b"+OK\r\n"
+    # a status reply can't have a newline, it becomes a bulk string
+    assert encode("a\nb") == b"$3\r\na\nb\r\n"
+    assert encode(None) == b"$-1\r\n"
+    assert encode(None, resp3=True) == b"_\r\n"
+
+
+def test_encode_nested():
+    value = [b"a", [1, [b"b", None], []], "c"]
+    assert encode(value) == b"*3\r\n$1\r\na\r\n*3\r\n:1\r\n*2\r\n$1\r\nb\r\n$-1\r\n*0\r\n+c\r\n"
+    assert encode([]) == b"*0\r\n"
+    assert encode(["*REDIS*", b"a"]) == b"*1\r\n$1\r\na\r\n"
+    # deeper than the recursion limit
+    value = []
+    for _ in range(5000):
+        value = [value]
+    assert encode(value) == b"*1\r\n" * 5000 + b"*0\r\n"
+
+
+def test_encode_subclasses():
+    class Code(int):
+        pass
+
+    class Name(str):
+        pass
+
+    assert encode([Code(3), Name("x"), bytearray(b"y"), memoryview(b"z")]) == (
+        b"*4\r\n:3\r\n+x\r\n$1\r\ny\r\n$1\r\nz\r\n"
+    )
+
+
+def test_encode_errors():
+    class BusyError(RuntimeError):
+        code = "BUSY"
+
+    value = [b"ok", RuntimeError("boom\nline 2"), BusyError("too many requests")]
+    assert encode(value) == b"*3\r\n$2\r\nok\r\n-ERR boom line 2\r\n-BUSY too many requests\r\n"
@@ -0,0 +1,34 @@
+from DigitalMe.servers.gedis.handlers import Session
+from DigitalMe.servers.gedis.pubsub import PubSub
+
+
+def test_pubsub():
+    pubsub = PubSub()
+    pushed = []
+    session = Session()
+    session.push = pushed.append
+    assert pubsub.subscribe(session, "chat.1") == 1
+    assert pubsub.subscribe(session, "job.2") == 2
+
+    assert pubsub.publish("chat.1", {"cat": "md_show"}) == 1
+    assert pushed == [["message", "chat.1", {"cat": "md_show"}]]
+    assert pubsub.publish("chat.3", b"nobody") == 0
+
+    assert pubsub.unsubscribe(session, "chat.1") == 1
+    assert pubsub.publish("chat.1", b"gone") == 0
+    pubsub.unsubscribe_all(session)
+    assert pubsub.channels == {}
+    assert session.channels == set()
+
+
+def test_pubsub_closed():
+    def push(message):
+        raise ConnectionError("connection is closed")
+
+    pubsub = PubSub()
+    session = Session()
+    session.push = push
+    pubsub.subscribe(session, "chat.1")
+    assert pubsub.publish("chat.1", b"lost") == 0
+    assert pubsub.channels == {}
+    assert session.channels == set()
@@ -0,0 +1,62 @@
+import pytest
+
+from DigitalMe.servers.gedis import ratelimit
+from DigitalMe.servers.gedis.ratelimit import RateLimitError, RateLimits
+
+
+@pytest.fixture
+def now(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: clock[0])
+    return clock
+
+
+def test_burst_and_rate(now):
+    limits = RateLimits(["default.notary_actor.register 2 3"])
+    for _ in range(3):
+        limits.check("default.notary_actor.register", "10.0.0.1")
+    with pytest.raises(RateLimitError) as e:
+        limits.check("default.notary_actor.register", "10.0.0.1")
+    assert e.value.code == "RATELIMIT"
+    assert e.value.retry_after == pytest.approx(0.5)
+    assert limits.nr_rejected == 1
+
+    # other clients & cmds have their own bucket or no limit
+    limits.check("default.notary_actor.register", "kristof.ibiza")
+    limits.check("default.notary_actor.get", "10.0.0.1")
+
+    now[0] += 0.5
+    limits.check("default.notary_actor.register", "10.0.0.1")
+    with pytest.raises(RateLimitError):
+        limits.check("default.notary_actor.register", "10.0.0.1")
+
+
+def test_most_specific(now):
+    limits = RateLimits(["chatbot 10 20", "chatbot.chatbot.session_new 1"])
+    limits.check("chatbot.chatbot.session_new", "10.0.0.1")
+    with pytest.raises(RateLimitError):
+        limits.check("chatbot.chatbot.session_new", "10.0.0.1")
+    for _ in range(20):
+        limits.check("chatbot.chatbot.session_work_get", "10.0.0.1")
+
+    # without its own limit the cmd shares the bucket of the namespace, which is empty now
+    limits.limit_set("chatbot.chatbot.session_new", 0)
+    with pytest.raises(RateLimitError) as e:
+        limits.check("chatbot.chatbot.session_new", "10.0.0.1")
+    assert "for chatbot" in str(e.value)
+
+
+def test_sweep(now):
+    limits = RateLimits(["default 1 2"])
+    for nr in range(1000):
+        limits.check("default.farmer.farmers_get", "10.0.%s.%s" % (nr // 256, nr % 256))
+    assert len(limits) == 1000
+    # the buckets are full again, the clients are forgotten
+    now[0] += ratelimit.SWEEP_INTERVAL
+    limits.check("default.farmer.farmers_get", "10.0.0.1")
+    assert len(limits) == 1
+
+
+def test_parse():
+    with pytest.raises(ValueError):
+        RateLimits(["default.notary_actor.register"])
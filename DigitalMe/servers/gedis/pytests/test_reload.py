@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+from DigitalMe.servers.gedis import GedisServer as server_module
+from DigitalMe.servers.gedis.GedisServer import GedisServer
+from DigitalMe.servers.gedis.cache import MISS, ResponseCache
+
+
+class FakeHandler:
+    def __init__(self):
+        self.evicted = []
+
+    def actor_evict(self, namespace, actor):
+        self.evicted.append((namespace, actor))
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    # the actor is not parsed, GedisCmds only has to hold the new actor obj
+    monkeypatch.setattr(
+        server_module, "GedisCmds", lambda server, path, name, namespace, reload=False: SimpleNamespace(actor=path)
+    )
+    cache = ResponseCache()
+    cache.set(("default.farmer.farmers_get", (), "auto", "auto"), [b"farmer"], 10)
+    cache.set(("default.notary_actor.get", (b"hash",), "auto", "auto"), b"reservation", 10)
+    cache.set(("system.system.api_meta_get", (b"default",), "auto", "auto"), b"meta", 10)
+    return SimpleNamespace(
+        cmds_meta={"default__farmer": SimpleNamespace(actor="old")},
+        actors={},
+        namespaces=["default"],
+        handlers=[FakeHandler()],
+        cache=cache,
+        _log_info=lambda msg: None,
+        _log_debug=lambda msg, *args: None,
+        path=str(tmp_path / "farmer.py"),
+    )
+
+
+def test_actor_reload(server):
+    cmds_meta = GedisServer.actor_reload(server, server.path)
+
+    assert server.cmds_meta["default__farmer"] is cmds_meta
+    assert server.actors["default__farmer"] == server.path
+    assert server.handlers[0].evicted == [("default", "farmer")]
+    # the results of the actor & the metadata of the actors are gone, the rest stays
+    assert server.cache.get(("default.farmer.farmers_get", (), "auto", "auto")) is MISS
+    assert server.cache.get(("system.system.api_meta_get", (b"default",), "auto", "auto")) is MISS
+    assert server.cache.get(("default.notary_actor.get", (b"hash",), "auto", "auto")) == b"reservation"
+
+
+def test_actor_reload_unknown(server):
+    with pytest.raises(Exception):
+        GedisServer.actor_reload(server, server.path.replace("farmer", "unknown"))
+
+
+def test_actor_add(server):
+    path = server.path.replace("farmer", "dns")
+    with open(path, "w") as f:
+        f.write("class dns:\n    pass\n")
+    GedisServer.actor_add(server, path)
+
+    assert "default__dns" in server.cmds_meta
+    assert server.cache.get(("system.system.api_meta_get", (b"default",), "auto", "auto")) is MISS
+    assert server.cache.get(("default.farmer.farmers_get", (), "auto", "auto")) == [b"farmer"]
@@ -70,6 +70,29 @@ class TestSimpleEcho:
 
         assert b"hello 1" == client.actors.actor.args_in("hello", 1)
 
+    def test_cpu_bound(self):
+        client = self.server.client_get()
+        # executed in a worker process of the server
+        assert 6765 == client.actors.actor.fibonacci(20)
+
+    def test_stream(self):
+        client = self.server.client_get()
+        # more items than fit in 1 chunk
+        assert list(client.actors.actor.numbers(250)) == list(range(250))
+        assert list(client.actors.actor.numbers(0)) == []
+
+    def test_batch(self):
+        client = self.server.client_get()
+        for concurrent in [False, True]:
+            with client.batch(concurrent=concurrent):
+                echo = client.actors.actor.echo("test")
+                error = client.actors.actor.raise_error()
+                ping = client.actors.actor.ping()
+            assert echo.result() == b"test"
+            assert ping.result() == b"pong"
+            with pytest.raises(redis.exceptions.ResponseError):
+                error.result()
+
     def test_error(self):
         client = self.server.client_get()
 
@@ -80,6 +103,43 @@ class TestSimpleEcho:
         assert client.ping()
 
 
+class TestAsyncio:
+    def setup(self):
+        self.server = j.servers.gedis.configure(name="test_asyncio", port=8890, host="0.0.0.0", ssl=False, password="")
+        self.server.backend = "asyncio"
+        actor_path = os.path.join(os.path.dirname(__file__), "actors/actor.py")
+        self.server.actor_add(actor_path)
+        self.proc = Process(target=self.server.start, args=())
+        self.proc.start()
+        wait_start_server("127.0.0.1", 8890)
+
+    def teardown(self):
+        self.proc.terminate()
+        self.proc.join()
+
+    def test_echo(self):
+        client = self.server.client_get()
+        assert b"pong" == client.actors.actor.ping()
+        # executed in the thread pool
+        assert b"test" == client.actors.actor.echo("test")
+        # awaited in the event loop
+        assert b"test" == client.actors.actor.echo_async("test")
+
+    def test_schema_in_out(self):
+        client = self.server.client_get()
+        x = j.data.schema.get_from_url_latest(url="gedis.test.in").new()
+        x.foo = "test"
+        result = client.actors.actor.schema_in_out(x)
+        assert result.bar == x.foo
+
+    def test_pipeline(self):
+        r = redis.Redis(port=8890)
+        pipe = r.pipeline(transaction=False)
+        for i in range(500):
+            pipe.execute_command("actor.echo_async", str(i))
+        assert pipe.execute() == [str(i).encode() for i in range(500)]
+
+
 def wait_start_server(addr, port):
     j.tools.timer.execute_until(
         lambda: j.sal.nettools.tcpPortConnectionTest(addr, port, timeout=1), timeout=5, interval=0.2
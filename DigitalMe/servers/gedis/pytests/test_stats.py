@@ -0,0 +1,54 @@
+from DigitalMe.servers.gedis.stats import GedisStats, SlowLog
+
+
+def test_stats_record():
+    stats = GedisStats()
+    for _ in range(98):
+        stats.record("default.actor.echo", 0.0003, 10, 20)
+    stats.record("default.actor.echo", 0.2, 10, 20)
+    stats.record("default.actor.echo", 20, 10, 0, error=True)
+
+    snapshot = stats.snapshot()["default.actor.echo"]
+    assert snapshot["count"] == 100
+    assert snapshot["errors"] == 1
+    assert snapshot["bytes_in"] == 1000
+    assert snapshot["bytes_out"] == 1980
+    assert snapshot["p50"] == 0.0005
+    assert snapshot["p99"] == 0.25
+    assert snapshot["buckets"]["+Inf"] == 1
+
+
+def test_stats_prometheus():
+    stats = GedisStats()
+    stats.record("default.actor.echo", 0.0003, 10, 20)
+    text = stats.prometheus()
+    assert 'gedis_requests_total{cmd="default.actor.echo"} 1' in text
+    assert 'gedis_request_duration_seconds_bucket{cmd="default.actor.echo",le="0.00025"} 0' in text
+    assert 'gedis_request_duration_seconds_bucket{cmd="default.actor.echo",le="0.0005"} 1' in text
+    assert 'gedis_request_duration_seconds_count{cmd="default.actor.echo"} 1' in text
+
+    stats.reset()
+    assert stats.snapshot() == {}
+
+
+def test_slowlog():
+    slowlog = SlowLog(slower_than=1000, max_len=2)
+    slowlog.record(0.0005, "default.actor.echo", 10, ("127.0.0.1", 1234))
+    assert len(slowlog) == 0
+
+    slowlog.record(0.002, "default.actor.echo", 10, ("127.0.0.1", 1234), decode=0.0005, execute=0.001)
+    slowlog.record(0.003, "default.actor.foo", 10, ("127.0.0.1", 1234))
+    slowlog.record(0.004, "default.actor.bar", 10, ("127.0.0.1", 1234))
+    entries = slowlog.get()
+    assert [entry["command"] for entry in entries] == ["default.actor.bar", "default.actor.foo"]
+    assert entries[0]["id"] == 3
+    assert entries[0]["client"] == "127.0.0.1:1234"
+    assert entries[0]["encode"] is None
+
+    slowlog.reset()
+    assert slowlog.get() == []
+
+    # negative disables the log
+    slowlog = SlowLog(slower_than=-1)
+    slowlog.record(100, "default.actor.echo", 10, ("127.0.0.1", 1234))
+    assert len(slowlog) == 0
@@ -0,0 +1,86 @@
+import os
+import socket
+import stat
+import time
+
+import gevent
+import pytest
+
+from DigitalMe.servers.gedis import GedisWorkers as workers
+from DigitalMe.servers.gedis.GedisWorkers import GedisWorkers, reuseport_listener, unix_listener
+
+
+def test_reuseport_listener():
+    sock1 = reuseport_listener(("127.0.0.1", 0))
+    port = sock1.getsockname()[1]
+    # a 2nd worker binds the same port
+    sock2 = reuseport_listener(("127.0.0.1", port))
+    try:
+        client = socket.create_connection(("127.0.0.1", port), timeout=5)
+        client.close()
+    finally:
+        sock1.close()
+        sock2.close()
+
+
+def test_unix_listener(tmp_path, monkeypatch):
+    path = str(tmp_path / "run" / "gedis.sock")
+    sock = unix_listener(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o660
+    # a server is listening on it
+    with pytest.raises(RuntimeError):
+        unix_listener(path)
+
+    # socket file of a server which is gone
+    sock.close()
+    sock = unix_listener(path)
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(path)
+    client.close()
+    sock.close()
+
+    # not a socket
+    path = str(tmp_path / "gedis.txt")
+    open(path, "w").close()
+    with pytest.raises(RuntimeError):
+        unix_listener(path)
+    assert os.path.exists(path)
+
+    # in the current dir
+    monkeypatch.chdir(str(tmp_path))
+    unix_listener("gedis.sock").close()
+    assert stat.S_ISSOCK(os.stat(str(tmp_path / "gedis.sock")).st_mode)
+
+
+def test_workers_restart_and_stop(tmp_path, monkeypatch):
+    monkeypatch.setattr(workers, "POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(workers, "RESTART_DELAY", 0)
+    path = str(tmp_path)
+
+    def serve(nr):
+        # a worker leaves a file per start, the 1st start of worker 0 dies
+        nr_start = len([name for name in os.listdir(path) if name.startswith("%s_" % nr)])
+        open(os.path.join(path, "%s_%s" % (nr, os.getpid())), "w").close()
+        if nr == 0 and nr_start == 0:
+            os._exit(1)
+        while True:
+            time.sleep(0.01)
+
+    supervisor = GedisWorkers(serve, size=2)
+    greenlet = gevent.spawn(supervisor.start)
+    with gevent.Timeout(10):
+        while len(os.listdir(path)) < 3 or len(supervisor.pids) < 2:
+            gevent.sleep(0.01)
+    assert sorted(name.split("_")[0] for name in os.listdir(path)) == ["0", "0", "1"]
+    pids = list(supervisor.pids)
+
+    supervisor.stop(timeout=5)
+    greenlet.join(timeout=5)
+    assert greenlet.dead
+    assert supervisor.pids == {}
+    for pid in pids:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            continue
+        raise AssertionError("worker %s still running" % pid)
@@ -0,0 +1,121 @@
+import time
+
+# nr of seconds between 2 sweeps of the clients whose bucket is full again
+SWEEP_INTERVAL = 10
+
+# rounding errors of adding up the intervals don't reject a request
+EPSILON = 1e-9
+
+
+class RateLimitError(RuntimeError):
+    """
+    the client made too many requests, sent to the client as -RATELIMIT retry after <sec> ...
+    """
+
+    code = "RATELIMIT"
+
+    def __init__(self, retry_after, key):
+        RuntimeError.__init__(self, "retry after %.3f sec, too many requests for %s" % (retry_after, key))
+        self.retry_after = retry_after
+
+
+class RateLimits:
+    """
+    token buckets limiting the nr of requests of 1 client (authenticated dm_id or ip address),
+    per namespace, actor or cmd, the most specific limit is used
+
+        limits = RateLimits(["default.notary_actor.register 1 5", "chatbot 10 20"])
+
+    is max 1 register per sec with bursts of 5, max 10 requests per sec to the chatbot namespace with bursts of 20
+
+    the bucket of a client is 1 float: the time its bucket is full again (GCRA),
+    a client whose bucket is full is not kept, the table is swept every SWEEP_INTERVAL sec
+    """
+
+    def __init__(self, limits=None):
+        """
+        :param limits: list of "<namespace>[.<actor>[.<cmd>]] <requests/sec> [<burst>]"
+        """
+        self.limits = {}  # namespace[.actor[.cmd]] -> (rate, burst)
+        self._resolved = {}  # cmd key -> (limit key, interval, tolerance), None when not limited
+        self._table = {}  # (limit key, client) -> time the bucket of the client is full again
+        self._sweep_next = 0
+        self.nr_rejected = 0
+        for line in limits or []:
+            self.limit_set(*_limit_parse(line))
+
+    def limit_set(self, key, rate, burst=1):
+        """
+        :param key: namespace, namespace.actor or namespace.actor.cmd
+        :param rate: nr of requests per sec, 0 removes the limit
+        :param burst: nr of requests a client can do at once after being idle
+        """
+        key = key.lower()
+        if rate:
+            self.limits[key] = (float(rate), max(1, int(burst)))
+        else:
+            self.limits.pop(key, None)
+        self._resolved = {}
+
+    def check(self, cmd_key, client):
+        """
+        take a token of the bucket of the client
+        :param cmd_key: namespace.actor.cmd
+        :param client: dm_id or ip address
+        :raises: RateLimitError when the bucket is empty
+        """
+        limit = self._resolved.get(cmd_key, False)
+        if limit is False:
+            limit = self._resolved[cmd_key] = self._limit_get(cmd_key)
+        if limit is None:
+            return
+        limit_key, interval, tolerance = limit
+
+        now = time.monotonic()
+        if now >= self._sweep_next:
+            self._sweep(now)
+        key = (limit_key, client)
+        full = self._table.get(key, now)
+        if full < now:
+            full = now
+        wait = full - tolerance - now
+        if wait > EPSILON:
+            self.nr_rejected += 1
+            raise RateLimitError(wait, limit_key)
+        self._table[key] = full + interval
+
+    def _limit_get(self, cmd_key):
+        """
+        :return: (limit key, interval, tolerance) of the most specific limit of the cmd, None if there is none
+        """
+        parts = cmd_key.lower().split(".")
+        for nr in range(len(parts), 0, -1):
+            limit_key = ".".join(parts[:nr])
+            if limit_key in self.limits:
+                rate, burst = self.limits[limit_key]
+                interval = 1.0 / rate
+                return limit_key, interval, (burst - 1) * interval
+        return None
+
+    def _sweep(self, now):
+        self._sweep_next = now + SWEEP_INTERVAL
+        for key, full in list(self._table.items()):
+            if full <= now:
+                del self._table[key]
+
+    def __len__(self):
+        return len(self._table)
+
+
+def _limit_parse(line):
+    """
+    :param line: "<namespace>[.<actor>[.<cmd>]] <requests/sec> [<burst>]"
+    :return: (key, rate, burst)
+    """
+    parts = line.split()
+    if len(parts) not in (2, 3):
+        raise ValueError("rate limit should be '<namespace>[.<actor>[.<cmd>]] <requests/sec> [<burst>]', not %r" % line)
+    key = parts[0]
+    rate = float(parts[1])
+    burst = int(parts[2]) if len(parts) == 3 else 1
+    return key, rate, burst
@@ -0,0 +1,201 @@
+import time
+from bisect import bisect_left
+from collections import deque
+
+# upper bounds (in seconds) of the latency buckets, the last bucket is for everything slower
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class CmdStats:
+    """
+    counters of 1 cmd, all preallocated so recording a request allocates nothing
+    """
+
+    __slots__ = ("count", "errors", "bytes_in", "bytes_out", "duration", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.duration = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, duration, bytes_in, bytes_out, error):
+        self.count += 1
+        if error:
+            self.errors += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.duration += duration
+        self.buckets[bisect_left(LATENCY_BUCKETS, duration)] += 1
+
+    def percentile(self, fraction):
+        """
+        :return: upper bound of the bucket holding the percentile, None if slower than the last bucket
+        """
+        rank = fraction * self.count
+        seen = 0
+        for index, nr in enumerate(self.buckets):
+            seen += nr
+            if nr and seen >= rank:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else None
+        return 0.0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "duration": self.duration,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], self.buckets)),
+        }
+
+
+class GedisStats:
+    """
+    throughput & latency statistics per cmd (namespace.actor.cmd) of a gedis server
+    """
+
+    def __init__(self):
+        self.cmds = {}  # namespace.actor.cmd -> CmdStats
+
+    def record(self, key, duration, bytes_in, bytes_out, error=False):
+        """
+        :param key: namespace.actor.cmd
+        :param duration: nr of seconds the request took
+        :param bytes_in: size of the request
+        :param bytes_out: size of the reply
+        :param error: True if the request failed
+        """
+        stats = self.cmds.get(key)
+        if stats is None:
+            stats = self.cmds[key] = CmdStats()
+        stats.record(duration, bytes_in, bytes_out, error)
+
+    def reset(self):
+        self.cmds = {}
+
+    def snapshot(self):
+        """
+        :return: dict namespace.actor.cmd -> dict with the counters
+        """
+        return {key: stats.to_dict() for key, stats in sorted(self.cmds.items())}
+
+    def prometheus(self, prefix="gedis"):
+        """
+        :return: the statistics in the prometheus text exposition format
+        """
+        lines = []
+        counters = [
+            ("requests_total", "count", "nr of requests"),
+            ("errors_total", "errors", "nr of requests which failed"),
+            ("received_bytes_total", "bytes_in", "nr of bytes received"),
+            ("sent_bytes_total", "bytes_out", "nr of bytes sent"),
+        ]
+        items = sorted(self.cmds.items())
+        for name, attr, description in counters:
+            lines.append("# HELP %s_%s %s" % (prefix, name, description))
+            lines.append("# TYPE %s_%s counter" % (prefix, name))
+            for key, stats in items:
+                lines.append('%s_%s{cmd="%s"} %s' % (prefix, name, key, getattr(stats, attr)))
+
+        name = "%s_request_duration_seconds" % prefix
+        lines.append("# HELP %s latency of the requests" % name)
+        lines.append("# TYPE %s histogram" % name)
+        for key, stats in items:
+            cumulative = 0
+            for bound, nr in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += nr
+                lines.append('%s_bucket{cmd="%s",le="%s"} %s' % (name, key, bound, cumulative))
+            lines.append('%s_bucket{cmd="%s",le="+Inf"} %s' % (name, key, stats.count))
+            lines.append('%s_sum{cmd="%s"} %s' % (name, key, stats.duration))
+            lines.append('%s_count{cmd="%s"} %s' % (name, key, stats.count))
+        return "\n".join(lines) + "\n"
+
+
+class SlowLog:
+    """
+    like the redis SLOWLOG, keeps the last requests which took longer than slower_than
+    """
+
+    def __init__(self, slower_than=100000, max_len=128):
+        """
+        :param slower_than: in microseconds, requests taking longer are logged, negative disables the log
+        :param max_len: max nr of entries, the oldest ones are dropped first
+        """
+        self.slower_than = slower_than / 1000000 if slower_than >= 0 else None
+        self.entries = deque(maxlen=max_len)
+        self._id = 0
+
+    def is_slow(self, duration):
+        """
+        :return: True if a request taking duration seconds needs to be logged
+        """
+        return self.slower_than is not None and duration >= self.slower_than
+
+    def record(self, duration, command, args_size, address, decode=None, execute=None):
+        """
+        :param duration: nr of seconds the request took
+        :param command: name of the command
+        :param args_size: nr of bytes of the arguments
+        :param address: (ip, port) of the client
+        :param decode: nr of seconds spent decoding the arguments
+        :param execute: nr of seconds spent in the method of the actor
+        """
+        if not self.is_slow(duration):
+            return
+        self._id += 1
+        self.entries.append((self._id, time.time(), duration, command, args_size, address, decode, execute))
+
+    def get(self, nr=10):
+        """
+        :return: list of the last nr entries, newest first
+        """
+        res = []
+        for entry in list(reversed(self.entries))[:nr]:
+            id, timestamp, duration, command, args_size, address, decode, execute = entry
+            if decode is not None and execute is not None:
+                encode = duration - decode - execute
+            else:
+                encode = None
+            res.append(
+                {
+                    "id": id,
+                    "timestamp": timestamp,
+                    "duration": duration,
+                    "command": command,
+                    "args_size": args_size,
+                    "client": "%s:%s" % tuple(address[:2]),
+                    "decode": decode,
+                    "execute": execute,
+                    "encode": encode,
+                }
+            )
+        return res
+
+    def reset(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
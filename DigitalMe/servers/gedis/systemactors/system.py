@@ -29,6 +29,9 @@ class system(JSBASE):
         """
         return the api meta information
 
+        ```gedis
+        cache = 300
+        ```
         """
         namespace = namespace.decode()
         res = {"cmds": {}}
@@ -37,6 +40,55 @@ class system(JSBASE):
                 res["cmds"][key] = item.data._data
         return j.data.serializers.msgpack.dumps(res)
 
+    def cursor_next(self, cursor_id, chunk_size=0):
+        """
+        return the next chunk of a streamed result as [cursor_id, [items]]
+        cursor_id is "0" when all items are sent
+        """
+        return self.server.cursors.next(cursor_id.decode(), chunk_size=int(chunk_size))
+
+    def cursor_close(self, cursor_id):
+        """
+        stop a streamed result before all its items are sent
+        """
+        return self.server.cursors.close(cursor_id.decode())
+
+    def cache_invalidate(self, namespace="", actor="", cmd=""):
+        """
+        remove cached results, all of them if no namespace, actor or cmd given
+        :return: nr of results removed
+        """
+        namespace, actor, cmd = [item.decode() if item else None for item in [namespace, actor, cmd]]
+        return self.server.cache.invalidate(namespace=namespace, actor=actor, cmd=cmd)
+
+    def stats(self):
+        """
+        return the statistics per cmd (namespace.actor.cmd) as json
+        count, errors, bytes_in, bytes_out, duration (total), p50, p99 & the latency histogram
+        """
+        return j.data.serializers.json.dumps(self.server.stats.snapshot())
+
+    def stats_prometheus(self):
+        """
+        return the statistics per cmd in the prometheus text format
+        """
+        return self.server.stats.prometheus()
+
+    def stats_reset(self):
+        self.server.stats.reset()
+        return True
+
+    def slowlog_get(self, nr=10):
+        """
+        return the last nr requests which were slower than slowlog_slower_than (server config) as json
+        newest first, with the nr of seconds spent in decode, execute & encode
+        """
+        return j.data.serializers.json.dumps(self.server.slowlog.get(nr=int(nr)))
+
+    def slowlog_reset(self):
+        self.server.slowlog.reset()
+        return True
+
     def filemonitor_paths(self, schema_out):
         """
         return all paths which should be monitored for file changes
@@ -61,7 +113,7 @@ class system(JSBASE):
 
         return r
 
-    def filemonitor_event(self, changeobj):
+    def filemonitor_event(self, src_path, event_type, is_directory):
         """
         used by filemonitor daemon to escalate events which happened on filesystem
 
@@ -74,8 +126,8 @@ class system(JSBASE):
         """
 
         # Check if a blueprint is changed
-        # if changeobj.is_directory:
-        #     path_parts = changeobj.src_path.split('/')
+        # if is_directory:
+        #     path_parts = src_path.split('/')
         #     if path_parts[-2] == 'blueprints':
         #         blueprint_name = "{}_blueprint".format(path_parts[-1])
         #         bp = j.servers.web.latest.app.app.blueprints.get(blueprint_name)
@@ -86,34 +138,19 @@ class system(JSBASE):
         #             return
 
         # Check if docsite is changed
-        if changeobj.is_directory:
+        if is_directory:
             docsites = j.tools.docsites.docsites
             for _, docsite in docsites.items():
-                if docsite.path in changeobj.src_path:
+                if docsite.path in src_path:
                     docsite.load()
                     self._log_info("reloading docsite: {}".format(docsite))
                     return
 
-        # check if path is actor if yes, reload that one
-        if not changeobj.is_directory and changeobj.src_path.endswith(".py"):
-            paths = list()
-            paths.append(j.servers.gedis.latest.code_generated_dir)
-            paths.append(j.servers.gedis.latest.app_dir + "/actors")
-            paths.append("%s/systemactors" % j.servers.gedis.path)
-            # now check if path is in docsites, if yes then reload that docsite only !
-            for path in paths:
-                if path in changeobj.src_path:
-                    actor_name = j.sal.fs.getBaseName(changeobj.src_path)[:-3].lower()
-                    namespace = j.servers.gedis.latest.instance + "." + actor_name
-                    if namespace in j.servers.gedis.latest.cmds_meta:
-                        del j.servers.gedis.latest.cmds_meta[namespace]
-                        del j.servers.gedis.latest.actors[namespace]
-                        for cmd in list(j.servers.gedis.latest.cmds.keys()):
-                            if actor_name in cmd:
-                                del j.servers.gedis.latest.cmds[cmd]
-                        j.servers.gedis.latest.cmds_add(namespace, path=changeobj.src_path)
-                        self._log_info("reloading namespace: {}".format(namespace))
-                        return
+        # check if path is an actor which is loaded, if yes reload that one only
+        if not is_directory and src_path.endswith(".py") and j.sal.fs.exists(src_path):
+            namespace = self.server.actor_find(src_path)
+            if namespace is not None:
+                self.server.actor_reload(src_path, namespace=namespace)
 
         return
 
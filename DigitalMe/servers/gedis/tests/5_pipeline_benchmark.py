@@ -0,0 +1,60 @@
+import time
+
+from Jumpscale import j
+
+serverscript = """
+
+gedis = j.servers.gedis.configure(name="bench", port=8887, host="127.0.0.1", ssl=False, password="")
+gedis.save()
+gedis.start()
+
+"""
+
+
+def main(self):
+    """
+    measures the nr of cmds/sec the gedis server handles for different pipeline depths
+
+    kosmos 'j.servers.gedis.test("pipeline_benchmark")'
+    """
+
+    cmd = j.tools.startupcmd.get(
+        "gedis_bench",
+        serverscript,
+        cmd_stop="",
+        path="/tmp",
+        timeout=30,
+        env={},
+        ports=[8887],
+        process_strings=[],
+        interpreter="jumpscale",
+        daemon=True,
+    )
+    cmd.start(foreground=False)
+
+    res = j.sal.nettools.waitConnectionTest("localhost", 8887, timeoutTotal=30)
+    if res == False:
+        raise RuntimeError("Could not start gedis server on port:%s" % 8887)
+
+    redis = j.clients.redis.get(ipaddr="127.0.0.1", port=8887, ping=False, fromcache=False)
+
+    nr_cmds = 20000
+    results = {}
+    try:
+        for depth in [1, 16, 256]:
+            start = time.time()
+            for _ in range(nr_cmds // depth):
+                if depth == 1:
+                    assert redis.execute_command("system.ping") == b"PONG"
+                    continue
+                pipe = redis.pipeline(transaction=False)
+                for _ in range(depth):
+                    pipe.execute_command("system.ping")
+                assert pipe.execute() == [b"PONG"] * depth
+            duration = time.time() - start
+            results[depth] = (nr_cmds // depth) * depth / duration
+            print("[*] pipeline depth %4d: %10.0f cmds/sec" % (depth, results[depth]))
+    finally:
+        cmd.stop()
+
+    return results
@@ -0,0 +1,73 @@
+import os
+import time
+
+from Jumpscale import j
+
+serverscript = """
+
+gedis = j.servers.gedis.configure(name="bench_{backend}", port={port}, host="127.0.0.1", ssl=False, password="")
+gedis.backend = "{backend}"
+gedis.actor_add("{actor_path}")
+gedis.save()
+gedis.start()
+
+"""
+
+PORTS = {"gevent": 8887, "asyncio": 8886}
+
+
+def main(self):
+    """
+    compares the nr of cmds/sec of the gevent & the asyncio backend of the gedis server
+
+    kosmos 'j.servers.gedis.test("asyncio_benchmark")'
+    """
+    actor_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pytests", "actors", "actor.py")
+
+    cmds = []
+    for backend, port in PORTS.items():
+        cmd = j.tools.startupcmd.get(
+            "gedis_bench_%s" % backend,
+            serverscript.format(backend=backend, port=port, actor_path=actor_path),
+            cmd_stop="",
+            path="/tmp",
+            timeout=30,
+            env={},
+            ports=[port],
+            process_strings=[],
+            interpreter="jumpscale",
+            daemon=True,
+        )
+        cmd.start(foreground=False)
+        cmds.append(cmd)
+
+    nr_cmds = 20000
+    results = {}
+    try:
+        for backend, port in PORTS.items():
+            res = j.sal.nettools.waitConnectionTest("localhost", port, timeoutTotal=30)
+            if res == False:
+                raise RuntimeError("Could not start gedis server on port:%s" % port)
+
+            redis = j.clients.redis.get(ipaddr="127.0.0.1", port=port, ping=False, fromcache=False)
+            # ping is answered by the server itself, actor.echo goes through the thread pool of the asyncio backend
+            for name in ["system.ping", "actor.echo"]:
+                args = [name] if name == "system.ping" else [name, "hello"]
+                for depth in [1, 16, 256]:
+                    start = time.time()
+                    for _ in range(nr_cmds // depth):
+                        pipe = redis.pipeline(transaction=False)
+                        for _ in range(depth):
+                            pipe.execute_command(*args)
+                        pipe.execute()
+                    duration = time.time() - start
+                    results[(backend, name, depth)] = (nr_cmds // depth) * depth / duration
+                    print(
+                        "[*] %-7s %-11s pipeline depth %4d: %10.0f cmds/sec"
+                        % (backend, name, depth, results[(backend, name, depth)])
+                    )
+    finally:
+        for cmd in cmds:
+            cmd.stop()
+
+    return results
@@ -0,0 +1,84 @@
+import time
+
+from Jumpscale import j
+
+from DigitalMe.servers.gedis.compression import codecs_available, compressor_get, decompress
+
+
+def node_get(nr):
+    """
+    a node like the farmer actor returns them (threefold.grid.node)
+    """
+    return {
+        "node_zos_id": "%012x" % (nr * 7919),
+        "node_zerotier_id": "%010x" % (nr * 104729),
+        "node_public_ip": "185.69.%s.%s" % (nr % 255, (nr * 3) % 255),
+        "description": "",
+        "macaddresses": ["0c:c4:7a:%02x:%02x:%02x" % (nr % 255, (nr * 5) % 255, (nr * 11) % 255)],
+        "noderobot": True,
+        "noderobot_up_last": 1553000000 + nr,
+        "noderobot_ipaddr": "10.102.%s.%s" % (nr % 255, (nr * 7) % 255),
+        "sysadmin": True,
+        "sysadmin_up_ping": True,
+        "sysadmin_up_zos": True,
+        "sysadmin_up_last": 1553000000 + nr,
+        "sysadmin_ipaddr": "10.103.%s.%s" % (nr % 255, (nr * 13) % 255),
+        "tfdir_found": True,
+        "tfdir_up_last": 1553000000 + nr,
+        "tfgrid_up_ping": True,
+        "tfgrid_up_last": 1553000000 + nr,
+        "state": "OK",
+        "error": "",
+        "farmer_id": nr % 40,
+        "farmer": False,
+        "location": {
+            "country": "Belgium",
+            "city": "Lochristi",
+            "continent": "Europe",
+            "latitude": 51.1,
+            "longitude": 3.8,
+        },
+        "capacity_total": {"cru": 24, "mru": 256, "hru": 8000, "sru": 1000},
+        "capacity_used": {"cru": nr % 24, "mru": (nr * 8) % 256, "hru": 0, "sru": (nr * 40) % 1000},
+    }
+
+
+def main(self):
+    """
+    bytes saved & cpu spent by the compression of node_find replies of 10, 100 & 1000 nodes
+
+    kosmos 'j.servers.gedis.test("compression_benchmark")'
+    """
+    codecs = codecs_available()
+    if not codecs:
+        raise RuntimeError("no compression codec installed, pip3 install lz4 zstandard")
+
+    results = {}
+    for nr_nodes in [10, 100, 1000]:
+        payload = j.data.serializers.json.dumps({"res": [node_get(nr) for nr in range(nr_nodes)]}).encode()
+        for name in codecs:
+            compressor = compressor_get(name, min_size=0)
+            nr = max(10, 1000 // nr_nodes)
+            start = time.time()
+            for _ in range(nr):
+                compressed = compressor.compress(payload)
+            time_compress = (time.time() - start) / nr
+            start = time.time()
+            for _ in range(nr):
+                decompress(compressed)
+            time_decompress = (time.time() - start) / nr
+            results[(nr_nodes, name)] = (len(payload), len(compressed), time_compress, time_decompress)
+            print(
+                "[*] %4d nodes %-4s %8d -> %7d bytes (%3.0f%% saved)  compress %7.3f ms  decompress %7.3f ms"
+                % (
+                    nr_nodes,
+                    name,
+                    len(payload),
+                    len(compressed),
+                    100 - 100.0 * len(compressed) / len(payload),
+                    time_compress * 1000,
+                    time_decompress * 1000,
+                )
+            )
+
+    return results
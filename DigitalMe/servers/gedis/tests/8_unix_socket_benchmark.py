@@ -0,0 +1,83 @@
+import os
+import time
+
+from Jumpscale import j
+
+serverscript = """
+
+gedis = j.servers.gedis.configure(name="bench_unix", port=8885, host="127.0.0.1", ssl=False, password="")
+gedis.unix_socket = "{unix_socket}"
+gedis.actor_add("{actor_path}")
+gedis.save()
+gedis.start()
+
+"""
+
+
+def percentile(durations, pct):
+    return durations[min(len(durations) - 1, int(len(durations) * pct / 100))]
+
+
+def main(self):
+    """
+    compares the latency of 1 request over tcp loopback & the unix socket of the gedis server
+
+    kosmos 'j.servers.gedis.test("unix_socket_benchmark")'
+    """
+    actor_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pytests", "actors", "actor.py")
+    unix_socket = j.sal.fs.joinPaths(j.dirs.VARDIR, "sockets", "gedis_bench_unix.sock")
+
+    cmd = j.tools.startupcmd.get(
+        "gedis_bench_unix",
+        serverscript.format(unix_socket=unix_socket, actor_path=actor_path),
+        cmd_stop="",
+        path="/tmp",
+        timeout=30,
+        env={},
+        ports=[8885],
+        process_strings=[],
+        interpreter="jumpscale",
+        daemon=True,
+    )
+    cmd.start(foreground=False)
+
+    nr_cmds = 20000
+    results = {}
+    try:
+        res = j.sal.nettools.waitConnectionTest("localhost", 8885, timeoutTotal=30)
+        if res == False:
+            raise RuntimeError("Could not start gedis server on port:%s" % 8885)
+
+        clients = {
+            "tcp": j.clients.redis.get(ipaddr="127.0.0.1", port=8885, ping=False, fromcache=False),
+            "unix": j.clients.redis.get(unixsocket=unix_socket, ping=False, fromcache=False),
+        }
+        for name in ["system.ping", "actor.echo"]:
+            args = [name] if name == "system.ping" else [name, "hello"]
+            for transport, redis in clients.items():
+                redis.execute_command(*args)
+                durations = []
+                for _ in range(nr_cmds):
+                    start = time.perf_counter()
+                    redis.execute_command(*args)
+                    durations.append(time.perf_counter() - start)
+                durations.sort()
+                results[(transport, name)] = {
+                    "p50": percentile(durations, 50),
+                    "p99": percentile(durations, 99),
+                    "cmds_sec": nr_cmds / sum(durations),
+                }
+                print(
+                    "[*] %-4s %-11s p50 %6.1f us  p99 %6.1f us  %8.0f cmds/sec"
+                    % (
+                        transport,
+                        name,
+                        results[(transport, name)]["p50"] * 1000000,
+                        results[(transport, name)]["p99"] * 1000000,
+                        results[(transport, name)]["cmds_sec"],
+                    )
+                )
+    finally:
+        cmd.stop()
+
+    return results
@@ -21,15 +21,19 @@ class order_book(JSBASE):
     def __init__(self):
         JSBASE.__init__(self)
 
-        if not hasattr(j.servers.gedis.latest, "context"):
-            j.servers.gedis.latest.context = {
-                "wallets": {},
-                "sell_orders": {},
-                "buy_orders": {},
-                "transactions": [],
-                "matcher": Matcher(),
-                "trader": Trader(),
-            }
+        # with more than 1 gedis worker the context needs to be shared, see context_factory of the gedis server
+        context = j.servers.gedis.latest.context
+        if not context:
+            context.update(
+                {
+                    "wallets": {},
+                    "sell_orders": {},
+                    "buy_orders": {},
+                    "transactions": [],
+                    "matcher": Matcher(),
+                    "trader": Trader(),
+                }
+            )
 
         self.orderbook = OrderBook()
 
@@ -78,6 +78,9 @@ class notary_actor(JSBASE):
         ```out
         !threefold.grid.notary.reservation
         ```
+        ```gedis
+        cache = 3600
+        ```
         """
         model = self.bcdb.models.get("threefold.grid.notary.reservation")
         result = model.get_by_hash(hash)
@@ -53,6 +53,9 @@ class Farmer(JSBASE):
         ```out
         res = (LO) !threefold.grid.farmer
         ```
+        ```gedis
+        cache = 300
+        ```
         :return: [farmer_obj]
         """
         out = schema_out.new()
@@ -67,6 +70,9 @@ class Farmer(JSBASE):
         ```out
         res = (LS)
         ```
+        ```gedis
+        cache = 60
+        ```
         :return: list of countries
         """
         nodes = self.node_model.get_all()
@@ -399,6 +405,7 @@ class Farmer(JSBASE):
         new_farmer.mobile = mobile_numbers
         new_farmer.pubkeys = pubkey
         self.farmer_model.set(new_farmer)
+        j.servers.gedis.latest.cache.invalidate(actor="farmer", cmd="farmers_get")
         return
 
     def web_gateway_register(
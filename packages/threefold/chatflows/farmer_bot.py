@@ -268,8 +268,12 @@ def chat(bot):
             )
         else:
             gedis_client = j.clients.gedis.get(instance=gedis_client_name)
-        countries = gedis_client.farmer.country_list().res
-        farmers = gedis_client.farmer.farmers_get().res
+        # 1 round trip for both
+        with gedis_client.batch():
+            countries = gedis_client.farmer.country_list()
+            farmers = gedis_client.farmer.farmers_get()
+        countries = countries.result().res
+        farmers = farmers.result().res
         return
 
     def main():